@@ -0,0 +1,66 @@
+"""Benchmark parallel raw-file ingestion against the serial path.
+
+Writes ``n_files`` review batch CSVs plus a JSONL dump into a temporary raw
+directory, then times ``ingest_apps_reviews`` with 1, 2, 4, ... workers up to
+the number of CPU cores and prints the speedup over the serial run.
+
+Usage:
+    python benchmarks/bench_parallel_ingest.py [n_files] [rows_per_file]
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import config
+from ingest import ingest_apps_reviews
+
+
+def write_raw_files(raw_dir, n_files, rows_per_file):
+    with open(os.path.join(raw_dir, "apps_reviews.json"), 'w', encoding='utf-8') as f:
+        for i in range(rows_per_file):
+            f.write(json.dumps({'reviewId': f'j{i}', 'app_id': f'app{i % 50}', 'content': 'text ' * 20,
+                                'score': i % 5 + 1, 'thumbsUpCount': i % 7,
+                                'at': '2024-01-01T10:00:00'}) + "\n")
+    for n in range(n_files):
+        with open(os.path.join(raw_dir, f"note_taking_batch_{n:03d}.csv"), 'w', encoding='utf-8') as f:
+            f.write("reviewId,app_id,rating,comments,thumbsUpCount,at\n")
+            for i in range(rows_per_file):
+                f.write(f"b{n}_{i},app{i % 50},{i % 5 + 1},some review text,{i % 7},2024-01-01T10:00:00Z\n")
+
+
+def main(n_files=16, rows_per_file=20_000):
+    with tempfile.TemporaryDirectory() as raw_dir:
+        write_raw_files(raw_dir, n_files, rows_per_file)
+        config.RAW_DATA_DIR = raw_dir
+        config.APPS_REVIEWS_RAW = os.path.join(raw_dir, "apps_reviews.json")
+
+        cores = os.cpu_count() or 1
+        counts = [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cores:
+            counts.append(cores)
+
+        baseline = None
+        print(f"{n_files + 1} files x {rows_per_file} rows, {cores} cores\n")
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+        for workers in counts:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                rows = ingest_apps_reviews(workers=workers)
+            elapsed = time.perf_counter() - start
+            assert len(rows) == (n_files + 1) * rows_per_file
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.3f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
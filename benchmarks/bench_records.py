@@ -0,0 +1,88 @@
+"""Memory benchmark of compact records against dict rows.
+
+For each size, cleans raw reviews, merges them into an existing history and
+builds the star schema once with dict rows and once with the slotted records
+of ``records.py`` (``compact=True``), checks that both give equal tables and
+prints the memory held by the merged reviews plus ``fact_reviews`` (measured
+with tracemalloc, so raw inputs are excluded) and the time of each run.
+
+Records trade time for memory: unlike dicts of plain values, slotted
+objects stay tracked by the cyclic garbage collector, so building millions
+of them triggers more collections.
+
+Usage:
+    python benchmarks/bench_records.py [size ...]    (default 10k 100k 1M)
+"""
+import contextlib
+import gc
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from records import ReviewRecord
+from transform import build_star_schema, clean_apps_reviews
+from utils import merge_reviews
+
+SIZES = [10_000, 100_000, 1_000_000]
+N_APPS = 200
+
+
+def make_apps():
+    return [{'app_id': f'app{i}', 'title': f'App {i}', 'developer': f'dev{i % 7}',
+             'category': f'cat{i % 5}', 'price': 0.0, 'free': True,
+             'installs': '1,000+', 'rating': 4.0, 'ratings_count': 10}
+            for i in range(N_APPS)]
+
+
+def make_raw_reviews(n):
+    # app ids and versions arrive as separate string objects, like parsed JSON
+    return [{'reviewId': f'r{i}', 'app_id': ''.join(('app', str(i % N_APPS))), 'userName': f'user{i}',
+             'appName': ''.join(('App ', str(i % N_APPS))), 'content': 'great app, works offline',
+             'score': i % 5 + 1, 'thumbsUpCount': i % 7, 'reviewCreatedVersion': '.'.join(('2', str(i % 9))),
+             'replyContent': 'thanks' if i % 4 == 0 else None,
+             'at': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00'}
+            for i in range(n)]
+
+
+def run(apps, raw, existing, compact):
+    """Merged reviews and star schema, with the bytes they hold and the time taken."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    clean = clean_apps_reviews(raw, compact=compact)
+    merged = merge_reviews(existing, clean, ReviewRecord if compact else None)
+    del clean
+    star = build_star_schema(apps, merged, compact=compact)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return merged, star, held, elapsed
+
+
+def main(sizes):
+    apps = make_apps()
+    print(f"{'reviews':>10} {'dict MB':>9} {'record MB':>10} {'saved':>7} {'dict s':>8} {'record s':>9}")
+    for n in sizes:
+        raw = make_raw_reviews(n)
+        with contextlib.redirect_stdout(io.StringIO()):
+            existing = clean_apps_reviews(raw[n // 2:])
+            merged, star, dict_bytes, dict_s = run(apps, raw[: n // 2], existing, False)
+            del merged, star
+            existing = clean_apps_reviews(raw[n // 2:])
+            compact_merged, compact_star, record_bytes, record_s = run(apps, raw[: n // 2], existing, True)
+            merged = merge_reviews(clean_apps_reviews(raw[n // 2:]), clean_apps_reviews(raw[: n // 2]))
+        assert compact_merged == merged
+        assert compact_star['fact_reviews'] == build_star_schema(apps, merged)['fact_reviews']
+        del merged, compact_merged, compact_star
+        print(f"{n:>10} {dict_bytes / 2**20:>9.1f} {record_bytes / 2**20:>10.1f} "
+              f"{1 - record_bytes / dict_bytes:>6.0%} {dict_s:>8.2f} {record_s:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or SIZES))
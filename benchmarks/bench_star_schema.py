@@ -0,0 +1,58 @@
+"""Regression benchmark for fact-table construction in build_star_schema.
+
+Builds the star schema for a fixed catalogue of apps and a growing number of
+reviews, then prints the time per review for each size.  With hash-indexed key
+resolution the per-review cost stays flat, i.e. total time grows linearly with
+the number of reviews.  The script exits with status 1 if the per-review cost
+of the largest run exceeds ``MAX_GROWTH`` times that of the smallest run.
+
+Usage:
+    python benchmarks/bench_star_schema.py [n_apps]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from transform import build_star_schema
+
+SIZES = [10_000, 50_000, 100_000, 200_000]
+MAX_GROWTH = 2.0
+
+
+def make_apps(n_apps):
+    return [{'app_id': f'app{i}', 'title': f'App {i}', 'developer': f'dev{i % 7}',
+             'category': f'cat{i % 5}', 'price': 0.0, 'free': True,
+             'installs': '1,000+', 'rating': 4.0, 'ratings_count': 10}
+            for i in range(n_apps)]
+
+
+def make_reviews(n_reviews, n_apps):
+    return [{'review_id': f'r{i}', 'app_id': f'app{i % n_apps}',
+             'at': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00',
+             'score': i % 5 + 1, 'thumbs_up_count': 0, 'content': 'text',
+             'review_created_version': '1.0'}
+            for i in range(n_reviews)]
+
+
+def main(n_apps=200):
+    apps = make_apps(n_apps)
+    per_review = []
+    print(f"{'reviews':>10} {'seconds':>10} {'us/review':>10}")
+    for n in SIZES:
+        reviews = make_reviews(n, n_apps)
+        start = time.perf_counter()
+        star = build_star_schema(apps, reviews)
+        elapsed = time.perf_counter() - start
+        assert len(star['fact_reviews']) == n
+        per_review.append(elapsed / n)
+        print(f"{n:>10} {elapsed:>10.3f} {elapsed / n * 1e6:>10.2f}")
+
+    growth = per_review[-1] / per_review[0]
+    print(f"\nper-review cost growth ({SIZES[0]} -> {SIZES[-1]}): {growth:.2f}x")
+    return 0 if growth <= MAX_GROWTH else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
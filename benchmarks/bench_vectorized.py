@@ -0,0 +1,78 @@
+"""Benchmark the pandas engine against the row-at-a-time engine.
+
+For each size, generates raw reviews (a share of them drifted, duplicated or
+with string scores), then times cleaning, dedup against an existing history
+and per-app aggregation with both engines, checks that the results are
+identical and prints the speedup.  Requires pandas.
+
+Usage:
+    python benchmarks/bench_vectorized.py [size ...]    (default 10k 1M 10M)
+
+10M reviews need roughly 30 GB of RAM for the Python-dict inputs; pass
+smaller sizes on smaller machines.
+"""
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import vectorized
+from transform import clean_apps_reviews, update_review_aggregates
+from utils import merge_reviews
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+N_APPS = 200
+
+
+def make_raw_reviews(n):
+    reviews = []
+    for i in range(n):
+        if i % 10 == 0:
+            # drifted CSV-style record with a string score
+            reviews.append({'review_id': f'r{i % (n // 2)}', 'appId': f'app{i % N_APPS}',
+                            'comments': 'text', 'rating': str(i % 5 + 1), 'thumbs_up_count': i % 4,
+                            'date': '2024-03-01 10:00:00'})
+        else:
+            reviews.append({'reviewId': f'r{i}', 'app_id': f'app{i % N_APPS}', 'userName': 'user',
+                            'content': 'text', 'score': i % 5 + 1, 'thumbsUpCount': i % 7,
+                            'replyContent': 'thanks' if i % 4 == 0 else None,
+                            'at': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00'})
+    return reviews
+
+
+def run_python(raw, existing):
+    clean = clean_apps_reviews(raw)
+    merged = merge_reviews(existing, clean)
+    return merged, update_review_aggregates({}, merged)
+
+
+def run_pandas(raw, existing):
+    clean = vectorized.clean_apps_reviews_frame(raw)
+    merged = vectorized.merge_reviews_frame(vectorized.reviews_frame(existing), clean)
+    return merged, vectorized.review_aggregates_frame(merged)
+
+
+def main(sizes):
+    vectorized._pandas()  # import pandas up front so it is not timed
+    print(f"{'reviews':>10} {'python s':>10} {'pandas s':>10} {'speedup':>8}")
+    for n in sizes:
+        raw = make_raw_reviews(n)
+        with contextlib.redirect_stdout(io.StringIO()):
+            existing = clean_apps_reviews(raw[: n // 10])
+            start = time.perf_counter()
+            merged, aggregates = run_python(raw, existing)
+            python_s = time.perf_counter() - start
+            start = time.perf_counter()
+            merged_frame, frame_aggregates = run_pandas(raw, existing)
+            pandas_s = time.perf_counter() - start
+        assert frame_aggregates == aggregates
+        assert vectorized.frame_records(merged_frame) == merged
+        print(f"{n:>10} {python_s:>10.2f} {pandas_s:>10.2f} {python_s / pandas_s:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or SIZES))
@@ -1,5 +1,29 @@
 -- staging model for apps metadata
--- reads raw json file using duckdb's read_json_auto
+-- reads raw json file using duckdb's read_json_auto, or the pipeline's
+-- cleaned parquet table when run with --vars '{processed_format: parquet, ...}'
+
+{% if var("processed_format", "json") == "parquet" %}
+
+select
+    app_id,
+    title,
+    developer,
+    developer_id,
+    category,
+    rating,
+    ratings_count,
+    installs,
+    price,
+    free,
+    content_rating,
+    released,
+    updated,
+    version,
+    description,
+    summary
+from read_parquet('{{ var("apps_metadata_parquet_path") }}')
+
+{% else %}
 
 select
     appId                         as app_id,
@@ -19,3 +43,5 @@ select
     description,
     summary
 from read_json_auto('{{ var("apps_metadata_path") }}')
+
+{% endif %}
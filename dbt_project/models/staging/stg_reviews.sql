@@ -1,4 +1,24 @@
 -- staging model for reviews
+-- with processed_format=parquet the typed, already-cleaned table written by
+-- the python pipeline is scanned directly (only the selected columns are read)
+
+{% if var("processed_format", "json") == "parquet" %}
+
+select
+    review_id,
+    app_id,
+    app_name,
+    user_name,
+    content,
+    score,
+    thumbs_up_count,
+    review_created_version,
+    "at"                           as review_timestamp,
+    reply_content,
+    replied_at
+from read_parquet('{{ var("apps_reviews_parquet_path") }}')
+
+{% else %}
 
 select
     reviewId                      as review_id,
@@ -13,3 +33,5 @@ select
     replyContent                  as reply_content,
     repliedAt                     as replied_at
 from read_json_auto('{{ var("apps_reviews_path") }}')
+
+{% endif %}
@@ -1,10 +1,14 @@
 import json
+import os
 import sys
 from datetime import datetime
 from collections import Counter, defaultdict
 
 sys.path.append('.')
 from config import APPS_METADATA_RAW, APPS_REVIEWS_RAW, APPS_WITH_METRICS
+from profiling import load_latest_profile
+
+reviews_mb = os.path.getsize(APPS_REVIEWS_RAW) / 2**20 if os.path.exists(APPS_REVIEWS_RAW) else 0.0
 
 print("="*60)
 print("PART 1: DATA QUALITY & EXPLORATION ANALYSIS")
@@ -42,7 +46,7 @@ issues.append("Mixed data types for scores/ratings")
 
 print("\n   Issue 4: Reviews Format Issues")
 print("   - Reviews stored as JSONL (one per line) not JSON array")
-print("   - File size: 56.58 MB - difficult to load into memory")
+print(f"   - File size: {reviews_mb:.2f} MB - difficult to load into memory")
 print("   - No built-in validation or schema")
 issues.append("Reviews in JSONL format, massive file size")
 
@@ -52,6 +56,20 @@ print("   - No standard timezone information")
 print("   - 'updated' field may be date string or null")
 issues.append("Inconsistent timestamp formats")
 
+# column statistics of the last pipeline run, from its saved sketches
+profile = load_latest_profile('reviews')
+if profile is not None:
+    print(f"\n   Review column profile of the last pipeline run ({profile.rows:,} reviews):")
+    for column, stats in profile.stats().items():
+        line = f"   - {column}: {stats['null_rate']:.1%} null"
+        if 'distinct' in stats:
+            line += f", ~{stats['distinct']:,} distinct"
+        if 'quantiles' in stats and stats['quantiles']['p50'] is not None:
+            line += f", median {stats['quantiles']['p50']:g}"
+        if 'min' in stats:
+            line += f", {stats['min']} .. {stats['max']}"
+        print(line)
+
 print("\n\n2. APP PERFORMANCE ANALYSIS:")
 print("-" * 60)
 
@@ -168,7 +186,7 @@ print("2. Silent failures hide data quality issues")
 print("3. Hard-coded field names make schema brittle")
 print("4. No separation between data prep and analytics")
 print("5. No validation or data quality reporting")
-print("6. Large file handling inefficient (56MB JSONL)")
+print(f"6. Large file handling inefficient ({reviews_mb:.0f}MB JSONL)")
 print("7. No incremental processing capability")
 print("8. Orphaned data silently dropped")
 print("9. No time-series analysis capability")
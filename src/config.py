@@ -21,5 +21,78 @@ DIM_DEVELOPERS = os.path.join(PROCESSED_DATA_DIR, "dim_developers.json")
 DIM_DATE = os.path.join(PROCESSED_DATA_DIR, "dim_date.json")
 FACT_REVIEWS = os.path.join(PROCESSED_DATA_DIR, "fact_reviews.json")
 
+# app columns whose changes open a new SCD2 version (the check_cols of the
+# dbt snapshot); changes to other columns leave the stored versions alone
+# and only refresh the current snapshot.  None tracks every column.
+SCD2_TRACKED_COLUMNS = ('category', 'title', 'developer_id')
+
+# fingerprints of ingested raw files, used by incremental runs
+RUN_MANIFEST = os.path.join(PROCESSED_DATA_DIR, "run_manifest.json")
+# surrogate-key maps and per-app running aggregates for delta star builds
+STAR_STATE = os.path.join(PROCESSED_DATA_DIR, "star_state.json")
+# sorted review-id file, Bloom filter and sparse index used by incremental
+# runs to tell new reviews from stored ones (REVIEW_INDEX + .keys/.bloom/.json)
+REVIEW_INDEX = os.path.join(PROCESSED_DATA_DIR, "review_index")
+# per-run column profiles (profiling.py) and how many runs are kept (0: all)
+PROFILE_DIR = os.path.join(PROCESSED_DATA_DIR, "profiles")
+PROFILE_HISTORY = 30
+# per-run stage metrics (instrumentation.py): wall/CPU time, memory, rows and
+# bytes per stage, written as RUN_REPORT_DIR/run-<timestamp>.json; the flags
+# add a cProfile dump and tracemalloc peaks/allocation sites per stage
+RUN_REPORT_DIR = os.path.join(PROCESSED_DATA_DIR, "runs")
+STAGE_CPROFILE = False
+STAGE_TRACE_MEMORY = False
+
+# on-disk layout of processed tables: "json" (indented array), "ndjson"
+# (one record per line, written incrementally and readable by byte offset),
+# or the columnar "parquet" / "arrow" (IPC file) backends, which need pyarrow
+# and replace the .json extension with .parquet / .arrow
+PROCESSED_FORMAT = "json"
+# codec for the columnar backends ("zstd", "lz4"; parquet also "snappy", "gzip")
+COLUMNAR_COMPRESSION = "zstd"
+
+# worker processes used to parse raw files in parallel (1 = serial,
+# 0 = one per CPU core)
+INGEST_WORKERS = 1
+# JSONL files are split into newline-aligned byte ranges of at least this
+# size for parallel decoding
+JSONL_MIN_CHUNK_BYTES = 4 * 1024 * 1024
+
+# size of the newline-aligned blocks sliced from memory-mapped JSONL files
+MMAP_BLOCK_BYTES = 1024 * 1024
+
+# optional JSON file with extra schema-drift aliases per source and column,
+# e.g. {"reviews": {"content": ["body"]}} (see schema.configured_aliases)
+COLUMN_ALIASES_PATH = os.path.join(PROJECT_ROOT, "column_aliases.json")
+
+# raw review keys kept at ingest time, on top of every review column and
+# alias from the schema; everything else (user images, ...) is dropped right
+# after decoding. None keeps every key.
+REVIEW_RAW_FIELDS = (
+    'reviewId', 'review_id', 'app_id', 'appId', 'app', 'app_name',
+    'userName', 'user_name', 'content', 'comments', 'review_text',
+    'score', 'rating', 'thumbsUpCount', 'thumbs_up_count',
+    'reviewCreatedVersion', 'review_created_version', 'at', 'date',
+    'replyContent', 'reply_content', 'repliedAt', 'replied_at',
+)
+
+# intern the low-cardinality raw columns (schema.CATEGORICAL_COLUMNS: app ids,
+# names, versions, ...) in the ingest workers, so each distinct value is held
+# once per worker unit (once per run when reading serially or streaming)
+INTERN_CATEGORICALS = True
+
+# engine for review cleaning, dedup and aggregation in batch runs:
+# "python" (row at a time), "pandas" (vectorized, see vectorized.py) or
+# "duckdb" (SQL over an embedded database, see duckdb_engine.py)
+ENGINE = "python"
+
+# database file of the duckdb engine (None: pipeline.duckdb in
+# PROCESSED_DATA_DIR) and its thread count (0: one per core)
+DUCKDB_PATH = None
+DUCKDB_THREADS = 0
+
+# number of serialized records buffered per write in streaming mode
+STREAM_BATCH_SIZE = 1000
+
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
@@ -0,0 +1,488 @@
+"""DuckDB execution engine: review cleaning, merge, SCD2 decisions, star
+schema and aggregates as SQL over an embedded database file.
+
+Raw records are ingested and drift-resolved in Python (:mod:`ingest`,
+:class:`schema.ColumnMapper`) and staged as NDJSON; everything after that
+runs in DuckDB, which scans and joins with all its threads.  Results are
+fetched back as records and written by :mod:`load` like the Python engine,
+which stays the reference implementation: cells outside the SQL fast paths
+(string scores, non-canonical timestamps) go through the same
+:mod:`schema` converters as Python UDFs.
+"""
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List
+
+import config
+import quality
+import schema
+from quality import QualityReport
+from load import table_exists, table_path, iter_processed_reviews
+from scd2 import SCD2Store, row_digest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# column order of cleaned review records (see transform._clean_review)
+REVIEW_COLUMNS = [
+    'review_id', 'app_id', 'app_name', 'user_name', 'content', 'score',
+    'thumbs_up_count', 'review_created_version', 'at', 'reply_content', 'replied_at',
+]
+
+# SQL counterpart of schema.to_utc_stamp: values with an offset are
+# converted to UTC, naive ones are taken as UTC whatever the session time zone
+_UTC_STAMP = """strftime(CASE WHEN regexp_matches({col}, '(Z|[+-][0-9]{{2}}:?[0-9]{{2}})$')
+                         THEN timezone('UTC', try_cast({col} AS TIMESTAMPTZ))
+                         ELSE try_cast({col} AS TIMESTAMP) END, '%Y-%m-%dT%H:%M:%S.%f')"""
+
+# types of processed review columns when read back from disk
+_REVIEW_TYPES = {name: 'VARCHAR' for name in REVIEW_COLUMNS}
+_REVIEW_TYPES.update(score='BIGINT', thumbs_up_count='BIGINT')
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("engine='duckdb' requires duckdb (pip install duckdb)") from e
+    return duckdb
+
+
+def connect(path: str = None):
+    """Open the engine database (``config.DUCKDB_PATH``, by default
+    ``pipeline.duckdb`` next to the processed tables)."""
+    duckdb = _duckdb()
+    path = path or config.DUCKDB_PATH or os.path.join(config.PROCESSED_DATA_DIR, 'pipeline.duckdb')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    con = duckdb.connect(path)
+    if config.DUCKDB_THREADS:
+        con.execute(f"SET threads = {int(config.DUCKDB_THREADS)}")
+    # SQL truthiness of a JSON value, matching Python's bool() on the decoded value
+    con.execute("""
+        CREATE OR REPLACE MACRO truthy(j) AS
+            j IS NOT NULL AND j::VARCHAR NOT IN ('""', '0', '0.0', '-0.0', 'false', '[]', '{}')
+    """)
+    return con
+
+
+def _dumps(row: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(row)
+    return json.dumps(row, ensure_ascii=False).encode('utf-8')
+
+
+def _stage(con, table: str, columns: Dict[str, str], rows: Iterable[Dict[str, Any]]) -> None:
+    """Create ``table`` from records via a temporary NDJSON file.
+
+    ``columns`` maps names to DuckDB types; ``JSON`` keeps each value's
+    original JSON type so SQL can tell ints from strings.
+    """
+    os.makedirs(config.PROCESSED_DATA_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.ndjson', dir=config.PROCESSED_DATA_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for row in rows:
+                f.write(_dumps(row))
+                f.write(b'\n')
+        spec = ', '.join(f"'{name}': '{kind}'" for name, kind in columns.items())
+        con.execute(f"""
+            CREATE OR REPLACE TABLE {table} AS
+            SELECT * FROM read_json('{path}', format = 'newline_delimited', columns = {{{spec}}})
+        """)
+    finally:
+        os.remove(path)
+
+
+def _fetch(con, query: str) -> List[Dict[str, Any]]:
+    cursor = con.execute(query)
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def _register_converters(con, bad: Dict[str, int]) -> None:
+    """Register the schema converters as UDFs over JSON text; rejected
+    values return NULL and are counted in ``bad``."""
+    def udf(column, convert):
+        def run(text):
+            if text is None:
+                return None
+            try:
+                return convert(json.loads(text))
+            except ValueError:
+                bad[column] = bad.get(column, 0) + 1
+                return None
+        return run
+
+    def to_iso(value):
+        parsed = schema.to_datetime(value)
+        return parsed.isoformat() if parsed else None
+
+    for name, column, convert, returns in (
+            ('coerce_score', 'score', schema.to_int, 'BIGINT'),
+            ('coerce_thumbs', 'thumbs_up_count', schema.to_int, 'BIGINT'),
+            ('coerce_at', 'at', to_iso, 'VARCHAR')):
+        try:
+            con.remove_function(name)
+        except Exception:
+            pass
+        con.create_function(name, udf(column, convert), ['VARCHAR'], returns,
+                            null_handling='special', side_effects=True)
+
+
+def clean_reviews(con, reviews: Iterable[Dict[str, Any]], bad: Dict[str, int] = None,
+                  mapper: schema.ColumnMapper = None) -> int:
+    """SQL counterpart of :func:`transform.clean_apps_reviews`; creates the
+    ``clean_reviews`` table (ordered by ``pos``) and returns its row count."""
+    bad = {} if bad is None else bad
+    mapper = mapper or schema.ColumnMapper('reviews')
+    columns = list(mapper.columns)
+    _stage(con, 'raw_reviews', {'pos': 'BIGINT', **{c: 'JSON' for c in columns}},
+           ({'pos': pos, **dict(zip(columns, values))}
+            for pos, values in enumerate(mapper.iter_project(reviews))))
+    _register_converters(con, bad)
+    con.execute("""
+        CREATE OR REPLACE TABLE clean_reviews AS
+        SELECT
+            row_number() OVER (ORDER BY pos) - 1 AS pos,
+            "reviewId" ->> '$' AS review_id,
+            app_id ->> '$' AS app_id,
+            app_name ->> '$' AS app_name,
+            CASE WHEN truthy("userName") THEN "userName" ->> '$' ELSE 'Anonymous' END AS user_name,
+            content ->> '$' AS content,
+            CASE
+                WHEN json_type(score) IN ('BIGINT', 'UBIGINT') THEN CAST(score ->> '$' AS BIGINT)
+                ELSE coerce_score(score::VARCHAR)
+            END AS score,
+            CASE
+                WHEN NOT truthy("thumbsUpCount") THEN 0
+                WHEN json_type("thumbsUpCount") IN ('BIGINT', 'UBIGINT')
+                    THEN CAST("thumbsUpCount" ->> '$' AS BIGINT)
+                ELSE coalesce(coerce_thumbs("thumbsUpCount"::VARCHAR), 0)
+            END AS thumbs_up_count,
+            "reviewCreatedVersion" ->> '$' AS review_created_version,
+            CASE
+                WHEN json_type("at") = 'VARCHAR' AND length("at" ->> '$') = 19
+                     AND try_strptime("at" ->> '$', '%Y-%m-%dT%H:%M:%S') IS NOT NULL
+                    THEN "at" ->> '$'
+                ELSE coerce_at("at"::VARCHAR)
+            END AS "at",
+            "replyContent" ->> '$' AS reply_content,
+            "repliedAt" ->> '$' AS replied_at
+        FROM raw_reviews
+        WHERE truthy(app_id) AND content IS NOT NULL
+        ORDER BY pos
+    """)
+    return con.execute("SELECT count(*) FROM clean_reviews").fetchone()[0]
+
+
+def review_report(con) -> QualityReport:
+    """:func:`quality.review_report` over ``clean_reviews``: counts, null
+    counts and the first failing rows of every review rule, in SQL."""
+    report = quality.review_report()
+    rows, null_ids, null_apps, null_scores, missing, out_of_range = con.execute("""
+        SELECT count(*), count(*) - count(review_id), count(*) - count(app_id),
+               count(*) - count(score),
+               count(*) FILTER (WHERE coalesce(review_id, '') = '' OR coalesce(app_id, '') = ''),
+               count(*) FILTER (WHERE score < 1 OR score > 5)
+        FROM clean_reviews
+    """).fetchone()
+    limit = quality.SAMPLE_SIZE
+    missing_rows = con.execute(f"""
+        SELECT pos FROM clean_reviews
+        WHERE coalesce(review_id, '') = '' OR coalesce(app_id, '') = ''
+        ORDER BY pos LIMIT {limit}
+    """).fetchall()
+    range_rows = con.execute(f"""
+        SELECT pos, score FROM clean_reviews WHERE score < 1 OR score > 5 ORDER BY pos LIMIT {limit}
+    """).fetchall()
+    # score is an INTEGER column, so score_not_integer cannot fail here
+    report.record('missing_ids', missing, [(pos, "missing ids") for pos, in missing_rows], rows=rows,
+                  nulls={'review_id': null_ids, 'app_id': null_apps, 'score': null_scores})
+    report.record('score_out_of_range', out_of_range,
+                  [(pos, f"score out of range ({score})") for pos, score in range_rows])
+    return report
+
+
+def load_existing_reviews(con) -> None:
+    """Create ``existing_reviews`` from the processed reviews table on disk,
+    read by DuckDB itself for JSON, NDJSON and Parquet."""
+    columns = ', '.join(f'"{c}"' for c in REVIEW_COLUMNS)
+    path = table_path(config.APPS_REVIEWS_PROCESSED)
+    if not table_exists(config.APPS_REVIEWS_PROCESSED) or os.path.getsize(path) == 0:
+        spec = ', '.join(f'"{c}" {t}' for c, t in _REVIEW_TYPES.items())
+        con.execute(f"CREATE OR REPLACE TABLE existing_reviews (pos BIGINT, {spec})")
+        return
+    if config.PROCESSED_FORMAT == 'parquet':
+        source = f"read_parquet('{path}', file_row_number = true)"
+        order = 'file_row_number'
+    elif config.PROCESSED_FORMAT == 'arrow':
+        _stage(con, 'existing_staged', {'pos': 'BIGINT', **_REVIEW_TYPES},
+               ({'pos': pos, **row} for pos, row in enumerate(iter_processed_reviews())))
+        source, order = 'existing_staged', 'pos'
+    else:
+        spec = ', '.join(f"'{c}': '{t}'" for c, t in _REVIEW_TYPES.items())
+        source = f"read_json('{path}', format = 'auto', columns = {{{spec}}})"
+        order = None
+    # JSON scans keep file order (preserve_insertion_order), so row_number()
+    # over the scan numbers rows as they appear in the file
+    over = f"ORDER BY {order}" if order else ''
+    con.execute(f"""
+        CREATE OR REPLACE TABLE existing_reviews AS
+        SELECT row_number() OVER ({over}) - 1 AS pos, {columns} FROM {source}
+    """)
+
+
+def merge_reviews(con) -> int:
+    """SQL counterpart of :func:`utils.merge_reviews`: one row per review_id,
+    at the position of its first occurrence, holding its last occurrence.
+    Creates ``merged_reviews`` and returns its row count."""
+    columns = ', '.join(f'"{c}"' for c in REVIEW_COLUMNS)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE merged_reviews AS
+        WITH combined AS (
+            SELECT 0 AS src, pos, {columns} FROM existing_reviews
+            UNION ALL
+            SELECT 1 AS src, pos, {columns} FROM clean_reviews WHERE review_id IS NOT NULL
+        ), ordered AS (
+            SELECT *, row_number() OVER (ORDER BY src, pos) AS ord FROM combined
+        ), ranked AS (
+            SELECT *,
+                min(ord) OVER (PARTITION BY review_id) AS first_ord,
+                max(ord) OVER (PARTITION BY review_id) AS last_ord
+            FROM ordered
+        )
+        SELECT row_number() OVER (ORDER BY first_ord) - 1 AS pos, {columns}
+        FROM ranked WHERE ord = last_ord
+        ORDER BY first_ord
+    """)
+    return con.execute("SELECT count(*) FROM merged_reviews").fetchone()[0]
+
+
+def fetch_reviews(con, table: str = 'merged_reviews') -> List[Dict[str, Any]]:
+    columns = ', '.join(f'"{c}"' for c in REVIEW_COLUMNS)
+    return _fetch(con, f"SELECT {columns} FROM {table} ORDER BY pos")
+
+
+def iter_reviews(con, table: str = 'clean_reviews', batch_size: int = 4096) -> Iterator[Dict[str, Any]]:
+    """:func:`fetch_reviews` one batch at a time."""
+    columns = ', '.join(f'"{c}"' for c in REVIEW_COLUMNS)
+    cursor = con.execute(f"SELECT {columns} FROM {table} ORDER BY pos")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(REVIEW_COLUMNS, row))
+
+
+def scd2_update(con, store: SCD2Store, incoming: List[Dict[str, Any]],
+                timestamp: str = None) -> Dict[str, int]:
+    """SQL counterpart of :meth:`scd2.SCD2Store.update`.
+
+    The current versions and the incoming rows are joined on the key in
+    DuckDB, which decides which versions close and which rows open a new
+    one: a pair is unchanged when its ``scd2_digest`` matches, and only on a
+    mismatch are the tracked values (as JSON) compared.  The decisions are
+    applied with :meth:`scd2.SCD2Store.apply`, so the history and its
+    append-only save are the same as with the Python engine.
+    """
+    incoming_map = {row[store.key]: row for row in incoming}
+
+    def tracked_values(row, columns):
+        return json.dumps([row.get(c) for c in columns], sort_keys=True, default=str)
+
+    def columns_of(new_row):
+        # like SCD2Store, None tracks the columns of the incoming row
+        return sorted(new_row) if store.tracked is None else store.tracked
+
+    keys = {}
+    current = []
+    for pk in store.current_keys():
+        row = store.current(pk)
+        new_row = incoming_map.get(pk)
+        keys[json.dumps(pk, default=str)] = pk
+        current.append({'pk': json.dumps(pk, default=str), 'digest': row.get('scd2_digest'),
+                        'closable': row.get('end_date') is None,
+                        'vals': tracked_values(row, columns_of(new_row)) if new_row is not None else None})
+    _stage(con, 'scd2_current',
+           {'pk': 'VARCHAR', 'digest': 'VARCHAR', 'closable': 'BOOLEAN', 'vals': 'VARCHAR'}, current)
+    staged = []
+    for pk, row in incoming_map.items():
+        keys[json.dumps(pk, default=str)] = pk
+        staged.append({'pk': json.dumps(pk, default=str), 'digest': row_digest(row, store.tracked),
+                       'vals': tracked_values(row, columns_of(row))})
+    _stage(con, 'scd2_incoming', {'pk': 'VARCHAR', 'digest': 'VARCHAR', 'vals': 'VARCHAR'}, staged)
+
+    rows = con.execute("""
+        WITH changed AS (
+            SELECT i.pk
+            FROM scd2_incoming i JOIN scd2_current c ON c.pk = i.pk
+            WHERE c.digest IS DISTINCT FROM i.digest AND c.vals IS DISTINCT FROM i.vals
+        )
+        SELECT 'close' AS action, c.pk FROM scd2_current c
+        WHERE c.closable AND NOT EXISTS (SELECT 1 FROM scd2_incoming i WHERE i.pk = c.pk)
+        UNION ALL
+        SELECT 'close', pk FROM changed
+        UNION ALL
+        SELECT 'open', i.pk FROM scd2_incoming i
+        WHERE NOT EXISTS (SELECT 1 FROM scd2_current c WHERE c.pk = i.pk)
+           OR i.pk IN (SELECT pk FROM changed)
+    """).fetchall()
+    close = {keys[pk] for action, pk in rows if action == 'close'}
+    open_ = {keys[pk] for action, pk in rows if action == 'open'}
+    return store.apply(incoming, close, open_, timestamp)
+
+
+def review_aggregates(con) -> Dict[str, Dict[str, Any]]:
+    """SQL counterpart of ``transform.update_review_aggregates({}, merged)``;
+    apps keep their first-seen order."""
+    rows = con.execute("""
+        SELECT
+            app_id,
+            count(*) AS total_reviews,
+            coalesce(sum(score) FILTER (WHERE score BETWEEN 1 AND 5), 0) AS score_sum,
+            coalesce(sum(thumbs_up_count), 0) AS total_thumbs_up,
+            count(*) FILTER (WHERE score = 5) AS s5,
+            count(*) FILTER (WHERE score = 4) AS s4,
+            count(*) FILTER (WHERE score = 3) AS s3,
+            count(*) FILTER (WHERE score = 2) AS s2,
+            count(*) FILTER (WHERE score = 1) AS s1,
+            count(*) FILTER (WHERE coalesce(reply_content, '') <> '') AS replies
+        FROM merged_reviews
+        GROUP BY app_id
+        ORDER BY min(pos)
+    """).fetchall()
+    return {
+        app_id: {
+            'total_reviews': total,
+            'avg_score': 0,
+            'score_sum': int(score_sum),
+            'total_thumbs_up': int(thumbs),
+            '5_star': s5,
+            '4_star': s4,
+            '3_star': s3,
+            '2_star': s2,
+            '1_star': s1,
+            'reviews_with_reply': replies
+        }
+        for app_id, total, score_sum, thumbs, s5, s4, s3, s2, s1, replies in rows
+    }
+
+
+def build_star_schema(con, apps: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """SQL counterpart of :func:`transform.build_star_schema` over
+    ``merged_reviews``; ``apps`` are app versions (the SCD2 history).  Fact
+    rows are resolved with an ASOF join against the app versions and a hash
+    join against the date dimension."""
+    _stage(con, 'app_versions',
+           {'pos': 'BIGINT', 'app_id': 'VARCHAR', 'developer': 'VARCHAR', 'category': 'VARCHAR',
+            'valid_from': 'VARCHAR', 'valid_to': 'VARCHAR'},
+           # validity bounds as naive UTC stamps, like transform.app_version_bounds
+           ({'pos': pos, 'app_id': app['app_id'], 'developer': app.get('developer') or 'Unknown',
+             'category': app.get('category') or 'Unknown',
+             'valid_from': schema.to_utc_stamp(app.get('start_date')),
+             'valid_to': schema.to_utc_stamp(app.get('end_date'))}
+            for pos, app in enumerate(apps)))
+    con.execute("""
+        CREATE OR REPLACE TABLE dim_categories AS
+        SELECT row_number() OVER (ORDER BY min(pos)) AS category_key, category AS category_name
+        FROM app_versions GROUP BY category ORDER BY category_key
+    """)
+    con.execute("""
+        CREATE OR REPLACE TABLE dim_developers AS
+        SELECT row_number() OVER (ORDER BY min(pos)) AS developer_key, developer AS developer_name,
+               NULL::VARCHAR AS developer_website, NULL::VARCHAR AS developer_email
+        FROM app_versions GROUP BY developer ORDER BY developer_key
+    """)
+    con.execute("""
+        CREATE OR REPLACE TABLE dim_apps AS
+        SELECT a.pos + 1 AS app_key, a.app_id, d.developer_key, c.category_key,
+               a.valid_from, a.valid_to
+        FROM app_versions a
+        JOIN dim_developers d ON d.developer_name = a.developer
+        JOIN dim_categories c ON c.category_name = a.category
+        ORDER BY app_key
+    """)
+    con.execute("""
+        CREATE OR REPLACE TABLE review_dates AS
+        SELECT pos, CASE WHEN coalesce("at", '') <> '' THEN try_cast(left("at", 10) AS DATE) END AS day
+        FROM merged_reviews
+    """)
+    con.execute("""
+        CREATE OR REPLACE TABLE dim_date AS
+        SELECT row_number() OVER (ORDER BY min(pos)) AS date_key, day
+        FROM review_dates WHERE day IS NOT NULL GROUP BY day ORDER BY date_key
+    """)
+    # same rules as transform.resolve_app_version: review timestamps are
+    # compared as naive UTC stamps (offsets converted, like
+    # schema.to_utc_stamp), the first version of an app also covers earlier
+    # reviews, none is valid at or after a version's valid_to, and reviews
+    # without a usable timestamp take the latest version even if it is closed
+    con.execute(f"""
+        CREATE OR REPLACE TABLE fact_reviews AS
+        WITH versions AS (
+            SELECT app_id, app_key, developer_key, valid_to,
+                CASE WHEN row_number() OVER (PARTITION BY app_id
+                                            ORDER BY coalesce(valid_from, ''), app_key) = 1
+                     THEN '' ELSE coalesce(valid_from, '') END AS lo,
+                row_number() OVER (PARTITION BY app_id
+                                   ORDER BY coalesce(valid_from, '') DESC, app_key DESC) = 1 AS latest
+            FROM dim_apps
+        ), stamped AS (
+            SELECT pos, app_id, {_UTC_STAMP.format(col='"at"')} AS stamp FROM merged_reviews
+        ), resolved AS (
+            SELECT s.pos,
+                CASE WHEN v.valid_to IS NULL OR s.stamp < v.valid_to THEN v.app_key END AS app_key,
+                CASE WHEN v.valid_to IS NULL OR s.stamp < v.valid_to THEN v.developer_key END AS developer_key
+            FROM stamped s ASOF LEFT JOIN versions v ON v.app_id = s.app_id AND s.stamp >= v.lo
+            WHERE s.stamp IS NOT NULL
+            UNION ALL
+            SELECT s.pos, v.app_key, v.developer_key
+            FROM stamped s LEFT JOIN versions v ON v.app_id = s.app_id AND v.latest
+            WHERE s.stamp IS NULL
+        )
+        SELECT r.pos, r.review_id, x.app_key, x.developer_key, d.date_key,
+               r.score AS rating, r.thumbs_up_count, r.content AS review_text,
+               r.review_created_version AS review_version
+        FROM merged_reviews r
+        JOIN review_dates rd ON rd.pos = r.pos
+        JOIN resolved x ON x.pos = r.pos
+        LEFT JOIN dim_date d ON d.day = rd.day
+        ORDER BY r.pos
+    """)
+    keys = con.execute("SELECT developer_key, category_key FROM dim_apps ORDER BY app_key").fetchall()
+    # attributes pass through unchanged, so they are taken from the records
+    dim_apps = [{
+        'app_key': app_key,
+        'app_id': app['app_id'],
+        'app_name': app.get('title'),
+        'developer_key': developer_key,
+        'category_key': category_key,
+        'price': app.get('price'),
+        'is_paid': not app.get('free', True),
+        'installs': app.get('installs'),
+        'catalog_rating': app.get('rating'),
+        'ratings_count': app.get('ratings_count'),
+        'valid_from': app.get('start_date'),
+        'valid_to': app.get('end_date'),
+        'is_current': app.get('current_flag', True)
+    } for app_key, (app, (developer_key, category_key)) in enumerate(zip(apps, keys), start=1)]
+    return {
+        'dim_apps': dim_apps,
+        'dim_categories': _fetch(con, "SELECT * FROM dim_categories ORDER BY category_key"),
+        'dim_developers': _fetch(con, "SELECT * FROM dim_developers ORDER BY developer_key"),
+        'dim_date': _fetch(con, """
+            SELECT date_key, strftime(day, '%Y-%m-%d') AS date, year(day) AS year,
+                   month(day) AS month, quarter(day) AS quarter, isodow(day) AS day_of_week,
+                   isodow(day) >= 6 AS is_weekend
+            FROM dim_date ORDER BY date_key
+        """),
+        'fact_reviews': _fetch(con, """
+            SELECT review_id, app_key, developer_key, date_key, rating, thumbs_up_count,
+                   review_text, review_version
+            FROM fact_reviews ORDER BY pos
+        """),
+    }
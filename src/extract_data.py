@@ -1,8 +1,14 @@
+import glob
+import gzip
 import json
+import random
+import re
+import sys
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from google_play_scraper import search, app, reviews, Sort
 
 RAW_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DATA", "raw")
 LANG = "en"
@@ -12,110 +18,411 @@ SEARCH_QUERY = "note taking"
 MAX_APPS = 50
 REVIEWS_PER_APP = 200
 MAX_REVIEWS_PER_APP = 5000
-SLEEP_SECONDS = 1
+
+# all requests share one token bucket: REQUESTS_PER_SECOND on average, with
+# bursts of up to RATE_BURST requests
+REQUESTS_PER_SECOND = 1.0
+RATE_BURST = 4
+# apps fetched at the same time; the pages of one app stay sequential since
+# every page needs the previous page's continuation token
+CONCURRENCY = 8
+# failed requests are retried with exponential backoff (plus jitter)
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 1.0
+
+# raw reviews are serialized into batches of WRITE_BATCH_RECORDS and written
+# with one call.  FSYNC_POLICY is "batch" (after every batch, before its
+# checkpoint is saved), "close" or "never".  RAW_COMPRESSION ("gzip",
+# "zstd" or None), SHARD_MAX_BYTES and SHARD_BY_APP write new
+# apps_reviews-*.json[.gz|.zst] shards, which ingestion reads in parallel,
+# instead of appending to apps_reviews.json
+WRITE_BATCH_RECORDS = 1000
+FSYNC_POLICY = "batch"
+RAW_COMPRESSION = None
+SHARD_MAX_BYTES = None
+SHARD_BY_APP = False
+
+_COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
 
 def json_serializer(obj):
     if isinstance(obj, datetime):
         return obj.isoformat()
     raise TypeError(f"Type {type(obj)} not serializable")
 
-def extract_apps_metadata():
+
+def _scraper():
+    import google_play_scraper
+    return google_play_scraper
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("RAW_COMPRESSION = 'zstd' requires zstandard (pip install zstandard)") from e
+    return zstandard
+
+
+class _Shard:
+    def __init__(self, path, compression):
+        self.path = path
+        self.raw = open(path, "ab")
+        if compression == "gzip":
+            self.file = gzip.GzipFile(fileobj=self.raw, mode="wb")
+        elif compression == "zstd":
+            self.file = _zstandard().ZstdCompressor().stream_writer(self.raw, closefd=False)
+        else:
+            self.file = self.raw
+        self.compression = compression
+
+    def write(self, data, fsync):
+        self.file.write(data)
+        # compressed data up to here becomes decodable from the file
+        if self.compression == "zstd":
+            self.file.flush(_zstandard().FLUSH_BLOCK)
+        else:
+            self.file.flush()
+        self.raw.flush()
+        if fsync:
+            os.fsync(self.raw.fileno())
+
+    def size(self):
+        return self.raw.tell()
+
+    def close(self, fsync):
+        if self.file is not self.raw:
+            self.file.close()
+        self.raw.flush()
+        if fsync:
+            os.fsync(self.raw.fileno())
+        self.raw.close()
+
+
+class ReviewWriter:
+    """Long-lived writer of raw reviews as NDJSON.
+
+    Records are serialized as they arrive and written one batch at a time;
+    ``on_flush`` runs after every batch is on disk (the extractor saves its
+    checkpoints there).  Not thread-safe: callers serialize calls.
+    """
+
+    def __init__(self, directory, on_flush=None, batch_records=None, fsync=None,
+                 compression=None, max_shard_bytes=None, by_app=None):
+        self.directory = directory
+        self.on_flush = on_flush
+        self.batch_records = batch_records or WRITE_BATCH_RECORDS
+        self.fsync = fsync or FSYNC_POLICY
+        self.compression = compression or RAW_COMPRESSION
+        self.max_shard_bytes = max_shard_bytes or SHARD_MAX_BYTES
+        self.by_app = SHARD_BY_APP if by_app is None else by_app
+        if self.compression not in _COMPRESSION_SUFFIXES:
+            raise ValueError(f"unknown compression {self.compression!r}")
+        self.sharded = bool(self.compression or self.max_shard_bytes or self.by_app)
+        self.written = 0
+        self._buffers = {}
+        self._buffered = 0
+        self._shards = {}
+        # shards are never reopened: a run continues after the highest index
+        indexes = [int(m.group(1)) for m in
+                   (re.search(r"-(\d+)\.json", os.path.basename(p)) for p in review_shards(directory)) if m]
+        self._next_index = max(indexes, default=-1) + 1
+
+    def _shard(self, key):
+        shard = self._shards.get(key)
+        if shard is None:
+            if not self.sharded:
+                path = os.path.join(self.directory, "apps_reviews.json")
+            else:
+                tag = f"{key}-" if key is not None else ""
+                suffix = _COMPRESSION_SUFFIXES[self.compression]
+                path = os.path.join(self.directory, f"apps_reviews-{tag}{self._next_index:05d}.json{suffix}")
+                self._next_index += 1
+            shard = self._shards[key] = _Shard(path, self.compression)
+        return shard
+
+    def write(self, records, app_id=None):
+        if not records:
+            return
+        buffer = self._buffers.setdefault(app_id if self.by_app else None, [])
+        for r in records:
+            buffer.append(json.dumps(r, ensure_ascii=False, default=json_serializer).encode("utf-8"))
+        self._buffered += len(records)
+        self.written += len(records)
+        if self._buffered >= self.batch_records:
+            self.flush()
+
+    def flush(self):
+        for key, buffer in self._buffers.items():
+            if not buffer:
+                continue
+            shard = self._shard(key)
+            shard.write(b"\n".join(buffer) + b"\n", self.fsync == "batch")
+            buffer.clear()
+            if self.max_shard_bytes and shard.size() >= self.max_shard_bytes:
+                shard.close(self.fsync != "never")
+                del self._shards[key]
+        self._buffered = 0
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self):
+        self.flush()
+        for shard in self._shards.values():
+            shard.close(self.fsync != "never")
+        self._shards.clear()
+
+
+def review_shards(directory):
+    """Review shard files written by :class:`ReviewWriter`, in name order."""
+    return sorted(glob.glob(os.path.join(directory, "apps_reviews-*.json*")))
+
+
+class TokenBucket:
+    """Thread-safe token bucket; :meth:`acquire` blocks until a request may
+    be sent."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def _call(limiter, fn, *args, **kwargs):
+    """Rate-limited call of a scraper function, retried with backoff."""
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_SECONDS * 2 ** attempt * (1 + random.random())
+            print(f"  {getattr(fn, '__name__', 'request')} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _limiter():
+    return TokenBucket(REQUESTS_PER_SECOND, RATE_BURST)
+
+
+def extract_apps_metadata(client=None, limiter=None):
+    client = client or _scraper()
+    limiter = limiter or _limiter()
     print("Searching for apps...")
-    search_results = search(
+    search_results = _call(
+        limiter,
+        client.search,
         SEARCH_QUERY,
         lang=LANG,
         country=COUNTRY,
         n_hits=MAX_APPS
     )
 
-    apps_metadata = []
-
-    for result in search_results:
-        app_id = result["appId"]
+    def fetch(app_id):
         print(f"Fetching metadata for {app_id}")
-
         try:
-            metadata = app(
-                app_id,
-                lang=LANG,
-                country=COUNTRY
-            )
-            apps_metadata.append(metadata)
-            time.sleep(SLEEP_SECONDS)
+            return _call(limiter, client.app, app_id, lang=LANG, country=COUNTRY)
         except Exception as e:
             print(f"Failed to fetch app {app_id}: {e}")
+            return None
 
-    return apps_metadata
+    # map keeps the search order
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        fetched = pool.map(fetch, [result["appId"] for result in search_results])
+        return [metadata for metadata in fetched if metadata is not None]
 
-def extract_apps_reviews(apps_metadata):
-    reviews_file = f"{RAW_DATA_PATH}/apps_reviews.json"
-    
-    if os.path.exists(reviews_file):
-        os.remove(reviews_file)
-    
-    total_reviews = 0
-
-    for app_meta in apps_metadata:
-        app_id = app_meta.get("appId")
-        app_name = app_meta.get("title")
+
+def _state_path():
+    return f"{RAW_DATA_PATH}/extract_state.json"
+
+
+def load_extract_state():
+    """Per-app extraction state: ``newest_id`` / ``newest_at`` of the newest
+    review already extracted, and ``pending`` (continuation token and
+    progress) while a run over that app is unfinished."""
+    try:
+        with open(_state_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_extract_state(state):
+    # written to a temporary file first so a crash never leaves half a state
+    tmp = _state_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, _state_path())
+
+
+def _token_state(token):
+    # google_play_scraper tokens are objects; only their token string is kept
+    return getattr(token, "token", token)
+
+
+def _restore_token(client, value):
+    if value is None or getattr(client, "__name__", None) != "google_play_scraper":
+        return value
+    from google_play_scraper.features.reviews import _ContinuationToken
+    return _ContinuationToken(value, LANG, COUNTRY, client.Sort.NEWEST, REVIEWS_PER_APP, None, None)
+
+
+def _review_at(review):
+    at = review.get("at")
+    return at.isoformat() if isinstance(at, datetime) else at
+
+
+def _fetch_app_reviews(client, limiter, app_meta, app_state, write):
+    """Page through the reviews of one app, newest first.
+
+    Paging stops at the newest review extracted by an earlier run, so only
+    new reviews are fetched.  After every written page ``write`` also
+    checkpoints the continuation token, so an interrupted run resumes from
+    the last written page instead of the first one.
+    """
+    app_id = app_meta.get("appId")
+    app_name = app_meta.get("title")
+    stop_id, stop_at = app_state.get("newest_id"), app_state.get("newest_at")
+    pending = app_state.get("pending")
+    if pending:
+        print(f"Resuming reviews for {app_name} ({app_id}) after {pending['count']} reviews")
+    else:
         print(f"Fetching reviews for {app_name} ({app_id})")
+        pending = {"token": None, "count": 0, "newest_id": None, "newest_at": None}
+    continuation_token = _restore_token(client, pending["token"])
+
+    while True:
+        result, continuation_token = _call(
+            limiter,
+            client.reviews,
+            app_id,
+            lang=LANG,
+            country=COUNTRY,
+            sort=client.Sort.NEWEST,
+            count=REVIEWS_PER_APP,
+            continuation_token=continuation_token
+        )
+
+        fresh = []
+        caught_up = False
+        for r in result:
+            at = _review_at(r)
+            if stop_id is not None and (r.get("reviewId") == stop_id or (stop_at and at and at < stop_at)):
+                caught_up = True
+                break
+            r["app_id"] = app_id
+            r["app_name"] = app_name
+            fresh.append(r)
+        if fresh and pending["newest_id"] is None:
+            pending = dict(pending, newest_id=fresh[0].get("reviewId"), newest_at=_review_at(fresh[0]))
+        pending = dict(pending, token=_token_state(continuation_token), count=pending["count"] + len(fresh))
+        app_state = dict(app_state, pending=pending)
+        write(app_id, fresh, app_state)
+        print(f"  {app_id}: fetched {len(fresh)} reviews (total for this app: {pending['count']})")
+
+        if caught_up:
+            print(f"  {app_id}: reached reviews extracted by an earlier run")
+            break
+        if not continuation_token or len(result) == 0 or pending["count"] >= MAX_REVIEWS_PER_APP:
+            if pending["count"] >= MAX_REVIEWS_PER_APP:
+                print(f"  {app_id}: reached maximum limit of {MAX_REVIEWS_PER_APP} reviews")
+            break
+
+    # the run is complete: its newest review becomes the next stopping point
+    done = {k: v for k, v in app_state.items() if k != "pending"}
+    if pending["newest_id"] is not None:
+        done.update(newest_id=pending["newest_id"], newest_at=pending["newest_at"])
+    write(app_id, [], done)
+    print(f"Completed {app_name}: {pending['count']} reviews")
+    return pending["count"]
+
+
+def extract_apps_reviews(apps_metadata, client=None, limiter=None, full_refresh=False):
+    """Fetch new reviews of all apps, CONCURRENCY apps at a time, and append
+    them to ``apps_reviews.json`` (JSONL); returns the number of reviews
+    written.
 
+    Progress is kept in ``extract_state.json`` next to it: apps whose last
+    run was interrupted resume from their checkpointed continuation token,
+    the others only fetch reviews newer than the last run's.  A crash
+    between a page write and its checkpoint re-fetches that page; the
+    pipeline deduplicates reviews by id.  ``full_refresh`` discards the
+    reviews file, its shards and the state first.
+
+    Reviews go through one :class:`ReviewWriter`; the state is saved each
+    time a batch has been written, so checkpoints never get ahead of the
+    data on disk.
+    """
+    client = client or _scraper()
+    limiter = limiter or _limiter()
+    reviews_file = f"{RAW_DATA_PATH}/apps_reviews.json"
+
+    if full_refresh:
+        for path in [reviews_file, _state_path()] + review_shards(RAW_DATA_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+    state = load_extract_state()
+
+    lock = threading.Lock()
+    writer = ReviewWriter(RAW_DATA_PATH, on_flush=lambda: save_extract_state(state))
+
+    def write(app_id, result, app_state):
+        # pages are buffered whole; a page's checkpoint is saved with the
+        # batch that puts the page on disk
+        with lock:
+            state[app_id] = app_state
+            writer.write(result, app_id)
+
+    def fetch(app_meta):
         try:
-            continuation_token = None
-            app_review_count = 0
-            
-            while True:
-                result, continuation_token = reviews(
-                    app_id,
-                    lang=LANG,
-                    country=COUNTRY,
-                    sort=Sort.NEWEST,
-                    count=REVIEWS_PER_APP,
-                    continuation_token=continuation_token
-                )
-
-                for r in result:
-                    r["app_id"] = app_id
-                    r["app_name"] = app_name
-                
-                with open(reviews_file, "a", encoding="utf-8") as f:
-                    for r in result:
-                        json.dump(r, f, ensure_ascii=False, default=json_serializer)
-                        f.write("\n")
-                
-                app_review_count += len(result)
-                total_reviews += len(result)
-                print(f"  Fetched {len(result)} reviews (total for this app: {app_review_count})")
-                
-                if not continuation_token or len(result) == 0 or app_review_count >= MAX_REVIEWS_PER_APP:
-                    if app_review_count >= MAX_REVIEWS_PER_APP:
-                        print(f"  Reached maximum limit of {MAX_REVIEWS_PER_APP} reviews for this app")
-                    break
-                
-                time.sleep(SLEEP_SECONDS)
-
-            print(f"Completed {app_name}: {app_review_count} reviews")
-            
+            _fetch_app_reviews(client, limiter, app_meta, state.get(app_meta.get("appId"), {}), write)
         except Exception as e:
-            print(f"Failed to fetch reviews for {app_id}: {e}")
+            print(f"Failed to fetch reviews for {app_meta.get('appId')}: {e}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            list(pool.map(fetch, apps_metadata))
+    finally:
+        writer.close()
+    # pages written before an app failed count too
+    return writer.written
 
-    return total_reviews
 
 def main():
     print("Starting Google Play extraction pipeline...")
     print(f"Raw data will be saved to: {RAW_DATA_PATH}\n")
 
-    apps_metadata = extract_apps_metadata()
+    limiter = _limiter()
+    apps_metadata = extract_apps_metadata(limiter=limiter)
 
     with open(f"{RAW_DATA_PATH}/apps_metadata.json", "w", encoding="utf-8") as f:
         json.dump(apps_metadata, f, ensure_ascii=False, indent=2, default=json_serializer)
 
     print(f"\nSaved {len(apps_metadata)} apps metadata records")
 
-    total_reviews = extract_apps_reviews(apps_metadata)
+    total_reviews = extract_apps_reviews(apps_metadata, limiter=limiter,
+                                         full_refresh="--full" in sys.argv[1:])
 
     print(f"\nTotal reviews saved: {total_reviews}")
     print("Extraction completed successfully")
 
+
 if __name__ == "__main__":
     main()
@@ -1,99 +1,537 @@
+import gzip
+import io
 import json
+import mmap
 import os
 import csv
-import re
-from typing import List, Dict, Any, Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator, TextIO
 import config
+import schema
 
-# regex patterns for numeric detection
-type_patterns = {
-    'int': re.compile(r"^-?\d+$"),
-    'float': re.compile(r"^-?\d+\.?\d*$"),
-}
+try:
+    import orjson
+except ImportError:  # optional faster decoder for JSONL
+    orjson = None
 
-def _parse_value(val: Any) -> Union[str, int, float, None]:
-    if val is None:
-        return None
-    v = str(val).strip()
-    if v == '' or v.upper() in ('NULL', 'NONE'):
-        return None
-    if type_patterns['int'].match(v):
-        return int(v)
-    if type_patterns['float'].match(v):
-        return float(v)
-    return v
+# compressed NDJSON shards written by the extractor
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
 
+def detect_json_format(filepath: str) -> str:
+    """Classify a JSON file from its first bytes without parsing the rest.
+
+    Returns ``'array'``, ``'jsonl'`` (the first line is a complete JSON
+    value), ``'object'`` (one, possibly pretty-printed, document) or
+    ``'empty'``.
+    """
+    with open(filepath, 'rb') as f:
+        skipped = 0
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                return 'empty'
+            stripped = chunk.lstrip(b'\xef\xbb\xbf \t\r\n')
+            if stripped:
+                break
+            skipped += len(chunk)
+        if stripped.startswith(b'['):
+            return 'array'
+        # only the first record's line is read, however large the file
+        f.seek(skipped + len(chunk) - len(stripped))
+        head = f.readline()
+    try:
+        _decode_line(head)
+        return 'jsonl'
+    except ValueError:
+        return 'object'
 
 
-def load_json_file(filepath: str) -> List[Dict[str, Any]]:
+def load_json_file(filepath: str, workers: int = None) -> List[Dict[str, Any]]:
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"File not found: {filepath}")
-    
+
+    fmt = detect_json_format(filepath)
+    if fmt == 'jsonl':
+        return load_jsonl_file(filepath, workers=workers)
+    if fmt == 'empty':
+        return []
     with open(filepath, 'r', encoding='utf-8') as f:
         try:
             data = json.load(f)
-            if isinstance(data, list):
-                return data
-            elif isinstance(data, dict):
-                return [data]
+        except json.JSONDecodeError:
+            # damaged array/document: salvage whatever lines parse on their own
+            return load_jsonl_file(filepath, workers=1)
+    if isinstance(data, list):
+        return data
+    elif isinstance(data, dict):
+        return [data]
+    return []
+
+
+def _decode_line(line: bytes) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # orjson is stricter (e.g. integers beyond 64 bits); let json decide
+            pass
+    return json.loads(line)
+
+
+def _split_byte_ranges(filepath: str, parts: int, start: int = 0) -> List[Tuple[int, int]]:
+    """Split ``[start, EOF)`` into up to ``parts`` ranges ending on newlines."""
+    size = os.path.getsize(filepath)
+    parts = max(1, min(parts, (size - start) // config.JSONL_MIN_CHUNK_BYTES))
+    bounds = [start]
+    with open(filepath, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(start + (size - start) * i // parts)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# (record keys, fields) -> keys to drop, see _project
+_DROP_KEYS: Dict[Tuple[tuple, frozenset], List[str]] = {}
+
+
+def _project(record: Any, fields: Optional[frozenset]) -> Any:
+    """Drop keys outside ``fields`` in place.
+
+    Raw records nearly always share one key order, so the keys to drop are
+    cached per key tuple instead of recomputed for every record.
+    """
+    if fields is None or not isinstance(record, dict):
+        return record
+    keys = tuple(record)
+    drop = _DROP_KEYS.get((keys, fields))
+    if drop is None:
+        drop = _DROP_KEYS[(keys, fields)] = [k for k in keys if k not in fields]
+    for k in drop:
+        del record[k]
+    return record
+
+
+def _parse_jsonl_range(filepath: str, start: int, end: int,
+                       fields: frozenset = None) -> Tuple[List[Any], List[str]]:
+    """Decode the lines in ``[start, end)``; returns (records, warnings).
+
+    The file is memory-mapped and each newline-aligned block of about
+    ``config.MMAP_BLOCK_BYTES`` is copied out of the map and split into
+    lines, every one of which is decoded in full.  With ``fields`` the other
+    keys are dropped after decoding (see :func:`_project`): this bounds what
+    is kept per record, not what is parsed.  Parallelism comes from the
+    process pool reading separate byte ranges (:func:`load_jsonl_file`).
+    """
+    records = []
+    warnings = []
+    if end <= start:
+        return records, warnings
+    block = max(1, config.MMAP_BLOCK_BYTES)
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            stop = min(pos + block, end)
+            if stop < end:
+                nl = mm.rfind(b'\n', pos, stop)
+                if nl < 0:
+                    nl = mm.find(b'\n', stop, end)
+                stop = end if nl < 0 else nl + 1
+            for line in mm[pos:stop].split(b'\n'):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(_project(_decode_line(line), fields))
+                except ValueError as e:
+                    warnings.append(f"Warning: Skipping invalid JSON line: {e}")
+            pos = stop
+    return records, warnings
+
+
+def load_jsonl_file(filepath: str, offset: int = 0, workers: int = None,
+                    fields: frozenset = None) -> List[Dict[str, Any]]:
+    """Read a JSONL file, decoding newline-aligned byte ranges in parallel.
+
+    Files smaller than ``config.JSONL_MIN_CHUNK_BYTES`` per worker are read in
+    a single range.  Invalid lines are skipped with a warning.
+    """
+    tasks = [('jsonl', filepath, start, end, fields, None)
+             for start, end in _split_byte_ranges(filepath, _resolve_workers(workers), offset)]
+    return _run_units(tasks, len(tasks))
+
+
+def _first_char(f: TextIO) -> str:
+    """Return the first non-whitespace character of ``f`` ('' when empty)."""
+    while True:
+        ch = f.read(1)
+        if not ch or not ch.isspace():
+            return ch
+
+
+def _iter_json_array(f: TextIO, chunk_size: int) -> Iterator[Any]:
+    """Decode the elements of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = buf.index('[') + 1
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            if pos >= len(buf):
+                raise json.JSONDecodeError("need more data", buf, pos)
+            obj, end = decoder.raw_decode(buf, pos)
+            # a value that ends exactly at the buffer edge may be truncated
+            if end == len(buf) and not eof:
+                raise json.JSONDecodeError("need more data", buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield obj
+        pos = end
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+
+
+def iter_json_file(filepath: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Lazily yield records from a JSON array, a single JSON object or JSONL.
+
+    Unlike :func:`load_json_file` only one record (plus a read buffer) is held
+    in memory at a time.
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"File not found: {filepath}")
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        first = _first_char(f)
+        f.seek(0)
+        if first == '[':
+            yield from _iter_json_array(f, chunk_size)
+            return
+        if not first:
+            return
+        # a pretty-printed single object does not parse line by line
+        head = f.readline()
+        try:
+            json.loads(head)
         except json.JSONDecodeError:
             f.seek(0)
-            data = []
-            for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        data.append(json.loads(line))
-                    except json.JSONDecodeError as e:
-                        print(f"Warning: Skipping invalid JSON line: {e}")
-            return data
-
-
-def load_csv_file(filepath: str) -> List[Dict[str, Any]]:
+            yield json.load(f)
+            return
+        f.seek(0)
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Warning: Skipping invalid JSON line: {e}")
+
+
+def iter_jsonl_file(filepath: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield records of a JSONL file starting at byte ``offset`` (a line start)."""
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield _decode_line(line)
+                except ValueError as e:
+                    print(f"Warning: Skipping invalid JSON line: {e}")
+
+
+def _open_compressed(filepath: str):
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, 'rb')
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(f"reading {os.path.basename(filepath)} requires zstandard "
+                          "(pip install zstandard)") from e
+    raw = open(filepath, 'rb')
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(
+        raw, read_across_frames=True, closefd=True))
+
+
+def iter_compressed_jsonl(filepath: str) -> Iterator[Dict[str, Any]]:
+    """Yield records of a gzip or zstd compressed JSONL file.
+
+    Compressed streams cannot be entered at a byte offset, so they are
+    always read whole (and in one piece per file when ingesting in parallel).
+    """
+    with _open_compressed(filepath) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield _decode_line(line)
+                except ValueError as e:
+                    print(f"Warning: Skipping invalid JSON line: {e}")
+
+
+def _iter_mmap_lines(mm: mmap.mmap, pos: int) -> Iterator[str]:
+    """Yield decoded lines (with their line endings) of a mapped file."""
+    size = len(mm)
+    while pos < size:
+        nl = mm.find(b'\n', pos)
+        stop = size if nl < 0 else nl + 1
+        yield mm[pos:stop].decode('utf-8')
+        pos = stop
+
+
+def iter_csv_file(filepath: str, offset: int = 0, fields: frozenset = None,
+                  schema_name: str = None, bad: Dict[str, int] = None) -> Iterator[Dict[str, Any]]:
+    """Lazily yield typed rows from a CSV file.
+
+    The file is memory-mapped and rows are built like ``csv.DictReader``
+    would.  The header is compiled once against the ``schema_name`` schema
+    (see :mod:`schema`) into one converter per column; cells that do not fit
+    their declared type become None and are counted per column in ``bad``.
+    With ``fields`` only those columns are converted and kept.  With
+    ``offset`` the header is still taken from the first line, and rows are
+    read from that byte position on (used for appended batches).
+    """
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"CSV not found: {filepath}")
-    rows: List[Dict[str, Any]] = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            normalized = {k: _parse_value(v) for k, v in r.items()}
-            rows.append(normalized)
-    return rows
+    if os.path.getsize(filepath) == 0:
+        return
+    if bad is None:
+        bad = {}
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        reader = csv.reader(_iter_mmap_lines(mm, 0))
+        header = next(reader, None)
+        if header is None:
+            return
+        if offset:
+            reader = csv.reader(_iter_mmap_lines(mm, offset))
+        width = len(header)
+        columns = schema.compile_columns(schema_name, header, fields)
+        for row in reader:
+            if not row:
+                continue
+            rec = schema.convert_row(row, columns, bad)
+            if fields is None and len(row) > width:
+                rec[None] = row[width:]
+            yield rec
+
+
+def iter_source(filepath: str, offset: int = 0, schema_name: str = None) -> Iterator[Dict[str, Any]]:
+    """Yield raw records of any supported source file from byte ``offset``."""
+    if filepath.endswith(COMPRESSED_SUFFIXES):
+        yield from iter_compressed_jsonl(filepath)
+    elif filepath.endswith('.csv'):
+        yield from iter_csv_file(filepath, offset, schema_name=schema_name)
+    elif offset:
+        yield from iter_jsonl_file(filepath, offset)
+    else:
+        yield from iter_json_file(filepath)
+
+
+def load_csv_file(filepath: str, fields: frozenset = None, schema_name: str = None,
+                  bad: Dict[str, int] = None) -> List[Dict[str, Any]]:
+    return list(iter_csv_file(filepath, fields=fields, schema_name=schema_name, bad=bad))
+
+
+def _bad_values_warning(path: str, bad: Dict[str, int]) -> str:
+    return (f"Warning: {os.path.basename(path)}: {sum(bad.values())} bad values set to null "
+            f"({schema.format_bad_values(bad)})")
+
+
+def _read_unit(unit: Tuple[str, str, int, int, Optional[frozenset], Optional[str]]
+               ) -> Tuple[List[Dict[str, Any]], List[str], Optional[str]]:
+    """Parse one work unit; runs inside pool workers.
+
+    A unit is ``('jsonl', path, start, end, fields, schema_name)`` for a byte
+    range of a JSONL file or ``('file', path, offset, -1, fields,
+    schema_name)`` for a whole CSV/JSON/compressed source.  Returns (records,
+    warnings, error).
+    """
+    kind, path, start, end, fields, schema_name = unit
+    try:
+        if kind == 'jsonl':
+            records, warnings = _parse_jsonl_range(path, start, end, fields)
+        elif path.endswith(COMPRESSED_SUFFIXES):
+            records, warnings = [_project(r, fields) for r in iter_compressed_jsonl(path)], []
+        elif path.endswith('.csv'):
+            bad: Dict[str, int] = {}
+            records = list(iter_csv_file(path, start, fields, schema_name, bad))
+            warnings = [_bad_values_warning(path, bad)] if bad else []
+        else:
+            records, warnings = [_project(r, fields) for r in load_json_file(path, workers=1)], []
+    except Exception as e:
+        return [], [], str(e)
+    if schema_name and config.INTERN_CATEGORICALS:
+        # here rather than in the parent, which would need another pass;
+        # pickling keeps the values shared within the unit
+        intern = schema.CategoricalInterner(schema_name).intern
+        for rec in records:
+            intern(rec)
+    return records, warnings, None
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    if workers is None:
+        workers = config.INGEST_WORKERS
+    return workers or os.cpu_count() or 1
 
 
-def ingest_apps_metadata() -> List[Dict[str, Any]]:
+def _run_units(units: List[tuple], workers: int) -> List[Dict[str, Any]]:
+    """Run units (serially or in a process pool) and concatenate their records
+    in ``units`` order; a source with any failing unit is skipped whole."""
+    workers = min(workers, len(units))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_read_unit, units))
+    else:
+        results = [_read_unit(unit) for unit in units]
+
+    failed = {}
+    for (_, path, *_), (_, _, error) in zip(units, results):
+        if error is not None:
+            failed.setdefault(path, error)
+    for path, error in failed.items():
+        print(f"Skipping {os.path.basename(path)}: {error}")
+
+    data: List[Dict[str, Any]] = []
+    for (_, path, *_), (records, warnings, _) in zip(units, results):
+        if path in failed:
+            continue
+        for warning in warnings:
+            print(warning)
+        data.extend(records)
+    return data
+
+
+def read_sources(tasks: List[Tuple[str, int]], workers: int = None,
+                 fields: frozenset = None, schema_name: str = None) -> List[Dict[str, Any]]:
+    """Parse ``(path, offset)`` sources and concatenate their records.
+
+    With more than one worker, CSV/JSON files and newline-aligned byte ranges
+    of JSONL files are parsed together in one process pool; records are
+    still concatenated in ``tasks`` order, so the result does not depend on
+    which worker finishes first.  ``fields`` restricts records to those keys
+    and CSV cells are converted with the ``schema_name`` schema, whose
+    categorical columns are interned by the workers (see
+    ``config.INTERN_CATEGORICALS``).
+    """
+    workers = _resolve_workers(workers)
+    units = []
+    for path, offset in tasks:
+        if path.endswith(COMPRESSED_SUFFIXES):
+            units.append(('file', path, 0, -1, fields, schema_name))
+        elif not path.endswith('.csv') and (offset or detect_json_format(path) == 'jsonl'):
+            units.extend(('jsonl', path, start, end, fields, schema_name)
+                         for start, end in _split_byte_ranges(path, workers, offset))
+        else:
+            units.append(('file', path, offset, -1, fields, schema_name))
+    return _run_units(units, workers)
+
+
+def ingest_apps_metadata(workers: int = None) -> List[Dict[str, Any]]:
     """Read applications metadata from raw JSON and any supplemental CSVs."""
     print("Ingesting apps metadata...")
-    data: List[Dict[str, Any]] = []
-    try:
-        data.extend(load_json_file(config.APPS_METADATA_RAW))
-    except FileNotFoundError:
+    if not os.path.exists(config.APPS_METADATA_RAW):
         print("No primary metadata JSON found")
-    # extra CSV resources
-    for fname in os.listdir(config.RAW_DATA_DIR):
-        if fname.endswith('.csv') and 'apps' in fname:
-            try:
-                data.extend(load_csv_file(os.path.join(config.RAW_DATA_DIR, fname)))
-            except Exception as e:
-                print(f"Skipping CSV {fname}: {e}")
+    data = read_sources([(path, 0) for path in app_sources()], workers, schema_name='apps')
     print(f"Loaded {len(data)} app records")
     return data
 
 
-def ingest_apps_reviews() -> List[Dict[str, Any]]:
+def _app_csv_sources() -> List[str]:
+    return [os.path.join(config.RAW_DATA_DIR, fname)
+            for fname in sorted(os.listdir(config.RAW_DATA_DIR))
+            if fname.endswith('.csv') and 'apps' in fname]
+
+
+def _review_csv_sources() -> List[str]:
+    return [os.path.join(config.RAW_DATA_DIR, fname)
+            for fname in sorted(os.listdir(config.RAW_DATA_DIR))
+            if fname.endswith('.csv') and 'note_taking' in fname]
+
+
+def _review_shard_sources() -> List[str]:
+    """Shards written by the extractor next to the primary reviews file
+    (``apps_reviews-*.json``, optionally ``.gz`` / ``.zst``)."""
+    stem = os.path.splitext(os.path.basename(config.APPS_REVIEWS_RAW))[0] + '-'
+    return [os.path.join(config.RAW_DATA_DIR, fname)
+            for fname in sorted(os.listdir(config.RAW_DATA_DIR))
+            if fname.startswith(stem) and fname.endswith(('.json', '.json.gz', '.json.zst'))]
+
+
+def app_sources() -> List[str]:
+    """Existing raw files that feed apps metadata, in ingestion order."""
+    primary = [config.APPS_METADATA_RAW] if os.path.exists(config.APPS_METADATA_RAW) else []
+    return primary + _app_csv_sources()
+
+
+def review_sources() -> List[str]:
+    """Existing raw files that feed reviews, in ingestion order."""
+    primary = [config.APPS_REVIEWS_RAW] if os.path.exists(config.APPS_REVIEWS_RAW) else []
+    return primary + _review_shard_sources() + _review_csv_sources()
+
+
+def review_fields() -> Optional[frozenset]:
+    """Raw review keys kept at ingest time (None keeps every key).
+
+    Every review column and alias of the schema, configured ones included,
+    is always kept.
+    """
+    if config.REVIEW_RAW_FIELDS is None:
+        return None
+    return frozenset(config.REVIEW_RAW_FIELDS) | schema.raw_names('reviews')
+
+
+def ingest_apps_reviews(workers: int = None) -> List[Dict[str, Any]]:
     """Read application reviews from raw JSON and any supplemental CSVs/batches."""
     print("Ingesting apps reviews...")
-    data: List[Dict[str, Any]] = []
-    try:
-        data.extend(load_json_file(config.APPS_REVIEWS_RAW))
-    except FileNotFoundError:
+    if not os.path.exists(config.APPS_REVIEWS_RAW):
         print("No primary reviews JSON found")
-    # ingest CSV batches
-    for fname in os.listdir(config.RAW_DATA_DIR):
-        if fname.endswith('.csv') and 'note_taking' in fname:
-            try:
-                data.extend(load_csv_file(os.path.join(config.RAW_DATA_DIR, fname)))
-            except Exception as e:
-                print(f"Skipping CSV {fname}: {e}")
+    data = read_sources([(path, 0) for path in review_sources()], workers,
+                        fields=review_fields(), schema_name='reviews')
     print(f"Loaded {len(data)} review records")
     return data
+
+
+def iter_apps_reviews() -> Iterator[Dict[str, Any]]:
+    """Streaming counterpart of :func:`ingest_apps_reviews`.
+
+    Records are yielded one at a time from the same sources, so memory use
+    does not grow with the size of the raw files.
+    """
+    print("Streaming apps reviews...")
+    count = 0
+    fields = review_fields()
+    encode = schema.CategoricalInterner('reviews').intern if config.INTERN_CATEGORICALS else (lambda rec: rec)
+    try:
+        for rec in iter_json_file(config.APPS_REVIEWS_RAW):
+            count += 1
+            yield encode(_project(rec, fields))
+    except FileNotFoundError:
+        print("No primary reviews JSON found")
+    for path in _review_shard_sources():
+        for rec in iter_source(path):
+            count += 1
+            yield encode(_project(rec, fields))
+    for path in _review_csv_sources():
+        bad: Dict[str, int] = {}
+        try:
+            for rec in iter_csv_file(path, fields=fields, schema_name='reviews', bad=bad):
+                count += 1
+                yield encode(rec)
+        except Exception as e:
+            print(f"Skipping rest of CSV {os.path.basename(path)}: {e}")
+        if bad:
+            print(_bad_values_warning(path, bad))
+    print(f"Streamed {count} review records")
@@ -0,0 +1,285 @@
+"""Stage-level instrumentation of pipeline runs.
+
+A :class:`RunReport` is activated for the duration of a run; the pipeline
+wraps its steps in :func:`stage`, which records per stage:
+
+* wall and CPU time (``time.perf_counter`` / ``time.process_time``);
+* the RSS growth over the stage and the peak RSS reached during it (Linux
+  only: the kernel's high-water mark is reset per stage through
+  ``/proc/self/clear_refs``), and with ``trace_memory`` the peak traced
+  Python memory of the stage and its top allocation sites;
+* rows in and out, as set on the yielded :class:`Stage` by the caller;
+* bytes read and written by the process (``/proc/self/io``, Linux only;
+  reads done in ingest worker processes are not included).
+
+With ``cprofile`` each outermost stage also runs under :mod:`cProfile`; its
+stats are written next to the report and the top functions added to it.
+Stages nest (e.g. saves inside a streaming stage) and are listed in the
+order they finish.  :func:`stage` outside an active report only times the
+block, so instrumented helpers can be called on their own.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import config
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# functions / allocation sites listed per profiled stage
+TOP_ENTRIES = 10
+
+_active: Optional['RunReport'] = None
+
+
+def _io_counters() -> Optional[Dict[str, int]]:
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return {'read': int(fields['rchar']), 'written': int(fields['wchar'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _rss() -> Optional[int]:
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _peak_rss() -> Optional[int]:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _max_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Stage:
+    """Measurements of one stage; callers set ``rows_in`` and ``rows_out``."""
+
+    def __init__(self, name: str, parent: Optional['Stage'] = None):
+        self.name = name
+        self.parent = parent
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        # the kernel's peak is reset per stage, so the run keeps its own
+        self._resets_rss = False
+        self._peak_rss: Optional[int] = None
+        self.bytes_read: Optional[int] = None
+        self.bytes_written: Optional[int] = None
+        self.rss_growth_bytes: Optional[int] = None
+        self.peak_rss_bytes: Optional[int] = None
+        self.peak_traced_bytes: Optional[int] = None
+        self.top_functions: List[List[Any]] = []
+        self.top_allocations: List[List[Any]] = []
+        self.cprofile_path: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {
+            'name': self.name,
+            'parent': self.parent.name if self.parent else None,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'rss_growth_bytes': self.rss_growth_bytes,
+            'peak_rss_bytes': self.peak_rss_bytes,
+        }
+        if self.peak_traced_bytes is not None:
+            out['peak_traced_bytes'] = self.peak_traced_bytes
+        if self.top_allocations:
+            out['top_allocations'] = self.top_allocations
+        if self.cprofile_path:
+            out['cprofile_path'] = self.cprofile_path
+            out['top_functions'] = self.top_functions
+        return out
+
+
+class RunReport:
+    """Stages and metadata of one run, written as JSON by :meth:`save`;
+    its ``max_rss_bytes`` is the peak RSS of the process over the run."""
+
+    def __init__(self, run_id: str = None, cprofile: bool = False, trace_memory: bool = False,
+                 directory: str = None):
+        self.run_id = run_id or datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        self.cprofile = cprofile
+        self.trace_memory = trace_memory
+        self.directory = directory or config.RUN_REPORT_DIR
+        self.stages: List[Stage] = []
+        self.info: Dict[str, Any] = {}
+        self._stack: List[Stage] = []
+        self._started_tracing = False
+        self._start = (0.0, 0.0)
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        # the kernel's peak is reset per stage, so the run keeps its own
+        self._resets_rss = False
+        self._peak_rss: Optional[int] = None
+
+    def __enter__(self) -> 'RunReport':
+        global _active
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._peak_rss = _max_rss()
+        self._resets_rss = _reset_peak_rss()
+        self._start = (time.perf_counter(), time.process_time())
+        self._previous, _active = _active, self
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _active
+        _active = self._previous
+        self.wall_seconds = time.perf_counter() - self._start[0]
+        self.cpu_seconds = time.process_time() - self._start[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def max_rss_bytes(self) -> Optional[int]:
+        peaks = [p for p in (self._peak_rss, _peak_rss(), _max_rss()) if p is not None]
+        return max(peaks) if peaks else None
+
+    def stage_named(self, name: str) -> Optional[Stage]:
+        return next((s for s in self.stages if s.name == name), None)
+
+    def _profile_path(self, name: str) -> str:
+        safe = re.sub(r'[^\w.-]', '_', name)
+        return os.path.join(self.directory, f"run-{self.run_id}-{safe}.prof")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.info, run_id=self.run_id, wall_seconds=round(self.wall_seconds, 6),
+                    cpu_seconds=round(self.cpu_seconds, 6), max_rss_bytes=self.max_rss_bytes(),
+                    stages=[s.to_dict() for s in self.stages])
+
+    def save(self) -> str:
+        """Write the report as ``run-<run_id>.json`` in its directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"run-{self.run_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+def _top_functions(profiler: cProfile.Profile) -> List[List[Any]]:
+    entries = sorted(pstats.Stats(profiler).stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [[f"{func} ({os.path.basename(path)}:{line})", calls, round(cumulative, 6)]
+            for (path, line, func), (_, calls, _, cumulative, _) in entries[:TOP_ENTRIES]]
+
+
+def _max_of(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return b if a is None else a if b is None else max(a, b)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Stage]:
+    """Measure the enclosed block as stage ``name`` of the active report."""
+    report = _active
+    parent = report._stack[-1] if report and report._stack else None
+    current = Stage(name, parent)
+    if report is None:
+        start = time.perf_counter()
+        try:
+            yield current
+        finally:
+            current.wall_seconds = time.perf_counter() - start
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if parent is not None:
+            # the peak is reset per stage, so hand the parent what it reached so far
+            parent.peak_traced_bytes = max(parent.peak_traced_bytes or 0, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    snapshot = tracemalloc.take_snapshot() if tracing and report.trace_memory and parent is None else None
+    profiler = cProfile.Profile() if report.cprofile and parent is None else None
+    io_start = _io_counters()
+    if report._resets_rss:
+        # as with tracemalloc: hand the parent its peak so far before the reset
+        if parent is not None:
+            parent.peak_rss_bytes = _max_of(parent.peak_rss_bytes, _peak_rss())
+        report._peak_rss = _max_of(report._peak_rss, _peak_rss())
+        _reset_peak_rss()
+    rss_start = _rss()
+    report._stack.append(current)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield current
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        current.wall_seconds = time.perf_counter() - start_wall
+        current.cpu_seconds = time.process_time() - start_cpu
+        report._stack.pop()
+        io_end = _io_counters()
+        if io_start and io_end:
+            current.bytes_read = io_end['read'] - io_start['read']
+            current.bytes_written = io_end['written'] - io_start['written']
+        rss_end = _rss()
+        if rss_start is not None and rss_end is not None:
+            current.rss_growth_bytes = rss_end - rss_start
+        if report._resets_rss:
+            current.peak_rss_bytes = _max_of(current.peak_rss_bytes, _peak_rss())
+            if parent is not None:
+                parent.peak_rss_bytes = _max_of(parent.peak_rss_bytes, current.peak_rss_bytes)
+            report._peak_rss = _max_of(report._peak_rss, current.peak_rss_bytes)
+        if tracing and tracemalloc.is_tracing():
+            current.peak_traced_bytes = max(current.peak_traced_bytes or 0, tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent.peak_traced_bytes = max(parent.peak_traced_bytes or 0, current.peak_traced_bytes)
+            if snapshot is not None:
+                growth = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')[:TOP_ENTRIES]
+                current.top_allocations = [[str(s.traceback), s.size_diff, s.count_diff] for s in growth]
+        if profiler is not None:
+            os.makedirs(report.directory, exist_ok=True)
+            current.cprofile_path = report._profile_path(name)
+            profiler.dump_stats(current.cprofile_path)
+            current.top_functions = _top_functions(profiler)
+        report.stages.append(current)
+
+
+def current_report() -> Optional[RunReport]:
+    return _active
+
+
+def annotate(**info: Any) -> None:
+    """Add top-level entries (quality summaries, counts) to the active report."""
+    if _active is not None:
+        _active.info.update(info)
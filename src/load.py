@@ -1,44 +1,508 @@
 import json
 import os
-from typing import List, Dict, Any
+import textwrap
+from itertools import chain
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import config
+from ingest import iter_json_file
+from records import json_default
+from schema import StringDictionary
+from scd2 import SCD2Store
 
 
 def save_json(data: List[Dict[str, Any]], filepath: str, indent: int = 2) -> None:
+    if config.PROCESSED_FORMAT == 'ndjson':
+        save_ndjson(data, filepath)
+        return
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=indent)
+        json.dump(data, f, ensure_ascii=False, indent=indent, default=json_default)
     
     print(f"Saved {len(data)} records to {os.path.basename(filepath)}")
 
 
+def _json_array_item(row: Dict[str, Any], indent: int) -> str:
+    item = json.dumps(row, ensure_ascii=False, indent=indent, default=json_default)
+    return textwrap.indent(item, ' ' * indent, lambda _: True)
+
+
+def save_json_stream(rows: Iterable[Dict[str, Any]], filepath: str, indent: int = 2,
+                     batch_size: int = None) -> int:
+    """Write ``rows`` as a JSON array without materialising them.
+
+    Output is byte-for-byte what :func:`save_json` would produce.  Serialized
+    rows are buffered and flushed every ``batch_size`` records; the file is
+    written to a temporary path and renamed, so ``rows`` may itself be read
+    from ``filepath``.  Returns the number of records written.
+    """
+    if config.PROCESSED_FORMAT == 'ndjson':
+        return save_ndjson(rows, filepath, batch_size=batch_size)
+    if batch_size is None:
+        batch_size = config.STREAM_BATCH_SIZE
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    tmp_path = filepath + '.tmp'
+    count = 0
+    buf: List[str] = []
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            buf.append(('[\n' if count == 0 else ',\n') + _json_array_item(row, indent))
+            count += 1
+            if len(buf) >= batch_size:
+                f.write(''.join(buf))
+                buf.clear()
+        buf.append('\n]' if count else '[]')
+        f.write(''.join(buf))
+    os.replace(tmp_path, filepath)
+
+    print(f"Saved {count} records to {os.path.basename(filepath)}")
+    return count
+
+
+def save_ndjson(rows: Iterable[Dict[str, Any]], filepath: str, batch_size: int = None,
+                append: bool = False) -> int:
+    """Write ``rows`` as line-delimited JSON, one compact record per line.
+
+    Records are serialized incrementally and flushed every ``batch_size``
+    rows.  With ``append=True`` rows are added to the end of an existing
+    file; otherwise the file is written to a temporary path and renamed.
+    Returns the number of records written.
+    """
+    if batch_size is None:
+        batch_size = config.STREAM_BATCH_SIZE
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    target = filepath if append else filepath + '.tmp'
+    count = 0
+    buf: List[str] = []
+    with open(target, 'a' if append else 'w', encoding='utf-8') as f:
+        for row in rows:
+            buf.append(json.dumps(row, ensure_ascii=False, default=json_default))
+            count += 1
+            if len(buf) >= batch_size:
+                f.write('\n'.join(buf) + '\n')
+                buf.clear()
+        if buf:
+            f.write('\n'.join(buf) + '\n')
+    if not append:
+        os.replace(target, filepath)
+
+    print(f"{'Appended' if append else 'Saved'} {count} records to {os.path.basename(filepath)}")
+    return count
+
+
+def is_ndjson(filepath: str) -> bool:
+    """True unless the file holds a JSON array (first non-blank byte ``[``)."""
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(64)
+            if not chunk:
+                return True
+            stripped = chunk.lstrip()
+            if stripped:
+                return not stripped.startswith(b'[')
+
+
+def iter_ndjson_offsets(filepath: str, offset: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield ``(byte_offset, row)`` pairs from an NDJSON file.
+
+    Reading starts at ``offset``, which must be the start of a line (e.g. a
+    value previously yielded by this function or the size of the file at
+    the end of an earlier run).
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        pos = offset
+        for line in f:
+            start = pos
+            pos += len(line)
+            line = line.strip()
+            if line:
+                yield start, json.loads(line)
+
+
+def iter_ndjson(filepath: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """Lazily yield rows of an NDJSON file starting at byte ``offset``."""
+    for _, row in iter_ndjson_offsets(filepath, offset):
+        yield row
+
+
+# ---------------------------------------------------------------------------
+# columnar (Parquet / Arrow IPC) backends
+# ---------------------------------------------------------------------------
+
+# declared column types for the tables whose shape is fixed by the pipeline;
+# other tables (SCD2 history, apps_with_metrics, ...) get inferred types.
+# "dictionary" columns are low-cardinality strings stored as int32 codes plus
+# one dictionary per column (see save_columnar); user names are too diverse
+# for that and stay plain strings
+TABLE_SCHEMAS = {
+    'apps_reviews_clean': [
+        ('review_id', 'string'), ('app_id', 'dictionary'), ('app_name', 'dictionary'),
+        ('user_name', 'string'), ('content', 'string'), ('score', 'int64'),
+        ('thumbs_up_count', 'int64'), ('review_created_version', 'dictionary'),
+        ('at', 'string'), ('reply_content', 'string'), ('replied_at', 'string'),
+    ],
+    'fact_reviews': [
+        ('review_id', 'string'), ('app_key', 'int64'), ('developer_key', 'int64'),
+        ('date_key', 'int64'), ('rating', 'int64'), ('thumbs_up_count', 'int64'),
+        ('review_text', 'string'), ('review_version', 'dictionary'),
+    ],
+    'dim_apps': [
+        ('app_key', 'int64'), ('app_id', 'string'), ('app_name', 'string'),
+        ('developer_key', 'int64'), ('category_key', 'int64'), ('price', 'float64'),
+        ('is_paid', 'bool'), ('installs', 'dictionary'), ('catalog_rating', 'float64'),
+        ('ratings_count', 'int64'), ('valid_from', 'string'), ('valid_to', 'string'),
+        ('is_current', 'bool'),
+    ],
+    'dim_categories': [('category_key', 'int64'), ('category_name', 'string')],
+    'dim_developers': [
+        ('developer_key', 'int64'), ('developer_name', 'string'),
+        ('developer_website', 'string'), ('developer_email', 'string'),
+    ],
+    'dim_date': [
+        ('date_key', 'int64'), ('date', 'string'), ('year', 'int64'), ('month', 'int64'),
+        ('quarter', 'int64'), ('day_of_week', 'int64'), ('is_weekend', 'bool'),
+    ],
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            f"PROCESSED_FORMAT={config.PROCESSED_FORMAT!r} requires pyarrow "
+            "(pip install pyarrow)") from e
+    return pyarrow
+
+
+def _open_parquet_writer(path: str, schema):
+    pa = _pyarrow()
+    return pa.parquet.ParquetWriter(path, schema, compression=config.COLUMNAR_COMPRESSION)
+
+
+def _iter_parquet_batches(path: str, columns: List[str] = None):
+    pa = _pyarrow()
+    yield from pa.parquet.ParquetFile(path).iter_batches(
+        batch_size=config.STREAM_BATCH_SIZE, columns=columns)
+
+
+def _open_arrow_writer(path: str, schema):
+    pa = _pyarrow()
+    # dictionaries only grow between batches, so later batches write deltas
+    options = pa.ipc.IpcWriteOptions(compression=config.COLUMNAR_COMPRESSION,
+                                     emit_dictionary_deltas=True)
+    return pa.ipc.new_file(path, schema, options=options)
+
+
+def _iter_arrow_batches(path: str, columns: List[str] = None):
+    pa = _pyarrow()
+    # memory-mapped, so batches are read straight from the page cache
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield batch.select(columns) if columns else batch
+
+
+# format -> (file extension, open writer(path, schema), iter batches(path, columns));
+# writers expose write_table()/close()
+COLUMNAR_BACKENDS = {
+    'parquet': ('.parquet', _open_parquet_writer, _iter_parquet_batches),
+    'arrow': ('.arrow', _open_arrow_writer, _iter_arrow_batches),
+}
+
+
+def table_path(filepath: str) -> str:
+    """Return the on-disk path of a processed table for the configured format.
+
+    Config paths name the JSON files; columnar formats swap the extension.
+    """
+    backend = COLUMNAR_BACKENDS.get(config.PROCESSED_FORMAT)
+    if backend is None:
+        return filepath
+    return os.path.splitext(filepath)[0] + backend[0]
+
+
+def _table_name(filepath: str) -> str:
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+
+def _arrow_type(alias: str, pa):
+    if alias == 'dictionary':
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.type_for_alias(alias)
+
+
+def _coercer(arrow_type, pa):
+    if pa.types.is_string(arrow_type) or pa.types.is_dictionary(arrow_type):
+        return lambda v: v if v is None or isinstance(v, str) else str(v)
+    if pa.types.is_integer(arrow_type):
+        def to_int(v):
+            try:
+                return None if v is None else int(v)
+            except (TypeError, ValueError):
+                return None
+        return to_int
+    if pa.types.is_floating(arrow_type):
+        def to_float(v):
+            try:
+                return None if v is None else float(v)
+            except (TypeError, ValueError):
+                return None
+        return to_float
+    if pa.types.is_boolean(arrow_type):
+        return lambda v: None if v is None else bool(v)
+    return lambda v: v
+
+
+def _infer_schema(rows: List[Dict[str, Any]], pa):
+    """Infer one type per column; mixed or all-null columns become strings."""
+    names: Dict[str, None] = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    fields = []
+    for name in names:
+        values = [row.get(name) for row in rows]
+        try:
+            arrow_type = pa.array(values).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrow_type = pa.string()
+        if pa.types.is_null(arrow_type):
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _to_arrow(rows: List[Dict[str, Any]], schema, pa,
+              dictionaries: Dict[str, StringDictionary] = None):
+    """Convert rows to a table; dictionary columns are encoded with the
+    ``dictionaries`` kept across the batches of one file, so every batch
+    shares (a prefix of) one dictionary per column."""
+    columns = {}
+    for field in schema:
+        conv = _coercer(field.type, pa)
+        values = [conv(row.get(field.name)) for row in rows]
+        if pa.types.is_dictionary(field.type):
+            dictionary = dictionaries.setdefault(field.name, StringDictionary())
+            codes = pa.array([dictionary.encode(v) for v in values], pa.int32())
+            columns[field.name] = pa.DictionaryArray.from_arrays(
+                codes, pa.array(dictionary.values, pa.string()))
+        else:
+            columns[field.name] = values
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def save_columnar(rows: Iterable[Dict[str, Any]], filepath: str, batch_size: int = None) -> int:
+    """Write rows to a Parquet or Arrow IPC file in record batches.
+
+    Tables listed in :data:`TABLE_SCHEMAS` get their declared column types
+    (dictionary columns are encoded with one growing dictionary per column
+    for the whole file); for others the types are inferred from the first
+    batch.  Values are
+    coerced to the column type and data is compressed with
+    ``config.COLUMNAR_COMPRESSION``.  Returns the number of rows written.
+    """
+    pa = _pyarrow()
+    if batch_size is None:
+        batch_size = config.STREAM_BATCH_SIZE
+    _, open_writer, _ = COLUMNAR_BACKENDS[config.PROCESSED_FORMAT]
+    path = table_path(filepath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    declared = TABLE_SCHEMAS.get(_table_name(filepath))
+    schema = pa.schema([(name, _arrow_type(t, pa)) for name, t in declared]) if declared else None
+    dictionaries: Dict[str, StringDictionary] = {}
+
+    tmp_path = path + '.tmp'
+    writer = None
+    count = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal writer, schema
+        if schema is None:
+            schema = _infer_schema(batch, pa)
+        if writer is None:
+            writer = open_writer(tmp_path, schema)
+        writer.write_table(_to_arrow(batch, schema, pa, dictionaries))
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append(row)
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch or writer is None:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+
+    print(f"Saved {count} records to {os.path.basename(path)}")
+    return count
+
+
+def iter_columnar(filepath: str, columns: List[str] = None) -> Iterator[Dict[str, Any]]:
+    """Lazily yield rows of a columnar table, reading only ``columns``."""
+    _, _, iter_batches = COLUMNAR_BACKENDS[config.PROCESSED_FORMAT]
+    for batch in iter_batches(table_path(filepath), columns):
+        yield from batch.to_pylist()
+
+
+# ---------------------------------------------------------------------------
+# format-independent table access
+# ---------------------------------------------------------------------------
+
+def save_table(rows: Iterable[Dict[str, Any]], filepath: str) -> int:
+    """Write a processed table with the backend chosen by ``config.PROCESSED_FORMAT``."""
+    if config.PROCESSED_FORMAT in COLUMNAR_BACKENDS:
+        return save_columnar(rows, filepath)
+    return save_json_stream(rows, filepath)
+
+
+def _append_json_array(rows: List[Dict[str, Any]], filepath: str, indent: int = 2) -> bool:
+    """Append to a file written by :func:`save_json` by rewriting only its
+    closing bracket.  Returns False when the file does not end that way."""
+    with open(filepath, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end < 3:
+            return False
+        f.seek(end - 2)
+        if f.read() != b'\n]':
+            return False
+        f.seek(end - 2)
+        f.truncate()
+        f.write(''.join(',\n' + _json_array_item(row, indent) for row in rows).encode('utf-8'))
+        f.write(b'\n]')
+    return True
+
+
+def append_table(rows: List[Dict[str, Any]], filepath: str) -> int:
+    """Add ``rows`` to the end of a processed table.
+
+    NDJSON files are appended to and JSON arrays are patched in place, so
+    the cost is proportional to ``rows``.  Columnar files cannot be extended
+    in place and are rewritten batch by batch.
+    """
+    if not table_exists(filepath):
+        return save_table(rows, filepath)
+    if config.PROCESSED_FORMAT in COLUMNAR_BACKENDS:
+        save_columnar(chain(iter_columnar(filepath), rows), filepath)
+        return len(rows)
+    if is_ndjson(filepath):
+        return save_ndjson(rows, filepath, append=True)
+    if rows and not _append_json_array(rows, filepath):
+        save_json_stream(chain(iter_json_file(filepath), rows), filepath)
+        return len(rows)
+    print(f"Appended {len(rows)} records to {os.path.basename(filepath)}")
+    return len(rows)
+
+
+def table_exists(filepath: str) -> bool:
+    return os.path.exists(table_path(filepath))
+
+
+def iter_table(filepath: str, offset: int = 0, columns: List[str] = None) -> Iterator[Dict[str, Any]]:
+    """Lazily yield rows of a processed table.
+
+    Columnar formats are read from their own files, with column projection.
+    For JSON the layout is detected from the file itself, so tables written
+    before a change of ``config.PROCESSED_FORMAT`` stay readable.  Seeking by
+    byte offset is only possible for NDJSON files.
+    """
+    if config.PROCESSED_FORMAT in COLUMNAR_BACKENDS:
+        if offset:
+            raise ValueError(f"Cannot seek by byte offset in {table_path(filepath)}")
+        yield from iter_columnar(filepath, columns)
+        return
+    if is_ndjson(filepath):
+        rows = iter_ndjson(filepath, offset)
+    elif offset:
+        raise ValueError(f"Cannot seek inside JSON array file {filepath}")
+    else:
+        rows = iter_json_file(filepath)
+    if columns is None:
+        yield from rows
+    else:
+        for row in rows:
+            yield {c: row.get(c) for c in columns}
+
+
+def load_table(filepath: str, columns: List[str] = None) -> List[Dict[str, Any]]:
+    if not table_exists(filepath):
+        raise FileNotFoundError(f"File not found: {table_path(filepath)}")
+    print(f"Loading from {table_path(filepath)}")
+    return list(iter_table(filepath, columns=columns))
+
+
+def iter_processed_reviews() -> Iterator[Dict[str, Any]]:
+    """Lazily yield processed reviews; yields nothing on the first run."""
+    path = config.APPS_REVIEWS_PROCESSED
+    if not table_exists(path):
+        return
+    print(f"Streaming from {table_path(path)}")
+    yield from iter_table(path)
+
+
 def load_processed_apps():
-    path = config.APPS_METADATA_PROCESSED
-    print(f"Loading from {path}")
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_table(config.APPS_METADATA_PROCESSED)
 
 
 def load_processed_apps_scd2():
     # history table may not exist on first run
     path = config.APPS_METADATA_SCD2
-    if not os.path.exists(path):
+    if not table_exists(path):
         return []
-    print(f"Loading SCD2 history from {path}")
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    print(f"Loading SCD2 history from {table_path(path)}")
+    return list(iter_table(path))
+
+
+def load_scd2_store(key: str = 'app_id') -> SCD2Store:
+    """The SCD2 history table as an indexed :class:`scd2.SCD2Store`."""
+    return SCD2Store(load_processed_apps_scd2(), key, config.SCD2_TRACKED_COLUMNS)
+
+
+def save_scd2_store(store: SCD2Store) -> int:
+    """Persist ``store``: new versions are appended when no stored row was
+    closed, otherwise the history table is rewritten."""
+    path = config.APPS_METADATA_SCD2
+    if store.rewrite or not table_exists(path):
+        count = save_table(store.history, path)
+    else:
+        count = append_table(store.unsaved(), path) if store.unsaved() else 0
+    store.mark_saved()
+    return count
 
 
 def load_processed_reviews():
-    path = config.APPS_REVIEWS_PROCESSED
-    print(f"Loading from {path}")
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_table(config.APPS_REVIEWS_PROCESSED)
 
 
 def load_analytics_data():
-    path = config.APPS_WITH_METRICS
-    print(f"Loading from {path}")
+    return load_table(config.APPS_WITH_METRICS)
+
+
+def load_state(path: str) -> Optional[Dict[str, Any]]:
+    """Read a small JSON state document written by :func:`save_state`."""
+    if not os.path.exists(path):
+        return None
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
+
+
+def save_state(state: Dict[str, Any], path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def table_stamp(filepath: str) -> List[int]:
+    """[size, mtime_ns] of a table file, used to detect outside rewrites."""
+    st = os.stat(table_path(filepath))
+    return [st.st_size, st.st_mtime_ns]
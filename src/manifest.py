@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+import config
+
+# run manifest used by incremental runs: one fingerprint per raw source plus
+# the newest review timestamp processed so far
+
+
+def load_manifest(path: str = None) -> Dict[str, Any]:
+    path = path or config.RUN_MANIFEST
+    if not os.path.exists(path):
+        return {'sources': {}, 'max_review_at': None}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict[str, Any], path: str = None) -> None:
+    path = path or config.RUN_MANIFEST
+    manifest['updated_at'] = datetime.utcnow().isoformat()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _hash_file(path: str, prefix_size: int = None, chunk_size: int = 1 << 20) -> Tuple[str, str, bool]:
+    """Return (sha256 of file, sha256 of its first ``prefix_size`` bytes,
+    whether byte ``prefix_size - 1`` is a newline) in a single read."""
+    h = hashlib.sha256()
+    prefix_digest = None
+    prefix_newline = False
+    pos = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if prefix_size is not None and prefix_digest is None and pos + len(chunk) >= prefix_size:
+                cut = prefix_size - pos
+                h.update(chunk[:cut])
+                prefix_digest = h.hexdigest()
+                prefix_newline = cut > 0 and chunk[cut - 1:cut] == b'\n'
+                h.update(chunk[cut:])
+            else:
+                h.update(chunk)
+            if not chunk:
+                break
+            pos += len(chunk)
+    return h.hexdigest(), prefix_digest, prefix_newline
+
+
+def plan_source(path: str, previous: Dict[str, Any] = None) -> Tuple[str, int, Dict[str, Any]]:
+    """Classify a raw source against its previous fingerprint.
+
+    Returns ``(status, offset, fingerprint)`` where status is one of
+    ``new``, ``unchanged``, ``appended`` (the old content is an exact prefix
+    ending on a line boundary, so only bytes from ``offset`` need reading)
+    or ``changed``.  Files whose size and mtime match are not re-hashed.
+    """
+    st = os.stat(path)
+    if previous and previous['size'] == st.st_size and previous['mtime'] == st.st_mtime:
+        return 'unchanged', st.st_size, previous
+
+    prev_size = previous['size'] if previous else None
+    grew = prev_size is not None and st.st_size > prev_size
+    digest, prefix_digest, prefix_newline = _hash_file(path, prev_size if grew else None)
+    fingerprint = {'size': st.st_size, 'mtime': st.st_mtime, 'sha256': digest}
+
+    if previous is None:
+        return 'new', 0, fingerprint
+    if digest == previous['sha256']:
+        return 'unchanged', st.st_size, fingerprint
+    if grew and prefix_newline and prefix_digest == previous['sha256']:
+        return 'appended', prev_size, fingerprint
+    return 'changed', 0, fingerprint
+
+
+def plan_sources(paths: List[str], manifest: Dict[str, Any]) -> List[Tuple[str, str, int, Dict[str, Any]]]:
+    """Plan every source; entries are ``(path, status, offset, fingerprint)``.
+
+    Sources are keyed in the manifest by file name relative to the raw
+    directory.
+    """
+    known = manifest.get('sources', {})
+    return [(path, *plan_source(path, known.get(os.path.basename(path)))) for path in paths]
+
+
+def record_sources(manifest: Dict[str, Any], plan: List[Tuple[str, str, int, Dict[str, Any]]]) -> None:
+    sources = manifest.setdefault('sources', {})
+    for path, _, _, fingerprint in plan:
+        sources[os.path.basename(path)] = fingerprint
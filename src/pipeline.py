@@ -1,117 +1,726 @@
+import os
 import sys
-from datetime import datetime
+from datetime import date, datetime
 
-from ingest import ingest_apps_metadata, ingest_apps_reviews
-from transform import clean_apps_metadata, clean_apps_reviews, transform_for_analytics
+from ingest import (
+    ingest_apps_metadata,
+    ingest_apps_reviews,
+    iter_apps_reviews,
+    read_sources,
+    review_fields,
+    app_sources,
+    review_sources
+)
+from transform import (
+    clean_apps_metadata,
+    clean_apps_reviews,
+    iter_clean_apps_reviews,
+    transform_for_analytics,
+    update_review_aggregates,
+    analytics_from_aggregates,
+    build_app_dimensions,
+    iter_fact_reviews,
+    dim_date_rows
+)
 from load import (
-    save_json,
-    load_processed_apps_scd2,
-    load_processed_reviews
+    save_table,
+    append_table,
+    table_exists,
+    iter_table,
+    load_processed_apps,
+    load_scd2_store,
+    save_scd2_store,
+    load_processed_reviews,
+    iter_processed_reviews,
+    load_state,
+    save_state,
+    table_stamp
 )
 import config
-from utils import merge_reviews, scd2_update
-from quality import check_apps_metadata, check_reviews
+from manifest import load_manifest, save_manifest, plan_sources, record_sources
+from utils import merge_reviews, merge_reviews_streaming
+from quality import app_report, review_report
+from profiling import TableProfile, review_profile, load_latest_profile, save_profile, compare_profiles
+from schema import format_bad_values, to_utc_stamp
+from review_index import ReviewIndex
+from instrumentation import RunReport, stage, annotate, current_report
 
 
-def _print_quality_report(app_issues, review_issues):
+def _print_quality_report(*reports):
+    annotate(quality={report.name: report.summary() for report in reports})
     print("\n" + "=" * 60)
     print("DATA QUALITY CHECKS")
     print("=" * 60)
-    if not app_issues and not review_issues:
+    if not any(report.failed for report in reports):
         print("No obvious quality issues detected.")
-    if app_issues:
-        print(f"\nApps metadata issues ({len(app_issues)}):")
-        for issue in app_issues[:10]:
-            print("  -", issue)
-    if review_issues:
-        print(f"\nReview issues ({len(review_issues)}):")
-        for issue in review_issues[:10]:
+    for report in reports:
+        if not report.failed:
+            continue
+        rates = report.rates()
+        print(f"\n{report.name.capitalize()} issues ({report.failed} in {report.rows} rows):")
+        for rule, count in report.counts.items():
+            if count:
+                print(f"  {rule}: {count} ({rates['rules'][rule]:.2%})")
+        nulls = ', '.join(f"{c}={r:.2%}" for c, r in rates['nulls'].items() if r)
+        if nulls:
+            print(f"  null rates: {nulls}")
+        for issue in report.issues():
             print("  -", issue)
 
 
+def _report_profile(profile, delta=False):
+    """Print a column profile and its drift from the previous run's, then
+    save it for the next run.
 
-def run_pipeline():
-    start_time = datetime.now()
+    A ``delta`` profile (incremental runs) only covers the reviews new to the
+    table; it is merged into the previous profile first, so the comparison
+    and the saved baseline describe the whole table like those of full runs.
+    """
+    print("\n" + "=" * 60)
+    print("COLUMN PROFILE")
     print("=" * 60)
-    print("STARTING DATA PIPELINE")
+    if not profile.rows:
+        print("No new reviews to profile.")
+        return
+    previous = load_latest_profile(profile.name)
+    if delta and previous is not None:
+        table = TableProfile.from_dict(previous.to_dict())
+        table.merge(profile)
+        profile = table
+    for column, stats in profile.stats().items():
+        parts = [f"nulls {stats['null_rate']:.1%}"]
+        if 'distinct' in stats:
+            parts.append(f"~{stats['distinct']} distinct")
+        if 'quantiles' in stats:
+            q = stats['quantiles']
+            parts.append(f"p50 {q['p50']:g} p95 {q['p95']:g}" if q['p50'] is not None else "no numbers")
+        if 'min' in stats:
+            parts.append(f"range {stats['min']} .. {stats['max']}")
+        if stats.get('top'):
+            parts.append("top " + ', '.join(f"{v} ({c})" for v, c in stats['top'][:3]))
+        print(f"  {column}: {'; '.join(parts)}")
+    if previous is not None:
+        drift = compare_profiles(previous, profile)
+        print("Drift from previous run: " + ("; ".join(drift) if drift else "none"))
+    save_profile(profile)
+
+
+def _save(rows, path, write=save_table):
+    """Write a table as its own ``save:<table>`` stage."""
+    with stage('save:' + os.path.splitext(os.path.basename(path))[0]) as saved:
+        saved.rows_out = write(rows, path)
+    return saved.rows_out
+
+
+def _save_history(history):
+    with stage('save:' + os.path.splitext(os.path.basename(config.APPS_METADATA_SCD2))[0]) as saved:
+        saved.rows_out = save_scd2_store(history)
+
+
+def _ingest_apps():
+    with stage('ingest_apps') as s:
+        raw_apps = ingest_apps_metadata()
+        s.rows_out = len(raw_apps)
+    with stage('clean_apps') as s:
+        s.rows_in = len(raw_apps)
+        clean_apps = clean_apps_metadata(raw_apps)
+        s.rows_out = len(clean_apps)
+    return clean_apps
+
+
+def _apply_scd2(clean_apps):
+    with stage('scd2') as s:
+        s.rows_in = len(clean_apps)
+        history = load_scd2_store()
+        history.update(clean_apps)
+        s.rows_out = len(history)
+    return history
+
+
+def _update_apps():
+    """Ingest, clean and check app metadata and apply the SCD2 update."""
+    clean_apps = _ingest_apps()
+    with stage('quality_apps') as s:
+        s.rows_in = len(clean_apps)
+        app_quality = app_report(clean_apps)
+
+    history = _apply_scd2(clean_apps)
+    return history.current_rows(), history, app_quality
+
+
+def _write_analytics(current_apps):
+    """Aggregate the processed reviews file (streamed) into apps_with_metrics."""
+    print("Transforming data for analytics...")
+    with stage('analytics') as s:
+        aggregates = update_review_aggregates({}, iter_processed_reviews())
+        analytics_data = analytics_from_aggregates(current_apps, aggregates)
+        s.rows_out = len(analytics_data)
+        print(f"Created {len(analytics_data)} analytics-ready records")
+        _save(analytics_data, config.APPS_WITH_METRICS)
+    return len(analytics_data), aggregates
+
+
+def _write_dimensions(dims):
+    _save(dims['dim_apps'], config.DIM_APPS)
+    _save(dims['dim_categories'], config.DIM_CATEGORIES)
+    _save(dims['dim_developers'], config.DIM_DEVELOPERS)
+
+
+def _write_star_schema(app_versions):
+    """Stream the processed reviews file into fact_reviews and write the dims."""
+    with stage('star_schema') as s:
+        dims = build_app_dimensions(app_versions)
+        dim_date = {}
+        # facts are built while they are written, inside the save stage
+        s.rows_out = _save(iter_fact_reviews(iter_processed_reviews(), dims['app_index'], dim_date),
+                           config.FACT_REVIEWS)
+        _write_dimensions(dims)
+        _save(dim_date_rows(dim_date), config.DIM_DATE)
+    return dims, dim_date
+
+
+def _star_state(dims, dim_date, aggregates):
+    """Persistable surrogate-key maps and running aggregates for delta builds."""
+    return {
+        'category_keys': dims['category_keys'],
+        'developer_keys': dims['developer_keys'],
+        'app_index': dims['app_index'],
+        'dates': {d.isoformat(): key for d, key in dim_date.items()},
+        'aggregates': aggregates,
+        'fact_stamp': table_stamp(config.FACT_REVIEWS)
+    }
+
+
+def _star_state_matches(state, dims):
+    """A delta build is only valid if the app dimensions would get the same
+    keys and fact_reviews has not been rewritten by another run mode."""
+    return (state is not None
+            and table_exists(config.FACT_REVIEWS)
+            and state['fact_stamp'] == table_stamp(config.FACT_REVIEWS)
+            and state['category_keys'] == dims['category_keys']
+            and state['developer_keys'] == dims['developer_keys']
+            and state['app_index'] == dims['app_index'])
+
+
+def _rebuild_outputs(current_apps, app_versions):
+    analytics_count, aggregates = _write_analytics(current_apps)
+    dims, dim_date = _write_star_schema(app_versions)
+    return analytics_count, _star_state(dims, dim_date, aggregates)
+
+
+def _extend_outputs(current_apps, dims, state, new_reviews):
+    """Apply a pure-append review delta to the analytics and star schema.
+
+    Running aggregates are updated from the delta only, new fact and date
+    rows are appended with the persisted keys, and the small app dimensions
+    are rewritten.  The result equals a full rebuild.
+    """
+    print(f"Extending analytics and star schema with {len(new_reviews)} new reviews...")
+    with stage('analytics') as s:
+        s.rows_in = len(new_reviews)
+        aggregates = update_review_aggregates(state['aggregates'], new_reviews)
+        analytics_data = analytics_from_aggregates(current_apps, aggregates)
+        s.rows_out = len(analytics_data)
+    _save(analytics_data, config.APPS_WITH_METRICS)
+
+    with stage('star_schema') as s:
+        s.rows_in = len(new_reviews)
+        dim_date = {date.fromisoformat(d): key for d, key in state['dates'].items()}
+        known_dates = len(dim_date)
+        s.rows_out = _save(list(iter_fact_reviews(new_reviews, dims['app_index'], dim_date)),
+                           config.FACT_REVIEWS, append_table)
+        _save([row for row in dim_date_rows(dim_date) if row['date_key'] > known_dates],
+              config.DIM_DATE, append_table)
+        _write_dimensions(dims)
+
+    state['dates'] = {d.isoformat(): key for d, key in dim_date.items()}
+    state['fact_stamp'] = table_stamp(config.FACT_REVIEWS)
+    return len(analytics_data)
+
+
+ENGINES = ('python', 'pandas', 'duckdb')
+
+
+def _run_batch(engine='python'):
+    print("\n" + "=" * 60)
+    print("STAGE 1: DATA INGESTION")
     print("=" * 60)
-    print(f"Started at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-    
-    try:
-        print("\n" + "=" * 60)
-        print("STAGE 1: DATA INGESTION")
-        print("=" * 60)
+    with stage('ingest_apps') as s:
         raw_apps = ingest_apps_metadata()
+        s.rows_out = len(raw_apps)
+    with stage('ingest_reviews') as s:
         raw_reviews = ingest_apps_reviews()
-        
-        print("\n" + "=" * 60)
-        print("STAGE 2: DATA TRANSFORMATION")
-        print("=" * 60)
-        clean_apps = clean_apps_metadata(raw_apps)
-        clean_reviews = clean_apps_reviews(raw_reviews)
+        s.rows_out = len(raw_reviews)
 
-        # data quality checks
-        app_issues = check_apps_metadata(clean_apps)
-        review_issues = check_reviews(clean_reviews)
-        _print_quality_report(app_issues, review_issues)
+    print("\n" + "=" * 60)
+    print("STAGE 2: DATA TRANSFORMATION")
+    print("=" * 60)
+    with stage('clean_apps') as s:
+        s.rows_in = len(raw_apps)
+        clean_apps = clean_apps_metadata(raw_apps)
+        s.rows_out = len(clean_apps)
+    if engine == 'pandas':
+        import vectorized
+        with stage('clean_reviews') as s:
+            s.rows_in = len(raw_reviews)
+            clean_frame = vectorized.clean_apps_reviews_frame(raw_reviews)
+            clean_reviews = vectorized.frame_records(clean_frame)
+            s.rows_out = len(clean_reviews)
+        with stage('quality_reviews') as s:
+            s.rows_in = len(clean_reviews)
+            review_quality = review_report(clean_reviews)
+    else:
+        # data quality checks run inside the cleaning pass
+        review_quality = review_report()
+        with stage('clean_reviews') as s:
+            s.rows_in = len(raw_reviews)
+            clean_reviews = clean_apps_reviews(raw_reviews, quality=review_quality)
+            s.rows_out = len(clean_reviews)
+    with stage('quality_apps') as s:
+        s.rows_in = len(clean_apps)
+        app_quality = app_report(clean_apps)
+    _print_quality_report(app_quality, review_quality)
 
-        # SCD2 update for apps metadata
-        existing_history = load_processed_apps_scd2()
-        updated_history = scd2_update(existing_history, clean_apps)
-        # derive current snapshot for analytics from history
-        current_apps = [r for r in updated_history if r.get('current_flag')]
+    # SCD2 update for apps metadata; the store indexes current rows by key
+    history = _apply_scd2(clean_apps)
+    current_apps = history.current_rows()
 
-        # incremental merge for reviews
+    # incremental merge for reviews
+    with stage('merge') as s:
         existing_reviews = []
         try:
             existing_reviews = load_processed_reviews()
         except FileNotFoundError:
             existing_reviews = []
-        merged_reviews = merge_reviews(existing_reviews, clean_reviews)
+        s.rows_in = len(existing_reviews) + len(clean_reviews)
+        if engine == 'pandas':
+            merged_frame = vectorized.merge_reviews_frame(vectorized.reviews_frame(existing_reviews),
+                                                          clean_frame)
+            merged_reviews = vectorized.frame_records(merged_frame)
+        else:
+            merged_reviews = merge_reviews(existing_reviews, clean_reviews)
+        s.rows_out = len(merged_reviews)
+    # the profile describes the stored table, not the cleaning input
+    with stage('profile') as s:
+        s.rows_in = len(merged_reviews)
+        profile = review_profile().profile(merged_reviews)
+    _report_profile(profile)
 
-        print("\nAggregating data for analytics using current snapshot...")
-        analytics_data = transform_for_analytics(current_apps, merged_reviews)
+    print("\nAggregating data for analytics using current snapshot...")
+    with stage('analytics') as s:
+        s.rows_in = len(merged_reviews)
+        if engine == 'pandas':
+            analytics_data = vectorized.transform_for_analytics_frame(current_apps, merged_frame)
+        else:
+            analytics_data = transform_for_analytics(current_apps, merged_reviews)
+        s.rows_out = len(analytics_data)
 
-        # also build star schema tables (dim/fact) if caller wants them
+    # also build star schema tables (dim/fact) if caller wants them
+    star = None
+    try:
+        from transform import build_star_schema
+        # dim_apps holds every SCD2 version; facts join the one valid at review time
+        with stage('star_schema') as s:
+            s.rows_in = len(merged_reviews)
+            star = build_star_schema(history.history_rows(), merged_reviews)
+            s.rows_out = len(star['fact_reviews'])
+    except ImportError:
         star = None
-        try:
-            from transform import build_star_schema
-            star = build_star_schema(current_apps, merged_reviews)
-        except ImportError:
-            star = None
 
+    print("\n" + "=" * 60)
+    print("STAGE 3: DATA LOADING")
+    print("=" * 60)
+    # write metadata snapshot and history
+    _save(current_apps, config.APPS_METADATA_PROCESSED)
+    _save_history(history)
+    _save(merged_reviews, config.APPS_REVIEWS_PROCESSED)
+    _save(analytics_data, config.APPS_WITH_METRICS)
+    if star is not None:
+        _save(star['dim_apps'], config.DIM_APPS)
+        _save(star['dim_categories'], config.DIM_CATEGORIES)
+        _save(star['dim_developers'], config.DIM_DEVELOPERS)
+        _save(star['dim_date'], config.DIM_DATE)
+        _save(star['fact_reviews'], config.FACT_REVIEWS)
+
+    return {
+        'apps_current': len(current_apps),
+        'apps_history': len(history),
+        'reviews_merged': len(merged_reviews),
+        'analytics': len(analytics_data)
+    }
+
+
+def _run_duckdb():
+    """:func:`_run_batch` with cleaning, merge, SCD2 change detection, star
+    schema and aggregates executed as SQL in DuckDB (see duckdb_engine)."""
+    import duckdb_engine
+
+    print("\n" + "=" * 60)
+    print("STAGE 1: DATA INGESTION")
+    print("=" * 60)
+    with stage('ingest_apps') as s:
+        raw_apps = ingest_apps_metadata()
+        s.rows_out = len(raw_apps)
+    with stage('ingest_reviews') as s:
+        raw_reviews = ingest_apps_reviews()
+        s.rows_out = len(raw_reviews)
+
+    con = duckdb_engine.connect()
+    try:
         print("\n" + "=" * 60)
-        print("STAGE 3: DATA LOADING")
+        print("STAGE 2: DATA TRANSFORMATION (duckdb engine)")
         print("=" * 60)
-        # write metadata snapshot and history
-        save_json(current_apps, config.APPS_METADATA_PROCESSED)
-        save_json(updated_history, config.APPS_METADATA_SCD2)
-        save_json(merged_reviews, config.APPS_REVIEWS_PROCESSED)
-        save_json(analytics_data, config.APPS_WITH_METRICS)
-        if star is not None:
-            save_json(star['dim_apps'], config.DIM_APPS)
-            save_json(star['dim_categories'], config.DIM_CATEGORIES)
-            save_json(star['dim_developers'], config.DIM_DEVELOPERS)
-            save_json(star['dim_date'], config.DIM_DATE)
-            save_json(star['fact_reviews'], config.FACT_REVIEWS)
-        
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        
+        with stage('clean_apps') as s:
+            s.rows_in = len(raw_apps)
+            clean_apps = clean_apps_metadata(raw_apps)
+            s.rows_out = len(clean_apps)
+        print("Cleaning apps reviews...")
+        bad = {}
+        with stage('clean_reviews') as s:
+            s.rows_in = len(raw_reviews)
+            clean_count = s.rows_out = duckdb_engine.clean_reviews(con, raw_reviews, bad)
+        if bad:
+            print(f"Coerced {sum(bad.values())} bad review values to null ({format_bad_values(bad)})")
+        print(f"Cleaned {clean_count} review records")
+        del raw_reviews
+
+        with stage('quality_apps') as s:
+            s.rows_in = len(clean_apps)
+            app_quality = app_report(clean_apps)
+        with stage('quality_reviews') as s:
+            s.rows_in = clean_count
+            review_quality = duckdb_engine.review_report(con)
+        _print_quality_report(app_quality, review_quality)
+
+        with stage('scd2') as s:
+            s.rows_in = len(clean_apps)
+            history = load_scd2_store()
+            duckdb_engine.scd2_update(con, history, clean_apps)
+            s.rows_out = len(history)
+        current_apps = history.current_rows()
+
+        with stage('merge') as s:
+            duckdb_engine.load_existing_reviews(con)
+            merged_count = s.rows_out = duckdb_engine.merge_reviews(con)
+
+        print("\nAggregating data for analytics using current snapshot...")
+        with stage('analytics') as s:
+            s.rows_in = merged_count
+            analytics_data = analytics_from_aggregates(current_apps, duckdb_engine.review_aggregates(con))
+            s.rows_out = len(analytics_data)
+        print(f"Created {len(analytics_data)} analytics-ready records")
+        with stage('star_schema') as s:
+            s.rows_in = merged_count
+            star = duckdb_engine.build_star_schema(con, history.history_rows())
+            s.rows_out = len(star['fact_reviews'])
+        with stage('fetch_reviews') as s:
+            merged_reviews = duckdb_engine.fetch_reviews(con)
+            s.rows_out = len(merged_reviews)
+    finally:
+        con.close()
+    with stage('profile') as s:
+        s.rows_in = len(merged_reviews)
+        profile = review_profile().profile(merged_reviews)
+    _report_profile(profile)
+
+    print("\n" + "=" * 60)
+    print("STAGE 3: DATA LOADING")
+    print("=" * 60)
+    _save(current_apps, config.APPS_METADATA_PROCESSED)
+    _save_history(history)
+    _save(merged_reviews, config.APPS_REVIEWS_PROCESSED)
+    _save(analytics_data, config.APPS_WITH_METRICS)
+    _save(star['dim_apps'], config.DIM_APPS)
+    _save(star['dim_categories'], config.DIM_CATEGORIES)
+    _save(star['dim_developers'], config.DIM_DEVELOPERS)
+    _save(star['dim_date'], config.DIM_DATE)
+    _save(star['fact_reviews'], config.FACT_REVIEWS)
+
+    return {
+        'apps_current': len(current_apps),
+        'apps_history': len(history),
+        'reviews_merged': merged_count,
+        'analytics': len(analytics_data)
+    }
+
+
+def _run_streaming():
+    """Generator-chained variant of :func:`_run_batch`.
+
+    Reviews flow file -> clean -> quality check -> dedup -> writer one record
+    at a time, so peak memory depends on the write batch size and the number
+    of distinct review ids rather than on the size of the raw files.
+    """
+    print("\n" + "=" * 60)
+    print("STAGE 1: APPS METADATA")
+    print("=" * 60)
+    with stage('apps') as apps:
+        current_apps, history, app_quality = _update_apps()
+        apps.rows_out = len(current_apps)
+        _save(current_apps, config.APPS_METADATA_PROCESSED)
+        _save_history(history)
+
+    print("\n" + "=" * 60)
+    print("STAGE 2: STREAMING REVIEWS (ingest -> clean -> merge -> load)")
+    print("=" * 60)
+    review_quality = review_report()
+    profile = review_profile()
+    # ingest, cleaning, checks, dedup and profiling of the merged table run
+    # inside the save of the merged stream
+    with stage('reviews') as reviews:
+        clean_stream = review_quality.observe(iter_clean_apps_reviews(iter_apps_reviews()))
+        merged = profile.observe(merge_reviews_streaming(iter_processed_reviews(), clean_stream,
+                                                         spool_dir=config.PROCESSED_DATA_DIR))
+        merged_count = reviews.rows_out = _save(merged, config.APPS_REVIEWS_PROCESSED)
+        reviews.rows_in = review_quality.rows
+    _print_quality_report(app_quality, review_quality)
+    _report_profile(profile)
+
+    print("\n" + "=" * 60)
+    print("STAGE 3: ANALYTICS AND STAR SCHEMA")
+    print("=" * 60)
+    analytics_count, _ = _write_analytics(current_apps)
+    _write_star_schema(history.history_rows())
+
+    # peak RSS as measured by the run report; traced peaks only exist with
+    # --tracemalloc, which slows the record-at-a-time path down several times
+    report = current_report()
+    peaks = {}
+    for name in ('apps', 'reviews', 'analytics', 'star_schema'):
+        measured = report.stage_named(name) if report else None
+        if measured is not None:
+            peaks[name] = measured.peak_rss_bytes if measured.peak_rss_bytes is not None \
+                else measured.peak_traced_bytes
+
+    print("\nPeak memory per stage:")
+    for name, peak in peaks.items():
+        print(f"  • {name}: " + (f"{peak / (1024 * 1024):.2f} MB" if peak is not None else "not measured"))
+
+    return {
+        'apps_current': len(current_apps),
+        'apps_history': len(history),
+        'reviews_merged': merged_count,
+        'analytics': analytics_count,
+        'stage_peak_bytes': peaks
+    }
+
+
+def _print_plan(plan):
+    for path, status, offset, _ in plan:
+        note = f" (from byte {offset})" if status == 'appended' else ""
+        print(f"  {status:>9}  {os.path.basename(path)}{note}")
+
+
+def _run_incremental():
+    """Process only raw sources that are new or changed since the last run.
+
+    Source fingerprints (size, mtime, sha256) and the newest processed review
+    timestamp are kept in ``config.RUN_MANIFEST``.  Files that only grew are
+    read from their previous end, new reviews are appended to the processed
+    table, and a full rewrite only happens when the delta updates reviews
+    that were already stored.
+    """
+    manifest = load_manifest()
+    if not (table_exists(config.APPS_REVIEWS_PROCESSED) and table_exists(config.APPS_METADATA_SCD2)):
+        # outputs are missing, so nothing recorded in the manifest can be trusted
+        manifest = {'sources': {}, 'max_review_at': None}
+
+    print("\n" + "=" * 60)
+    print("STAGE 1: CHANGE DETECTION")
+    print("=" * 60)
+    with stage('change_detection'):
+        app_plan = plan_sources(app_sources(), manifest)
+        review_plan = plan_sources(review_sources(), manifest)
+    print("Apps sources:")
+    _print_plan(app_plan)
+    print("Review sources:")
+    _print_plan(review_plan)
+    known_apps = {os.path.basename(p) for p, *_ in app_plan}
+    apps_changed = (any(status != 'unchanged' for _, status, _, _ in app_plan)
+                    or not set(manifest.get('app_sources', [])) <= known_apps)
+
+    print("\n" + "=" * 60)
+    print("STAGE 2: DELTA TRANSFORMATION")
+    print("=" * 60)
+    if apps_changed:
+        current_apps, history, app_quality = _update_apps()
+    else:
+        print("Apps metadata unchanged; reusing current snapshot")
+        current_apps = load_processed_apps()
+        history = load_scd2_store()
+        # untracked values of the current versions come from the saved snapshot
+        history.latest = {app[history.key]: app for app in current_apps}
+        app_quality = app_report()
+
+    delta_sources = [(path, offset) for path, status, offset, _ in review_plan if status != 'unchanged']
+    with stage('ingest_reviews') as s:
+        raw_delta = read_sources(delta_sources, fields=review_fields(), schema_name='reviews')
+        s.rows_out = len(raw_delta)
+    review_quality = review_report()
+    with stage('clean_reviews') as s:
+        s.rows_in = len(raw_delta)
+        clean_delta = clean_apps_reviews(raw_delta, quality=review_quality)
+        s.rows_out = len(clean_delta)
+    _print_quality_report(app_quality, review_quality)
+
+    with stage('dedup') as s:
+        s.rows_in = len(clean_delta)
+        # last occurrence wins inside the delta, like merge_reviews
+        delta = {}
+        for r in clean_delta:
+            if r.get('review_id') is not None:
+                delta[r['review_id']] = r
+        # the id index answers "already stored?" without reading the table; only
+        # hits need their stored rows, to tell updates from repeats
+        index = ReviewIndex.open()
+        hit_ids = index.contains(delta) if delta else set()
+        stored = {}
+        if hit_ids:
+            for r in iter_table(config.APPS_REVIEWS_PROCESSED):
+                if r.get('review_id') is not None and str(r['review_id']) in hit_ids:
+                    stored[r['review_id']] = r
+        new_reviews = [r for rid, r in delta.items() if rid not in stored]
+        updated = [rid for rid, r in delta.items() if rid in stored and stored[rid] != r]
+        s.rows_out = len(new_reviews) + len(updated)
+    print(index.report())
+    print(f"Delta: {len(new_reviews)} new, {len(updated)} updated, "
+          f"{len(delta) - len(new_reviews) - len(updated)} already stored")
+
+    print("\n" + "=" * 60)
+    print("STAGE 3: DATA LOADING")
+    print("=" * 60)
+    if apps_changed:
+        _save(current_apps, config.APPS_METADATA_PROCESSED)
+        _save_history(history)
+    if updated:
+        with stage('merge') as s:
+            s.rows_in = len(delta)
+            merged = merge_reviews_streaming(iter_processed_reviews(), list(delta.values()),
+                                             spool_dir=config.PROCESSED_DATA_DIR)
+            review_count = s.rows_out = _save(merged, config.APPS_REVIEWS_PROCESSED)
+    else:
+        _save(new_reviews, config.APPS_REVIEWS_PROCESSED, append_table)
+        review_count = manifest.get('review_count')
+        if review_count is None:
+            review_count = sum(1 for _ in iter_table(config.APPS_REVIEWS_PROCESSED, columns=['review_id']))
+        else:
+            review_count += len(new_reviews)
+    with stage('review_index') as s:
+        s.rows_in = len(new_reviews)
+        s.rows_out = index.add(r['review_id'] for r in new_reviews)
+        stamp = table_stamp(config.APPS_REVIEWS_PROCESSED) if table_exists(config.APPS_REVIEWS_PROCESSED) else None
+        if stamp != index.stamp:
+            index.stamp = stamp
+            index.save()
+    # only reviews new to the table are added to the previous profile; updated
+    # ids keep their profiled values, as sketches cannot remove rows
+    with stage('profile') as s:
+        extend = load_latest_profile('reviews') is not None
+        s.rows_in = len(new_reviews) if extend else review_count
+        profile = review_profile().profile(new_reviews if extend else iter_processed_reviews())
+    _report_profile(profile, delta=extend)
+
+    state = load_state(config.STAR_STATE)
+    dims = build_app_dimensions(history.history_rows())
+    if not (apps_changed or new_reviews or updated) and _star_state_matches(state, dims):
+        print("No new data; analytics and star schema are up to date")
+        analytics_count = manifest.get('analytics_count', 0)
+    elif not updated and _star_state_matches(state, dims):
+        analytics_count = _extend_outputs(current_apps, dims, state, new_reviews)
+    else:
+        print("Rebuilding analytics and star schema from the full review history...")
+        analytics_count, state = _rebuild_outputs(current_apps, history.history_rows())
+    save_state(state, config.STAR_STATE)
+
+    # compared as naive UTC stamps: raw values mix offsets and naive times
+    timestamps = [to_utc_stamp(r.get('at')) for r in delta.values()]
+    timestamps = [at for at in timestamps + [to_utc_stamp(manifest.get('max_review_at'))] if at is not None]
+    manifest['max_review_at'] = max(timestamps) if timestamps else None
+    manifest['review_count'] = review_count
+    manifest['analytics_count'] = analytics_count
+    manifest['app_sources'] = sorted(known_apps)
+    record_sources(manifest, app_plan + review_plan)
+    save_manifest(manifest)
+    print(f"Review watermark: {manifest['max_review_at']}")
+
+    return {
+        'apps_current': len(current_apps),
+        'apps_history': len(history),
+        'reviews_merged': review_count,
+        'analytics': analytics_count,
+        'reviews_new': len(new_reviews),
+        'reviews_updated': len(updated),
+        'review_index_hits': index.hits,
+        'review_index_misses': index.misses
+    }
+
+
+def _print_stages(report):
+    def rows(n):
+        return '-' if n is None else n
+
+    print("\nStages (wall / CPU seconds, rows in -> out):")
+    for s in report.stages:
+        if s.parent is None:
+            print(f"  • {s.name}: {s.wall_seconds:.2f}s / {s.cpu_seconds:.2f}s, "
+                  f"{rows(s.rows_in)} -> {rows(s.rows_out)}")
+
+
+def run_pipeline(streaming=False, incremental=False, engine=None, cprofile=None, trace_memory=None):
+    """Run the pipeline; ``engine`` (default ``config.ENGINE``) selects how
+    batch runs clean, dedup and aggregate reviews.  Streaming and incremental
+    runs only support the python engine; other engines raise ValueError.
+
+    Every run writes a JSON report of its stages to ``config.RUN_REPORT_DIR``
+    (see instrumentation); ``cprofile`` and ``trace_memory`` (default
+    ``config.STAGE_CPROFILE`` / ``config.STAGE_TRACE_MEMORY``) add a cProfile
+    dump and tracemalloc peaks per stage.
+    """
+    engine = engine or config.ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}; expected one of {ENGINES}")
+    if engine != 'python' and (streaming or incremental):
+        mode = 'incremental' if incremental else 'streaming'
+        raise ValueError(f"engine {engine!r} only runs in batch mode; {mode} runs use the python engine")
+    start_time = datetime.now()
+    print("=" * 60)
+    print("STARTING DATA PIPELINE")
+    print("=" * 60)
+    print(f"Started at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+    report = RunReport(cprofile=config.STAGE_CPROFILE if cprofile is None else cprofile,
+                       trace_memory=config.STAGE_TRACE_MEMORY if trace_memory is None else trace_memory)
+    report.info.update(started_at=start_time.isoformat(),
+                       mode='incremental' if incremental else 'streaming' if streaming else 'batch',
+                       engine=engine)
+    try:
+        with report:
+            if incremental:
+                summary = _run_incremental()
+            elif streaming:
+                summary = _run_streaming()
+            elif engine == 'duckdb':
+                summary = _run_duckdb()
+            else:
+                summary = _run_batch(engine)
+        report.info.update(status='succeeded', summary=summary)
+
         print("\n" + "=" * 60)
         print("PIPELINE COMPLETED SUCCESSFULLY!")
         print("=" * 60)
-        print(f"Duration: {duration:.2f} seconds")
+        print(f"Duration: {report.wall_seconds:.2f} seconds (CPU {report.cpu_seconds:.2f} seconds)")
+        _print_stages(report)
         print(f"\nData Summary:")
-        print(f"  • Apps current records: {len(current_apps)}")
-        print(f"  • Total historical app rows: {len(updated_history)}")
-        print(f"  • Reviews after merge: {len(merged_reviews)}")
-        print(f"  • Analytics records: {len(analytics_data)}")
+        print(f"  • Apps current records: {summary['apps_current']}")
+        print(f"  • Total historical app rows: {summary['apps_history']}")
+        print(f"  • Reviews after merge: {summary['reviews_merged']}")
+        print(f"  • Analytics records: {summary['analytics']}")
         print(f"\nProcessed files saved to: {config.PROCESSED_DATA_DIR}")
+        print(f"Run report: {report.save()}")
         print("=" * 60)
-        
+
         return True
-        
+
     except Exception as e:
         print("\n" + "=" * 60)
         print("PIPELINE FAILED!")
@@ -119,9 +728,19 @@ def run_pipeline():
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
+        report.info.update(status='failed', error=str(e))
+        try:
+            print(f"Run report: {report.save()}")
+        except OSError:
+            pass
         return False
 
 
 if __name__ == "__main__":
-    success = run_pipeline()
+    engine = sys.argv[sys.argv.index('--engine') + 1] if '--engine' in sys.argv else None
+    success = run_pipeline(streaming='--streaming' in sys.argv,
+                           incremental='--incremental' in sys.argv,
+                           engine=engine,
+                           cprofile='--cprofile' in sys.argv or None,
+                           trace_memory='--tracemalloc' in sys.argv or None)
     sys.exit(0 if success else 1)
@@ -0,0 +1,381 @@
+"""One-pass column profiles built from mergeable sketches.
+
+A :class:`TableProfile` keeps, per column, the row and null counts plus the
+sketches named in its spec:
+
+* ``distinct``: a HyperLogLog distinct count (about 1.6% error);
+* ``quantiles``: a t-digest of numeric values;
+* ``range``: min and max (ISO timestamps compare as strings);
+* ``top``: a Misra-Gries heavy-hitter summary of the most frequent values.
+
+Every sketch has a fixed size whatever the number of rows, is updated
+column-wise batch by batch and can be merged with another one built from
+other batches or files.  Profiles are saved per run under
+``config.PROFILE_DIR``, so comparing a run with the previous one reads two
+small JSON files instead of the data.
+"""
+import base64
+import glob
+import hashlib
+import json
+import math
+import os
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import config
+
+BATCH_SIZE = 4096
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with ``2 ** p`` registers."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add_all(self, values: Iterable[Any]) -> None:
+        p, registers = self.p, self.registers
+        width = 64 - p
+        mask = (1 << width) - 1
+        for value in values:
+            h = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+            rank = width - (h & mask).bit_length() + 1
+            idx = h >> width
+            if rank > registers[idx]:
+                registers[idx] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # small-range correction (linear counting)
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'p': self.p, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HyperLogLog':
+        hll = cls(data['p'])
+        hll.registers = bytearray(base64.b64decode(data['registers']))
+        return hll
+
+
+class TDigest:
+    """Merging t-digest: centroids ``[mean, weight]`` whose size is bounded
+    by ``4 * n * q * (1 - q) / compression``, so the tails stay exact-ish."""
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.centroids: List[List[float]] = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add_all(self, values: Iterable[float]) -> None:
+        values = [float(v) for v in values]
+        if not values:
+            return
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self._compress(self.centroids + [[v, 1.0] for v in values])
+
+    def merge(self, other: 'TDigest') -> None:
+        if not other.count:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(self.centroids + [list(c) for c in other.centroids])
+
+    def _compress(self, items: List[List[float]]) -> None:
+        items.sort(key=lambda c: c[0])
+        total = sum(w for _, w in items)
+        merged = []
+        cum = 0.0
+        mean, weight = items[0]
+        for m, w in items[1:]:
+            q = (cum + (weight + w) / 2) / total
+            if weight + w <= max(1.0, 4 * total * q * (1 - q) / self.compression):
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                merged.append([mean, weight])
+                cum += weight
+                mean, weight = m, w
+        merged.append([mean, weight])
+        self.centroids = merged
+        self.count = round(total)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        # interpolate between the centroid midpoints, pinned to min and max
+        points = [(0.0, self.min)]
+        cum = 0.0
+        for mean, weight in self.centroids:
+            points.append((cum + weight / 2, mean))
+            cum += weight
+        points.append((cum, self.max))
+        target = q * cum
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if target <= x1:
+                return y0 if x1 == x0 else y0 + (y1 - y0) * (target - x0) / (x1 - x0)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'compression': self.compression, 'centroids': self.centroids,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TDigest':
+        digest = cls(data['compression'])
+        digest.centroids = [list(c) for c in data['centroids']]
+        digest.count = round(sum(w for _, w in digest.centroids))
+        if digest.count:
+            digest.min, digest.max = data['min'], data['max']
+        return digest
+
+
+class TopK:
+    """Misra-Gries summary of at most ``capacity`` values; counts are lower
+    bounds, off by at most ``rows / (capacity + 1)``."""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts: Counter = Counter()
+
+    def add_all(self, values: Iterable[Any]) -> None:
+        self.counts.update(values)
+        self._reduce()
+
+    def merge(self, other: 'TopK') -> None:
+        self.counts.update(other.counts)
+        self._reduce()
+
+    def _reduce(self) -> None:
+        if len(self.counts) <= self.capacity:
+            return
+        cut = sorted(self.counts.values(), reverse=True)[self.capacity]
+        self.counts = Counter({v: c - cut for v, c in self.counts.items() if c > cut})
+
+    def top(self, k: int = 10) -> List[Tuple[Any, int]]:
+        return self.counts.most_common(k)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'capacity': self.capacity, 'counts': [[v, c] for v, c in self.counts.most_common()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TopK':
+        top = cls(data['capacity'])
+        top.counts = Counter({v: c for v, c in data['counts']})
+        return top
+
+
+SKETCHES = {'distinct': HyperLogLog, 'quantiles': TDigest, 'top': TopK}
+
+
+class ColumnProfile:
+    """Counts and sketches of one column."""
+
+    def __init__(self, sketches: Sequence[str] = ()):
+        self.rows = 0
+        self.nulls = 0
+        self.range = 'range' in sketches
+        self.min: Any = None
+        self.max: Any = None
+        self.sketches = {name: SKETCHES[name]() for name in sketches if name in SKETCHES}
+
+    def update(self, values: List[Any]) -> None:
+        self.rows += len(values)
+        present = [v for v in values if v is not None]
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        if self.range:
+            self._extend_range(min(present), max(present))
+        if 'quantiles' in self.sketches:
+            numbers = [v for v in present if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            self.sketches['quantiles'].add_all(numbers)
+        for name, sketch in self.sketches.items():
+            if name != 'quantiles':
+                sketch.add_all(present)
+
+    def _extend_range(self, low: Any, high: Any) -> None:
+        if low is not None and (self.min is None or low < self.min):
+            self.min = low
+        if high is not None and (self.max is None or high > self.max):
+            self.max = high
+
+    def merge(self, other: 'ColumnProfile') -> None:
+        self.rows += other.rows
+        self.nulls += other.nulls
+        if self.range:
+            self._extend_range(other.min, other.max)
+        for name, sketch in self.sketches.items():
+            if name in other.sketches:
+                sketch.merge(other.sketches[name])
+
+    def stats(self) -> Dict[str, Any]:
+        """Readable statistics: null rate, distinct count, quantiles, range, top values."""
+        out: Dict[str, Any] = {'rows': self.rows, 'nulls': self.nulls,
+                               'null_rate': self.nulls / self.rows if self.rows else 0.0}
+        if 'distinct' in self.sketches:
+            out['distinct'] = self.sketches['distinct'].estimate()
+        if 'quantiles' in self.sketches:
+            digest = self.sketches['quantiles']
+            out['quantiles'] = {f'p{round(q * 100)}': digest.quantile(q) for q in (0.05, 0.25, 0.5, 0.75, 0.95)}
+        if self.range:
+            out['min'], out['max'] = self.min, self.max
+        if 'top' in self.sketches:
+            out['top'] = self.sketches['top'].top()
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'rows': self.rows, 'nulls': self.nulls, 'range': self.range, 'min': self.min, 'max': self.max,
+                'sketches': {name: sketch.to_dict() for name, sketch in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ColumnProfile':
+        column = cls()
+        column.rows, column.nulls = data['rows'], data['nulls']
+        column.range, column.min, column.max = data['range'], data['min'], data['max']
+        column.sketches = {name: SKETCHES[name].from_dict(s) for name, s in data['sketches'].items()}
+        return column
+
+
+# column -> sketches of the clean reviews profile
+REVIEW_PROFILE = {
+    'review_id': ('distinct',),
+    'app_id': ('distinct', 'top'),
+    'user_name': ('distinct', 'top'),
+    'content': ('distinct',),
+    'score': ('quantiles', 'range', 'top'),
+    'thumbs_up_count': ('quantiles', 'range'),
+    'review_created_version': ('distinct', 'top'),
+    'at': ('range',),
+    'reply_content': (),
+}
+
+
+class TableProfile:
+    """Column profiles of a stream of rows, built batch by batch."""
+
+    def __init__(self, name: str, spec: Dict[str, Sequence[str]] = None):
+        self.name = name
+        self.rows = 0
+        self.columns = {column: ColumnProfile(sketches) for column, sketches in (spec or {}).items()}
+
+    def update_batch(self, batch: List[Dict[str, Any]]) -> None:
+        self.rows += len(batch)
+        for column, profile in self.columns.items():
+            profile.update([row.get(column) for row in batch])
+
+    def observe(self, rows: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Pass ``rows`` through unchanged while profiling them, so the
+        profile is built inside the pass that produces the rows."""
+        it = iter(rows)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return
+            self.update_batch(batch)
+            yield from batch
+
+    def profile(self, rows: Iterable[Dict[str, Any]]) -> 'TableProfile':
+        for _ in self.observe(rows):
+            pass
+        return self
+
+    def merge(self, other: 'TableProfile') -> None:
+        self.rows += other.rows
+        for column, profile in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(profile)
+            else:
+                self.columns[column] = profile
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {column: profile.stats() for column, profile in self.columns.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'rows': self.rows,
+                'columns': {column: profile.to_dict() for column, profile in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TableProfile':
+        table = cls(data['name'])
+        table.rows = data['rows']
+        table.columns = {column: ColumnProfile.from_dict(c) for column, c in data['columns'].items()}
+        return table
+
+
+def review_profile() -> TableProfile:
+    return TableProfile('reviews', REVIEW_PROFILE)
+
+
+def save_profile(profile: TableProfile, run_at: str = None) -> str:
+    """Write ``profile`` as ``<name>-<run timestamp>.json`` in
+    ``config.PROFILE_DIR`` and keep the newest ``config.PROFILE_HISTORY``
+    (all of them if it is 0 or less)."""
+    run_at = run_at or datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    directory = config.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{profile.name}-{run_at}.json")
+    data = dict(profile.to_dict(), run_at=run_at)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    if config.PROFILE_HISTORY > 0:
+        for old in _profile_paths(profile.name)[:-config.PROFILE_HISTORY]:
+            os.remove(old)
+    return path
+
+
+def _profile_paths(name: str) -> List[str]:
+    # run timestamps sort chronologically
+    return sorted(glob.glob(os.path.join(glob.escape(config.PROFILE_DIR), f"{name}-*.json")))
+
+
+def load_latest_profile(name: str) -> Optional[TableProfile]:
+    paths = _profile_paths(name)
+    if not paths:
+        return None
+    with open(paths[-1], 'r', encoding='utf-8') as f:
+        return TableProfile.from_dict(json.load(f))
+
+
+def compare_profiles(previous: TableProfile, current: TableProfile,
+                     rate_tolerance: float = 0.05, quantile_tolerance: float = 0.1) -> List[str]:
+    """Describe drift between two profiles: null rates, distinct ratios and
+    medians that moved by more than the tolerances, and new top values."""
+    findings = []
+    before, after = previous.stats(), current.stats()
+    for column, new in after.items():
+        old = before.get(column)
+        if old is None or not old['rows'] or not new['rows']:
+            continue
+        if abs(new['null_rate'] - old['null_rate']) > rate_tolerance:
+            findings.append(f"{column}: null rate {old['null_rate']:.1%} -> {new['null_rate']:.1%}")
+        if 'distinct' in new and 'distinct' in old:
+            old_ratio, new_ratio = old['distinct'] / old['rows'], new['distinct'] / new['rows']
+            if abs(new_ratio - old_ratio) > rate_tolerance:
+                findings.append(f"{column}: distinct ratio {old_ratio:.1%} -> {new_ratio:.1%}")
+        if 'quantiles' in new and 'quantiles' in old:
+            m0, m1 = old['quantiles']['p50'], new['quantiles']['p50']
+            if m0 is not None and m1 is not None and abs(m1 - m0) > quantile_tolerance * max(abs(m0), 1):
+                findings.append(f"{column}: median {m0:g} -> {m1:g}")
+        if 'top' in new and 'top' in old and old['top'] and new['top'] and new['top'][0][0] != old['top'][0][0]:
+            findings.append(f"{column}: most frequent value {old['top'][0][0]!r} -> {new['top'][0][0]!r}")
+    return findings
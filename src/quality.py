@@ -1,30 +1,178 @@
-from typing import List, Dict, Any
+"""Rule-based data quality checks.
 
+Rules are evaluated column-wise over batches of rows: each batch is split
+into one value list per checked column and every rule scans only the
+columns it needs.  A :class:`QualityReport` keeps, per rule, the number of
+failing rows and a bounded sample of them (row index and message), plus the
+null count of every checked column, so a dirty batch costs counters rather
+than one message per row.  :meth:`QualityReport.observe` runs the checks
+inside another pass (cleaning, streaming) instead of scanning the data
+again.
+"""
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-# simple data quality checks that return a list of issues or a metrics dict
+# failing rows kept per rule for the report
+SAMPLE_SIZE = 10
+# rows per column-wise evaluation
+BATCH_SIZE = 4096
+
+Columns = Dict[str, List[Any]]
+
+
+class Rule:
+    """A named check over ``columns``.
+
+    ``failing(columns)`` returns the positions of the failing rows of a
+    batch; ``message(row)`` describes one of them and is only called for
+    sampled rows.  ``kind`` ('null', 'type' or 'range') groups rules into
+    the rates of the report.
+    """
+
+    def __init__(self, name: str, kind: str, columns: Sequence[str],
+                 failing: Callable[[Columns], Iterable[int]], message: Callable[[Dict[str, Any]], str]):
+        self.name = name
+        self.kind = kind
+        self.columns = tuple(columns)
+        self.failing = failing
+        self.message = message
+
+
+def _missing(*names: str) -> Callable[[Columns], List[int]]:
+    def failing(cols: Columns) -> List[int]:
+        return [i for i, values in enumerate(zip(*(cols[n] for n in names))) if not all(values)]
+    return failing
+
+
+def _not_instance(name: str, types: tuple) -> Callable[[Columns], List[int]]:
+    def failing(cols: Columns) -> List[int]:
+        return [i for i, v in enumerate(cols[name]) if v is not None and not isinstance(v, types)]
+    return failing
+
+
+def _out_of_range(name: str, low: int, high: int) -> Callable[[Columns], List[int]]:
+    def failing(cols: Columns) -> List[int]:
+        return [i for i, v in enumerate(cols[name])
+                if isinstance(v, int) and not low <= v <= high]
+    return failing
+
+
+APP_RULES = [
+    Rule('missing_primary_fields', 'null', ('app_id', 'title'),
+         _missing('app_id', 'title'), lambda r: "missing primary fields"),
+    Rule('rating_not_numeric', 'type', ('rating',),
+         _not_instance('rating', (int, float)), lambda r: "rating not numeric"),
+]
+
+REVIEW_RULES = [
+    Rule('missing_ids', 'null', ('review_id', 'app_id'),
+         _missing('review_id', 'app_id'), lambda r: "missing ids"),
+    Rule('score_not_integer', 'type', ('score',),
+         _not_instance('score', (int,)), lambda r: "score not integer"),
+    Rule('score_out_of_range', 'range', ('score',),
+         _out_of_range('score', 1, 5), lambda r: f"score out of range ({r.get('score')})"),
+]
+
+
+class QualityReport:
+    """Results of a set of rules over a stream of rows."""
+
+    def __init__(self, name: str, rules: Sequence[Rule], sample_size: Optional[int] = SAMPLE_SIZE):
+        self.name = name
+        self.rules = list(rules)
+        self.sample_size = sample_size
+        self.columns = tuple(dict.fromkeys(c for rule in self.rules for c in rule.columns))
+        self.rows = 0
+        self.counts: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+        self.samples: Dict[str, List[Tuple[int, str]]] = {rule.name: [] for rule in self.rules}
+        self.nulls: Dict[str, int] = dict.fromkeys(self.columns, 0)
+
+    def check_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Evaluate every rule over one batch of rows."""
+        cols = {name: [row.get(name) for row in batch] for name in self.columns}
+        for name, values in cols.items():
+            self.nulls[name] += values.count(None)
+        for rule in self.rules:
+            failing = rule.failing(cols)
+            if not failing:
+                continue
+            self.counts[rule.name] += len(failing)
+            sample = self.samples[rule.name]
+            room = len(failing) if self.sample_size is None else self.sample_size - len(sample)
+            for i in failing[:max(room, 0)]:
+                sample.append((self.rows + i, rule.message(batch[i])))
+        self.rows += len(batch)
+
+    def check(self, rows: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> 'QualityReport':
+        it = iter(rows)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return self
+            self.check_batch(batch)
+
+    def observe(self, rows: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Pass ``rows`` through unchanged, checking them batch by batch,
+        so the checks are fused into the pass that produces the rows."""
+        it = iter(rows)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return
+            self.check_batch(batch)
+            yield from batch
+
+    def record(self, rule: str, count: int, sample: List[Tuple[int, str]], rows: int = None,
+               nulls: Dict[str, int] = None) -> None:
+        """Add results computed elsewhere (e.g. in SQL) for ``rule``."""
+        self.counts[rule] += count
+        self.samples[rule].extend(sample[:self.sample_size])
+        if rows is not None:
+            self.rows = rows
+        for name, n in (nulls or {}).items():
+            self.nulls[name] = n
+
+    @property
+    def failed(self) -> int:
+        return sum(self.counts.values())
+
+    def rates(self) -> Dict[str, Any]:
+        """Failing-row rates per rule and kind, and null rates per column."""
+        def rate(n: int) -> float:
+            return n / self.rows if self.rows else 0.0
+        by_kind: Dict[str, int] = {}
+        for rule in self.rules:
+            by_kind[rule.kind] = by_kind.get(rule.kind, 0) + self.counts[rule.name]
+        return {
+            'rules': {name: rate(n) for name, n in self.counts.items()},
+            'kinds': {kind: rate(n) for kind, n in by_kind.items()},
+            'nulls': {name: rate(n) for name, n in self.nulls.items()},
+        }
+
+    def issues(self) -> List[str]:
+        """The sampled failures as ``"Row i: message"``, in row order."""
+        sampled = sorted((i, order, msg) for order, rule in enumerate(self.rules)
+                         for i, msg in self.samples[rule.name])
+        return [f"Row {i}: {msg}" for i, _, msg in sampled]
+
+    def summary(self) -> Dict[str, Any]:
+        return {'rows': self.rows, 'counts': dict(self.counts), 'rates': self.rates()}
 
 
 def check_apps_metadata(apps: List[Dict[str, Any]]) -> List[str]:
-    issues = []
-    for i, app in enumerate(apps):
-        if not app.get('app_id') or not app.get('title'):
-            issues.append(f"Row {i}: missing primary fields")
-        # check types
-        if 'rating' in app and app['rating'] is not None:
-            if not isinstance(app['rating'], (int, float)):
-                issues.append(f"Row {i}: rating not numeric")
-    return issues
+    """Every app issue as a message (see :class:`QualityReport` for counts
+    and samples without one message per failing row)."""
+    return QualityReport('apps', APP_RULES, sample_size=None).check(apps).issues()
 
 
 def check_reviews(reviews: List[Dict[str, Any]]) -> List[str]:
-    issues = []
-    for i, r in enumerate(reviews):
-        if not r.get('review_id') or not r.get('app_id'):
-            issues.append(f"Row {i}: missing ids")
-        if 'score' in r and r['score'] is not None:
-            if not isinstance(r['score'], int):
-                issues.append(f"Row {i}: score not integer")
-            else:
-                if r['score'] < 1 or r['score'] > 5:
-                    issues.append(f"Row {i}: score out of range ({r['score']})")
-    return issues
+    """Every review issue as a message."""
+    return QualityReport('reviews', REVIEW_RULES, sample_size=None).check(reviews).issues()
+
+
+def app_report(apps: Iterable[Dict[str, Any]] = ()) -> QualityReport:
+    return QualityReport('apps', APP_RULES).check(apps)
+
+
+def review_report(reviews: Iterable[Dict[str, Any]] = ()) -> QualityReport:
+    return QualityReport('reviews', REVIEW_RULES).check(reviews)
@@ -0,0 +1,115 @@
+"""Compact record types for the large row sets of the pipeline.
+
+A clean review or fact row as a dict costs a hash table per row, which is
+larger than the values it holds.  The types here store one slot per column
+instead and intern the low-cardinality strings (app ids, names, versions),
+so every review of an app shares one ``app_id`` object.
+
+Records are mappings with a fixed set of columns: ``row['app_id']``,
+``row.get(...)``, assignment to an existing column, ``dict(row)``, iteration
+in column order and ``==`` against dicts behave like the dicts they replace,
+and :func:`load.save_table` writes them with the same layout.  They are
+built by the ``compact=True`` variants of the cleaning and star-schema
+functions; ``benchmarks/bench_records.py`` measures the trade-off.
+"""
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, Optional, Sequence
+
+
+class Record(Mapping):
+    """Base of the slotted record types built by :func:`record_type`.
+
+    The constructor takes the values positionally in column order; string
+    values of the ``INTERNED`` columns are interned.
+    """
+
+    __slots__ = ()
+    FIELDS: Sequence[str] = ()
+    KEYS: FrozenSet[str] = frozenset()
+    INTERNED: FrozenSet[str] = frozenset()
+
+    def __init__(self, *values: Any):
+        if len(values) != len(self.FIELDS):
+            raise TypeError(f"{type(self).__name__} takes {len(self.FIELDS)} values, got {len(values)}")
+        interned = self.INTERNED
+        for name, value in zip(self.__slots__, values):
+            if name in interned and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, name, value)
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]):
+        """The record for ``row``, or ``row`` itself when its keys are not
+        exactly this type's columns (nothing is dropped)."""
+        if type(row) is cls or len(row) != len(cls.FIELDS) or not cls.KEYS.issuperset(row):
+            return row
+        return cls(*[row[name] for name in cls.FIELDS])
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.KEYS:
+            raise KeyError(f"{type(self).__name__} has no column {key!r}")
+        setattr(self, key, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.KEYS else default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.KEYS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def record_type(name: str, fields: Sequence[str], interned: Sequence[str] = ()) -> type:
+    """A slotted :class:`Record` subclass with ``fields`` as its columns;
+    string values of the ``interned`` columns are interned."""
+    return type(name, (Record,), {
+        '__slots__': tuple(fields),
+        'FIELDS': tuple(fields),
+        'KEYS': frozenset(fields),
+        'INTERNED': frozenset(interned),
+    })
+
+
+ReviewRecord = record_type('ReviewRecord', (
+    'review_id', 'app_id', 'app_name', 'user_name', 'content', 'score', 'thumbs_up_count',
+    'review_created_version', 'at', 'reply_content', 'replied_at'
+), interned=('app_id', 'app_name', 'review_created_version'))
+
+FactRecord = record_type('FactRecord', (
+    'review_id', 'app_key', 'developer_key', 'date_key', 'rating', 'thumbs_up_count',
+    'review_text', 'review_version'
+), interned=('review_version',))
+
+DimAppRecord = record_type('DimAppRecord', (
+    'app_key', 'app_id', 'app_name', 'developer_key', 'category_key', 'price', 'is_paid',
+    'installs', 'catalog_rating', 'ratings_count', 'valid_from', 'valid_to', 'is_current'
+), interned=('app_id', 'installs'))
+
+
+def compact(rows: Iterable[Dict[str, Any]], cls: type) -> Iterator[Any]:
+    """Yield ``rows`` as ``cls`` records (rows of another shape unchanged)."""
+    for row in rows:
+        yield cls.from_dict(row)
+
+
+def json_default(value: Any) -> Optional[Dict[str, Any]]:
+    """``default`` hook for :func:`json.dumps` that serializes records."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,225 @@
+"""Persistent review-id index for deduplicating incoming reviews.
+
+The ids of the processed reviews table are kept on disk next to it:
+
+* ``<path>.keys``: every id, sorted, one per line;
+* ``<path>.bloom``: a Bloom filter over the ids, loaded into memory (about
+  10 bits per id), which answers most lookups for new ids on its own;
+* ``<path>.json``: sizes, a sparse index (every ``SPARSE_EVERY``-th id with
+  its byte offset in the keys file) and the stamp of the reviews table the
+  index describes.
+
+An id the filter may contain is confirmed by reading one block of the keys
+file, so neither historical reviews nor the full id set are loaded into
+memory.  An index whose stamp does not match the reviews table (written by
+another run mode, or missing) is rebuilt from the table's ids.
+"""
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import config
+from load import iter_table, table_exists, table_stamp
+
+SPARSE_EVERY = 1024
+BITS_PER_KEY = 10
+HASHES = 7
+
+
+def _positions(key: str, bits: int) -> List[int]:
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(HASHES)]
+
+
+class ReviewIndex:
+    """Sorted on-disk review-id file with an in-memory Bloom filter."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.bits = 0
+        self.bloom = bytearray()
+        self.sparse_keys: List[str] = []
+        self.sparse_offsets: List[int] = []
+        self.stamp: Optional[List[int]] = None
+        # per-run lookup counts
+        self.hits = 0
+        self.misses = 0
+        self.false_positives = 0
+
+    # -- persistence -----------------------------------------------------
+
+    @classmethod
+    def open(cls, path: str = None, reviews_path: str = None) -> 'ReviewIndex':
+        """Load the index of ``reviews_path`` (by default the processed
+        reviews table), rebuilding it if it is missing or stale."""
+        path = path or config.REVIEW_INDEX
+        reviews_path = reviews_path or config.APPS_REVIEWS_PROCESSED
+        index = cls(path)
+        current = table_stamp(reviews_path) if table_exists(reviews_path) else None
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['stamp'] == current:
+                index._load(meta)
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        print("Rebuilding review index from the processed reviews...")
+        ids = (r.get('review_id') for r in iter_table(reviews_path, columns=['review_id'])) \
+            if current is not None else ()
+        index.rebuild(ids)
+        index.stamp = current
+        index.save()
+        return index
+
+    def _load(self, meta: Dict[str, Any]) -> None:
+        self.count = meta['count']
+        self.bits = meta['bits']
+        self.sparse_keys = [k for k, _ in meta['sparse']]
+        self.sparse_offsets = [o for _, o in meta['sparse']]
+        self.stamp = meta['stamp']
+        with open(self.path + '.bloom', 'rb') as f:
+            self.bloom = bytearray(f.read())
+
+    def save(self) -> None:
+        with open(self.path + '.bloom', 'wb') as f:
+            f.write(self.bloom)
+        meta = {
+            'count': self.count,
+            'bits': self.bits,
+            'sparse': [[k, o] for k, o in zip(self.sparse_keys, self.sparse_offsets)],
+            'stamp': self.stamp,
+        }
+        tmp = self.path + '.json.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.path + '.json')
+
+    def _iter_keys(self) -> Iterable[str]:
+        try:
+            with open(self.path + '.keys', 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield line.rstrip('\n')
+        except FileNotFoundError:
+            return
+
+    def _write_keys(self, keys: Iterable[str]) -> None:
+        """Write sorted ``keys`` as the keys file and rebuild the sparse index."""
+        self.sparse_keys, self.sparse_offsets = [], []
+        tmp = self.path + '.keys.tmp'
+        count = 0
+        offset = 0
+        with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+            for key in keys:
+                if count % SPARSE_EVERY == 0:
+                    self.sparse_keys.append(key)
+                    self.sparse_offsets.append(offset)
+                line = key + '\n'
+                f.write(line)
+                offset += len(line.encode('utf-8'))
+                count += 1
+        os.replace(tmp, self.path + '.keys')
+        self.count = count
+
+    def _reset_bloom(self, capacity: int) -> None:
+        self.bits = max(1024, capacity * BITS_PER_KEY)
+        self.bloom = bytearray((self.bits + 7) // 8)
+
+    def _bloom_add(self, key: str) -> None:
+        for p in _positions(key, self.bits):
+            self.bloom[p >> 3] |= 1 << (p & 7)
+
+    def _bloom_may_contain(self, key: str) -> bool:
+        return all(self.bloom[p >> 3] & (1 << (p & 7)) for p in _positions(key, self.bits))
+
+    def rebuild(self, ids: Iterable[Any]) -> None:
+        """Replace the index with ``ids`` (only the ids are held in memory)."""
+        keys = sorted({str(i) for i in ids if i is not None})
+        self._write_keys(keys)
+        # room to double before the filter is resized
+        self._reset_bloom(2 * len(keys))
+        for key in keys:
+            self._bloom_add(key)
+
+    # -- lookups ---------------------------------------------------------
+
+    def _block(self, key: str) -> Set[str]:
+        """The ids of the keys-file block that would hold ``key``."""
+        i = bisect_right(self.sparse_keys, key) - 1
+        if i < 0:
+            return set()
+        start = self.sparse_offsets[i]
+        end = self.sparse_offsets[i + 1] if i + 1 < len(self.sparse_offsets) else None
+        with open(self.path + '.keys', 'rb') as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+        return set(data.decode('utf-8').split('\n'))
+
+    def contains(self, ids: Iterable[Any]) -> Set[str]:
+        """The subset of ``ids`` (as strings) already in the index; hits and
+        misses are added to the run counts."""
+        found = set()
+        block_start, block = None, set()
+        for key in sorted({str(i) for i in ids if i is not None}):
+            if not self._bloom_may_contain(key):
+                self.misses += 1
+                continue
+            start = bisect_right(self.sparse_keys, key) - 1
+            if start != block_start:
+                # keys are visited in order, so each block is read once
+                block_start, block = start, self._block(key)
+            if key in block:
+                found.add(key)
+                self.hits += 1
+            else:
+                self.false_positives += 1
+                self.misses += 1
+        return found
+
+    def add(self, ids: Iterable[Any]) -> int:
+        """Merge new ``ids`` into the keys file (one sequential pass) and
+        the filter; returns how many were not indexed yet."""
+        keys = {str(i) for i in ids if i is not None}
+        new = sorted(keys - self.contains_quiet(keys))
+        if not new:
+            return 0
+
+        def merged():
+            pending = iter(new)
+            nxt = next(pending, None)
+            for key in self._iter_keys():
+                while nxt is not None and nxt < key:
+                    yield nxt
+                    nxt = next(pending, None)
+                yield key
+            while nxt is not None:
+                yield nxt
+                nxt = next(pending, None)
+
+        # the merge streams the old keys file into a temporary one
+        self._write_keys(merged())
+        if self.count * BITS_PER_KEY > self.bits:
+            self._reset_bloom(2 * self.count)
+            for key in self._iter_keys():
+                self._bloom_add(key)
+        else:
+            for key in new:
+                self._bloom_add(key)
+        return len(new)
+
+    def contains_quiet(self, ids: Iterable[Any]) -> Set[str]:
+        """:meth:`contains` without touching the run counts."""
+        counts = (self.hits, self.misses, self.false_positives)
+        try:
+            return self.contains(ids)
+        finally:
+            self.hits, self.misses, self.false_positives = counts
+
+    def report(self) -> str:
+        return (f"Review index: {self.hits} hits, {self.misses} misses "
+                f"({self.false_positives} Bloom false positives), {self.count} ids indexed")
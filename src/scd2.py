@@ -0,0 +1,198 @@
+"""Keyed SCD2 history store.
+
+The history stays a list of records in write order (the on-disk layout of
+``apps_metadata_scd2``), with indexes on top of it:
+
+* the current row of every key.  Each version stores ``scd2_digest``, a
+  digest of its tracked columns, so deciding whether an app changed is one
+  digest comparison;
+* every version of a key ordered by ``start_date``, so the version valid at
+  a point in time is found by bisection.
+
+Only changes to the tracked columns open a new version (like the ``check``
+strategy of the dbt snapshot).  A version whose digest matches is left as it
+was stored, so noisy fields such as ``installs`` neither grow nor rewrite the
+history; :meth:`SCD2Store.current_rows` and :meth:`SCD2Store.history_rows`
+overlay their latest values from the last applied snapshot instead.
+
+Updates close changed rows in place and append new versions; the store
+remembers which rows were already persisted, so saving can append instead of
+rewriting the table when no persisted row was closed.
+"""
+import hashlib
+import json
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+# SCD2 bookkeeping columns, excluded from change detection
+SCD2_COLUMNS = ('start_date', 'end_date', 'current_flag', 'scd2_digest')
+
+
+def _attributes(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if k not in SCD2_COLUMNS}
+
+
+def row_digest(row: Dict[str, Any], tracked: Optional[Sequence[str]] = None) -> str:
+    """Hex digest of the ``tracked`` columns of a row (every attribute when
+    ``tracked`` is None; key order is ignored)."""
+    if tracked is None:
+        values: Any = _attributes(row)
+    else:
+        values = [row.get(c) for c in tracked]
+    text = json.dumps(values, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class SCD2Store:
+    """SCD2 history of one dimension, indexed by ``key``.
+
+    ``tracked`` lists the columns whose changes open a new version; None
+    tracks every attribute.
+    """
+
+    def __init__(self, history: Iterable[Dict[str, Any]] = (), key: str = 'app_id',
+                 tracked: Optional[Sequence[str]] = None):
+        self.key = key
+        self.tracked = None if tracked is None else tuple(tracked)
+        self.history: List[Dict[str, Any]] = list(history)
+        self._current: Dict[Any, int] = {}
+        self._starts: Dict[Any, List[str]] = {}
+        self._versions: Dict[Any, List[int]] = {}
+        for i, row in enumerate(self.history):
+            self._index(i, row)
+        # rows [0, persisted) are on disk; closing one of them needs a rewrite
+        self.persisted = len(self.history)
+        self.rewrite = False
+        # the last applied snapshot by key (not persisted)
+        self.latest: Dict[Any, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.history)
+
+    def _index(self, i: int, row: Dict[str, Any]) -> None:
+        pk = row.get(self.key)
+        if row.get('current_flag', False):
+            # the last current row of a key wins, like scd2_update
+            self._current[pk] = i
+        starts = self._starts.setdefault(pk, [])
+        at = bisect_right(starts, row.get('start_date') or '')
+        starts.insert(at, row.get('start_date') or '')
+        self._versions.setdefault(pk, []).insert(at, i)
+
+    def _tracked_equal(self, old: Dict[str, Any], new: Dict[str, Any]) -> bool:
+        columns = new if self.tracked is None else self.tracked
+        return not any(old.get(k) != new.get(k) for k in columns)
+
+    def _close(self, i: int, timestamp: str) -> None:
+        row = self.history[i]
+        row['end_date'] = timestamp
+        row['current_flag'] = False
+        if i < self.persisted:
+            self.rewrite = True
+
+    def _open(self, row: Dict[str, Any], timestamp: str, digest: str) -> None:
+        rec = row.copy()
+        rec['start_date'] = timestamp
+        rec['end_date'] = None
+        rec['current_flag'] = True
+        rec['scd2_digest'] = digest
+        self.history.append(rec)
+        self._index(len(self.history) - 1, rec)
+
+    def update(self, incoming: List[Dict[str, Any]], timestamp: str = None) -> Dict[str, int]:
+        """Apply a new snapshot (same semantics as :func:`utils.scd2_update`).
+
+        A current version whose stored digest matches the incoming row's is
+        unchanged and left as stored; on a mismatch (or no stored digest,
+        e.g. after ``tracked`` changed) the tracked values themselves are
+        compared.  Returns counts of ``opened``, ``closed`` and ``unchanged``
+        versions.
+        """
+        incoming_map = {row[self.key]: row for row in incoming}
+        close, open_ = set(), set()
+        # close records that no longer exist; a current row that already
+        # has an end_date is left alone
+        for pk, i in self._current.items():
+            if pk not in incoming_map and self.history[i].get('end_date') is None:
+                close.add(pk)
+        for pk, new_row in incoming_map.items():
+            i = self._current.get(pk)
+            if i is not None:
+                old = self.history[i]
+                if old.get('scd2_digest') == row_digest(new_row, self.tracked) or self._tracked_equal(old, new_row):
+                    continue
+                close.add(pk)
+            open_.add(pk)
+        return self.apply(incoming, close, open_, timestamp)
+
+    def apply(self, incoming: List[Dict[str, Any]], close: Set[Any], open_: Set[Any],
+              timestamp: str = None) -> Dict[str, int]:
+        """Close the current versions of the keys in ``close`` and open a new
+        version for the incoming rows whose key is in ``open_``.
+
+        This is the write half of :meth:`update`, for callers that decide
+        the changes elsewhere (e.g. in SQL, see ``duckdb_engine.scd2_update``).
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow().isoformat()
+        incoming_map = {row[self.key]: row for row in incoming}
+        self.latest = incoming_map
+        for pk in [pk for pk in self._current if pk in close]:
+            self._close(self._current.pop(pk), timestamp)
+        for pk, new_row in incoming_map.items():
+            if pk in open_:
+                self._open(new_row, timestamp, row_digest(new_row, self.tracked))
+        opened = sum(1 for pk in incoming_map if pk in open_)
+        return {'opened': opened, 'closed': len(close), 'unchanged': len(incoming_map) - opened}
+
+    def _with_latest(self, i: int) -> Dict[str, Any]:
+        row = self.history[i]
+        fresh = self.latest.get(row.get(self.key))
+        return row if fresh is None else dict(row, **fresh)
+
+    def current_rows(self) -> List[Dict[str, Any]]:
+        """Current version of every key, in history order, with untracked
+        attributes taken from the last applied snapshot (the stored
+        versions are not modified)."""
+        return [self._with_latest(i) for i in sorted(self._current.values())]
+
+    def history_rows(self) -> List[Dict[str, Any]]:
+        """Every version in history order, current ones overlaid like
+        :meth:`current_rows`; the input of ``dim_apps``."""
+        current = set(self._current.values())
+        return [self._with_latest(i) if i in current else row for i, row in enumerate(self.history)]
+
+    def current_keys(self) -> List[Any]:
+        return list(self._current)
+
+    def current(self, pk: Any) -> Optional[Dict[str, Any]]:
+        i = self._current.get(pk)
+        return None if i is None else self.history[i]
+
+    def versions(self, pk: Any) -> List[Dict[str, Any]]:
+        """All versions of ``pk``, oldest first."""
+        return [self.history[i] for i in self._versions.get(pk, [])]
+
+    def as_of(self, pk: Any, when: str) -> Optional[Dict[str, Any]]:
+        """The version of ``pk`` valid at ISO timestamp ``when``
+        (``start_date <= when < end_date``), or None."""
+        starts = self._starts.get(pk)
+        if not starts:
+            return None
+        at = bisect_right(starts, when) - 1
+        if at < 0:
+            return None
+        row = self.history[self._versions[pk][at]]
+        end = row.get('end_date')
+        if end is not None and end <= when:
+            return None
+        return row
+
+    def unsaved(self) -> List[Dict[str, Any]]:
+        """Rows appended since the store was loaded or last saved."""
+        return self.history[self.persisted:]
+
+    def mark_saved(self) -> None:
+        self.persisted = len(self.history)
+        self.rewrite = False
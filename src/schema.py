@@ -0,0 +1,408 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+
+# declared column types of the raw sources: column -> (type, drifted aliases).
+# CSV cells are converted once at ingest by the compiled converters below, so
+# cleaning receives typed values instead of re-parsing strings.
+APPS_SCHEMA: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'appId': ('str', ('app_id',)),
+    'title': ('str', ('name',)),
+    'developer': ('str', ('developerName',)),
+    'developerId': ('str', ('developer_id',)),
+    'genre': ('str', ('genres',)),
+    'score': ('float', ('rating',)),
+    'ratings': ('int', ('ratings_count',)),
+    'installs': ('str', ()),
+    'price': ('float', ()),
+    'free': ('bool', ()),
+    'contentRating': ('str', ('content_rating',)),
+    'released': ('str', ('year',)),
+    'updated': ('auto', ()),
+    'version': ('str', ()),
+    'description': ('str', ('descr',)),
+    'summary': ('str', ()),
+}
+
+REVIEWS_SCHEMA: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'reviewId': ('str', ('review_id',)),
+    'app_id': ('str', ('appId', 'app')),
+    'app_name': ('str', ()),
+    'userName': ('str', ('user_name',)),
+    'content': ('str', ('comments', 'review_text')),
+    'score': ('int', ('rating',)),
+    'thumbsUpCount': ('int', ('thumbs_up_count',)),
+    'reviewCreatedVersion': ('str', ('review_created_version',)),
+    'at': ('str', ('date',)),
+    'replyContent': ('str', ('reply_content',)),
+    'repliedAt': ('str', ('replied_at',)),
+}
+
+SCHEMAS = {'apps': APPS_SCHEMA, 'reviews': REVIEWS_SCHEMA}
+
+# low-cardinality string columns, interned at ingest (see
+# CategoricalInterner) so each distinct value is held once; near-unique
+# columns such as userName would gain nothing
+CATEGORICAL_COLUMNS = {
+    'apps': ('developer', 'developerId', 'genre', 'installs', 'contentRating', 'version'),
+    'reviews': ('app_id', 'app_name', 'reviewCreatedVersion'),
+}
+
+# extra aliases loaded from config.COLUMN_ALIASES_PATH, keyed by its mtime
+_configured: Dict[str, Any] = {'stamp': None, 'aliases': {}}
+
+
+def configured_aliases() -> Dict[str, Dict[str, List[str]]]:
+    """Extra aliases from ``config.COLUMN_ALIASES_PATH``, if that file exists.
+
+    The file maps source -> schema column -> aliases, e.g.
+    ``{"reviews": {"content": ["body"]}}``; they are tried after the
+    built-in aliases.  The file is re-read only when it changes.
+    """
+    path = config.COLUMN_ALIASES_PATH
+    try:
+        stamp = (path, os.path.getmtime(path))
+    except (OSError, TypeError):
+        return {}
+    if _configured['stamp'] != stamp:
+        with open(path, 'r', encoding='utf-8') as f:
+            _configured['aliases'] = json.load(f)
+        _configured['stamp'] = stamp
+    return _configured['aliases']
+
+
+def source_schema(source: str) -> Dict[str, Tuple[str, Tuple[str, ...]]]:
+    """The declared schema of ``source`` plus any configured aliases."""
+    extra = configured_aliases().get(source, {})
+    merged = {}
+    for column, (kind, aliases) in SCHEMAS[source].items():
+        added = tuple(a for a in extra.get(column, ()) if a != column and a not in aliases)
+        merged[column] = (kind, aliases + added)
+    unknown = set(extra) - set(merged)
+    if unknown:
+        raise ValueError(f"column aliases for undeclared {source} columns: {sorted(unknown)}")
+    return merged
+
+
+def raw_names(source: str) -> frozenset:
+    """Every raw key (column or alias) that feeds a ``source`` column."""
+    return frozenset(column_types(source_schema(source)))
+
+
+NULL_TOKENS = frozenset({'', 'NULL', 'NONE'})
+
+
+def to_str(cell: str) -> Optional[str]:
+    v = cell.strip()
+    if v.upper() in NULL_TOKENS:
+        return None
+    return v
+
+
+def to_int(cell: Any) -> Optional[int]:
+    """Convert a cell or raw value to int; raises ValueError on bad input.
+
+    Integral floats and decimal strings are truncated like ``int(float(v))``.
+    """
+    if cell is None or type(cell) is int:
+        return cell
+    if isinstance(cell, str):
+        v = cell.strip()
+        if v.upper() in NULL_TOKENS:
+            return None
+        try:
+            return int(v)
+        except ValueError:
+            cell = float(v)
+    try:
+        return int(cell)
+    except (TypeError, OverflowError) as e:
+        raise ValueError(str(e))
+
+
+def to_float(cell: Any) -> Optional[float]:
+    if cell is None or type(cell) is float:
+        return cell
+    if isinstance(cell, str):
+        cell = cell.strip()
+        if cell.upper() in NULL_TOKENS:
+            return None
+    try:
+        return float(cell)
+    except TypeError as e:
+        raise ValueError(str(e))
+
+
+_BOOLS = {'TRUE': True, 'T': True, 'YES': True, '1': True,
+          'FALSE': False, 'F': False, 'NO': False, '0': False}
+
+
+def to_bool(cell: str) -> Optional[bool]:
+    v = cell.strip().upper()
+    if v in NULL_TOKENS:
+        return None
+    try:
+        return _BOOLS[v]
+    except KeyError:
+        raise ValueError(f"invalid boolean: {cell!r}")
+
+
+def to_auto(cell: str) -> Any:
+    """Untyped column: int, then float, else the stripped text."""
+    v = cell.strip()
+    if v.upper() in NULL_TOKENS:
+        return None
+    try:
+        return int(v)
+    except ValueError:
+        pass
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+
+def to_datetime(value: Any) -> Optional[datetime]:
+    """Parse an ISO timestamp (``Z`` suffix allowed); raises ValueError."""
+    if value is None or isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"invalid timestamp: {value!r}")
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def to_utc_stamp(value: Any) -> Optional[str]:
+    """``YYYY-MM-DDTHH:MM:SS.ffffff`` in naive UTC for an ISO timestamp or
+    datetime (offsets are converted, naive values are taken as UTC), so
+    timestamps compare correctly as strings; None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        dt = to_datetime(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec='microseconds')
+
+
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'str': to_str,
+    'int': to_int,
+    'float': to_float,
+    'bool': to_bool,
+    'auto': to_auto,
+}
+
+
+def column_types(schema: Dict[str, Tuple[str, Tuple[str, ...]]]) -> Dict[str, str]:
+    """Flatten a schema to ``{column or alias: type}``."""
+    types = {}
+    for column, (kind, aliases) in schema.items():
+        types[column] = kind
+        for alias in aliases:
+            types[alias] = kind
+    return types
+
+
+def compile_columns(schema_name: Optional[str], header: List[str],
+                    fields: frozenset = None) -> List[Tuple[int, str, Callable[[str], Any]]]:
+    """Compile a CSV header into ``(index, name, converter)`` triples.
+
+    Columns the schema does not declare (or every column without a schema)
+    are converted with :func:`to_auto`; ``fields`` drops unwanted columns
+    before any cell is touched.
+    """
+    types = column_types(source_schema(schema_name)) if schema_name else {}
+    return [(i, name, CONVERTERS[types.get(name, 'auto')])
+            for i, name in enumerate(header)
+            if fields is None or name in fields]
+
+
+def convert_row(row: List[str], columns: List[Tuple[int, str, Callable[[str], Any]]],
+                bad: Dict[str, int]) -> Dict[str, Any]:
+    """Build a record from a CSV row; unparseable cells become None and are
+    counted per column in ``bad``."""
+    rec = {}
+    width = len(row)
+    for i, name, convert in columns:
+        if i >= width:
+            rec[name] = None
+            continue
+        try:
+            rec[name] = convert(row[i])
+        except ValueError:
+            bad[name] = bad.get(name, 0) + 1
+            rec[name] = None
+    return rec
+
+
+def format_bad_values(bad: Dict[str, int]) -> str:
+    return ', '.join(f"{name}={count}" for name, count in sorted(bad.items()))
+
+
+def format_alias_counts(counts: Dict[str, int]) -> str:
+    return ', '.join(f"{label} ({n})" for label, n in sorted(counts.items()))
+
+
+class ColumnMapper:
+    """Resolves drifted raw keys to the schema columns of one source.
+
+    For every distinct key set (a CSV header, or the keys of JSON records,
+    which nearly always repeat) a projector is built once.  It returns
+    the schema columns' values as a tuple in schema order, each one equal to
+    ``r.get(column) or r.get(alias) or ...`` over that column's aliases but
+    probing only the keys that are actually present.  Records seen per key
+    set are counted, so :meth:`alias_counts` can report which aliases fed
+    each column.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.schema = source_schema(source)
+        self.columns = tuple(self.schema)
+        self._projectors: Dict[tuple, Callable[[Dict[str, Any]], tuple]] = {}
+        self._seen: Dict[tuple, int] = {}
+
+    def _compile(self, keys: tuple) -> Callable[[Dict[str, Any]], tuple]:
+        present = set(keys)
+        plan = []
+        for column, (_, aliases) in self.schema.items():
+            names = (column,) + aliases
+            # a falsy value falls through to the next alias, except for the
+            # last alias whose value is kept as it is (``a or b or c``)
+            plan.append((tuple(n for n in names if n in present), names[-1] in present))
+
+        if all(len(found) == 1 for found, _ in plan):
+            # one present key per column: a single itemgetter call
+            getter = itemgetter(*(found[0] for found, _ in plan))
+            if len(plan) == 1:
+                return lambda r: (getter(r),)
+            blank = [i for i, (_, keep_last) in enumerate(plan) if not keep_last]
+            if not blank:
+                return getter
+
+            def project_single(r: Dict[str, Any]) -> tuple:
+                values = list(getter(r))
+                for i in blank:
+                    values[i] = values[i] or None
+                return tuple(values)
+            return project_single
+
+        def project(r: Dict[str, Any]) -> tuple:
+            values = []
+            for found, keep_last in plan:
+                value = None
+                for name in found:
+                    value = r[name]
+                    if value:
+                        break
+                values.append(value if value or keep_last else None)
+            return tuple(values)
+        return project
+
+    def _projector(self, keys: tuple) -> Callable[[Dict[str, Any]], tuple]:
+        projector = self._projectors.get(keys)
+        if projector is None:
+            projector = self._projectors[keys] = self._compile(keys)
+            self._seen[keys] = 0
+        return projector
+
+    def project(self, record: Dict[str, Any]) -> tuple:
+        keys = tuple(record)
+        self._seen[keys] = self._seen.get(keys, 0) + 1
+        return self._projector(keys)(record)
+
+    def iter_project(self, records: Iterable[Dict[str, Any]]) -> Iterator[tuple]:
+        """Project a stream of records; consecutive records with the same
+        keys reuse the projector without a cache lookup."""
+        last_keys = None
+        projector = None
+        run = 0
+        try:
+            for record in records:
+                keys = tuple(record)
+                if keys != last_keys:
+                    if run:
+                        self._seen[last_keys] += run
+                    projector = self._projector(keys)
+                    last_keys = keys
+                    run = 0
+                run += 1
+                yield projector(record)
+        finally:
+            if run:
+                self._seen[last_keys] += run
+
+    def alias_counts(self) -> Dict[str, int]:
+        """``{'alias->column': records}`` for records whose column came from
+        an alias (the first present name is reported)."""
+        counts: Dict[str, int] = {}
+        for keys, seen in self._seen.items():
+            present = set(keys)
+            for column, (_, aliases) in self.schema.items():
+                if column in present:
+                    continue
+                for alias in aliases:
+                    if alias in present:
+                        label = f"{alias}->{column}"
+                        counts[label] = counts.get(label, 0) + seen
+                        break
+        return counts
+
+
+class StringDictionary:
+    """Dictionary encoding of one column: every distinct string gets a small
+    integer code, in order of first appearance, and one shared str object."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code: Optional[int]) -> Optional[str]:
+        return None if code is None else self.values[code]
+
+
+class CategoricalInterner:
+    """Interns the :data:`CATEGORICAL_COLUMNS` of one source.
+
+    Raw records keep their layout: string values of categorical keys
+    (columns and their aliases) are replaced in place by their
+    :func:`sys.intern` copy, so a value repeated across many records is held
+    once and later stages (cleaning keeps the objects) hash and compare the
+    same object.  Values stay strings; integer codes only exist in the
+    columnar writer (see :class:`StringDictionary`).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        source_columns = source_schema(source)
+        self._keys = tuple(name for column in CATEGORICAL_COLUMNS.get(source, ())
+                           for name in (column,) + source_columns[column][1])
+
+    def intern(self, record: Any) -> Any:
+        """Intern ``record`` in place and return it."""
+        if not isinstance(record, dict):
+            return record
+        for name in self._keys:
+            value = record.get(name)
+            if type(value) is str:
+                record[name] = sys.intern(value)
+        return record
@@ -1,125 +1,164 @@
-from typing import List, Dict, Any
+from bisect import bisect_right
+from operator import attrgetter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
 
+import schema
+from profiling import TableProfile
+from quality import QualityReport
+from records import DimAppRecord, FactRecord, ReviewRecord
+
+
+def _print_drift(mapper: schema.ColumnMapper) -> None:
+    counts = mapper.alias_counts()
+    if counts:
+        print(f"Schema drift in {mapper.source}: {schema.format_alias_counts(counts)}")
+
 
 def clean_apps_metadata(apps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     print("Cleaning apps metadata...")
     cleaned_apps = []
+    # drifted key names are resolved once per key set (see schema.ColumnMapper)
+    mapper = schema.ColumnMapper('apps')
 
-    for app in apps:
-        # support multiple possible key names (schema drift)
-        app_id = app.get('appId') or app.get('app_id')
-        title = app.get('title') or app.get('name')
+    for (app_id, title, developer, developer_id, category, rating_val, ratings_count_val,
+         installs, price, free, content_rating, released, updated, version,
+         description, summary) in mapper.iter_project(apps):
         if not app_id or not title:
             continue
 
-        developer = app.get('developer') or app.get('developerName') or 'Unknown'
-        developer_id = app.get('developerId') or app.get('developer_id')
-        category = app.get('genre') or app.get('genres')
-        rating_val = app.get('score') or app.get('rating')
-        ratings_count_val = app.get('ratings') or app.get('ratings_count')
-        installs = app.get('installs')
-        price = app.get('price')
-        free = app.get('free')
-        content_rating = app.get('contentRating') or app.get('content_rating')
-        released = app.get('released') or app.get('year')
         if released is not None:
             released = str(released)
-        updated = app.get('updated')
-        version = app.get('version')
-        description = app.get('description') or app.get('descr') or ''
-        summary = app.get('summary') or ''
+        # CSV cells are parsed to numbers; keep these text columns one type
+        if version is not None:
+            version = str(version)
 
         cleaned_app = {
             'app_id': app_id,
             'title': title,
-            'developer': developer,
+            'developer': developer or 'Unknown',
             'developer_id': developer_id,
             'category': category,
             'rating': float(rating_val) if rating_val else None,
             'ratings_count': int(ratings_count_val) if ratings_count_val else 0,
-            'installs': installs or '0',
+            'installs': str(installs) if installs else '0',
             'price': float(price) if price else 0.0,
             'free': free if free is not None else True,
             'content_rating': content_rating,
             'released': released,
             'updated': updated,
             'version': version,
-            'description': description,
-            'summary': summary
+            'description': description or '',
+            'summary': summary or ''
         }
 
         cleaned_apps.append(cleaned_app)
 
+    _print_drift(mapper)
     print(f"Cleaned {len(cleaned_apps)} app records")
     return cleaned_apps
 
 
-def clean_apps_reviews(reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    print("Cleaning apps reviews...")
-    cleaned_reviews = []
+def _coerce(convert, value: Any, column: str, bad: Optional[Dict[str, int]]) -> Any:
+    """Apply a :mod:`schema` converter, counting values it rejects."""
+    try:
+        return convert(value)
+    except ValueError:
+        if bad is not None:
+            bad[column] = bad.get(column, 0) + 1
+        return None
 
-    for review in reviews:
-        # handle drifted column names
-        app_id = review.get('app_id') or review.get('appId') or review.get('app')
-        content = review.get('content') or review.get('comments') or review.get('review_text')
-        if not app_id or content is None:
-            continue
 
-        rating_val = review.get('score') or review.get('rating')
-        thumbs = review.get('thumbsUpCount') or review.get('thumbs_up_count') or 0
-        review_date = review.get('at') or review.get('date')
-        if isinstance(review_date, str):
-            try:
-                review_date = datetime.fromisoformat(review_date.replace('Z', '+00:00'))
-            except:
-                review_date = None
+def _clean_review(values: tuple, bad: Dict[str, int] = None,
+                  compact: bool = False) -> Optional[Dict[str, Any]]:
+    """Clean one review from its ``schema.REVIEWS_SCHEMA`` column values
+    (as projected by :class:`schema.ColumnMapper`); returns None when it
+    must be dropped.
 
-        # parse numeric score safely
-        score_val = None
-        if rating_val is not None:
-            try:
-                score_val = int(rating_val)
-            except Exception:
-                try:
-                    score_val = int(float(rating_val))
-                except Exception:
-                    score_val = None
-        thumbs_int = None
-        try:
-            thumbs_int = int(thumbs)
-        except Exception:
-            thumbs_int = 0
-
-        cleaned_review = {
-            'review_id': review.get('reviewId') or review.get('review_id'),
-            'app_id': app_id,
-            'app_name': review.get('app_name'),
-            'user_name': review.get('userName') or review.get('user_name') or 'Anonymous',
-            'content': content,
-            'score': score_val,
-            'thumbs_up_count': thumbs_int,
-            'review_created_version': review.get('reviewCreatedVersion') or review.get('review_created_version'),
-            'at': review_date.isoformat() if review_date else None,
-            'reply_content': review.get('replyContent') or review.get('reply_content'),
-            'replied_at': review.get('repliedAt') or review.get('replied_at')
-        }
+    Values that cannot be coerced become None (``thumbs_up_count`` 0) and
+    are counted per column in ``bad``.  ``compact`` returns a
+    :class:`records.ReviewRecord` instead of a dict.
+    """
+    (review_id, app_id, app_name, user_name, content, rating_val, thumbs,
+     created_version, review_date, reply_content, replied_at) = values
+    if not app_id or content is None:
+        return None
 
-        cleaned_reviews.append(cleaned_review)
+    # CSV values arrive typed from ingest; only JSON strings need converting
+    score_val = rating_val if type(rating_val) is int else _coerce(schema.to_int, rating_val, 'score', bad)
+    if not thumbs:
+        thumbs_int = 0
+    elif type(thumbs) is int:
+        thumbs_int = thumbs
+    else:
+        thumbs_int = _coerce(schema.to_int, thumbs, 'thumbs_up_count', bad) or 0
+    if review_date is not None:
+        review_date = _coerce(schema.to_datetime, review_date, 'at', bad)
 
+    if compact:
+        return ReviewRecord(review_id, app_id, app_name, user_name or 'Anonymous', content,
+                            score_val, thumbs_int, created_version,
+                            review_date.isoformat() if review_date else None,
+                            reply_content, replied_at)
+    return {
+        'review_id': review_id,
+        'app_id': app_id,
+        'app_name': app_name,
+        'user_name': user_name or 'Anonymous',
+        'content': content,
+        'score': score_val,
+        'thumbs_up_count': thumbs_int,
+        'review_created_version': created_version,
+        'at': review_date.isoformat() if review_date else None,
+        'reply_content': reply_content,
+        'replied_at': replied_at
+    }
+
+
+def clean_apps_reviews(reviews: List[Dict[str, Any]], compact: bool = False,
+                       quality: QualityReport = None, profile: TableProfile = None) -> List[Dict[str, Any]]:
+    """Clean raw reviews; with ``quality`` the rules of that report are
+    checked, and with ``profile`` the columns profiled, on the clean rows
+    within the same pass."""
+    print("Cleaning apps reviews...")
+    bad: Dict[str, int] = {}
+    mapper = schema.ColumnMapper('reviews')
+    rows = iter_clean_apps_reviews(reviews, bad, mapper, compact)
+    if quality is not None:
+        rows = quality.observe(rows)
+    if profile is not None:
+        rows = profile.observe(rows)
+    cleaned_reviews = list(rows)
+    _print_drift(mapper)
+    if bad:
+        print(f"Coerced {sum(bad.values())} bad review values to null ({schema.format_bad_values(bad)})")
     print(f"Cleaned {len(cleaned_reviews)} review records")
     return cleaned_reviews
 
 
+def iter_clean_apps_reviews(reviews: Iterable[Dict[str, Any]], bad: Dict[str, int] = None,
+                            mapper: schema.ColumnMapper = None,
+                            compact: bool = False) -> Iterator[Dict[str, Any]]:
+    """Generator version of :func:`clean_apps_reviews` for streaming runs;
+    ``compact`` yields :class:`records.ReviewRecord` rows."""
+    for values in (mapper or schema.ColumnMapper('reviews')).iter_project(reviews):
+        cleaned_review = _clean_review(values, bad, compact)
+        if cleaned_review is not None:
+            yield cleaned_review
 
-def build_star_schema(apps: List[Dict[str, Any]],
-                      reviews: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-    """Return star schema tables derived from clean app and review lists.
 
-    The return value is a dict with keys ``dim_apps``, ``dim_categories``,
-    ``dim_developers``, ``dim_date`` and ``fact_reviews`` matching the schema
-    provided by the user.  Surrogate keys are generated as consecutive
-    integers starting at 1 within each dimension.
+def build_app_dimensions(apps: List[Dict[str, Any]], compact: bool = False) -> Dict[str, Any]:
+    """Build ``dim_apps``, ``dim_categories`` and ``dim_developers``.
+
+    ``apps`` are app versions: SCD2 history rows, whose ``start_date`` /
+    ``end_date`` become the ``valid_from`` / ``valid_to`` of their
+    ``dim_apps`` row, or a plain snapshot (one always-valid version per app).
+
+    Also returns ``app_index``, a map of app_id -> versions as
+    ``[valid_from, valid_to, app_key, developer_key]`` ordered by
+    ``valid_from``, used to resolve fact rows without scanning ``dim_apps``,
+    and the ``category_keys`` / ``developer_keys`` name -> surrogate key maps.
+    ``compact`` builds ``dim_apps`` from :class:`records.DimAppRecord` rows.
     """
     # build category and developer dimensions
     categories = {}
@@ -146,8 +185,13 @@ def build_star_schema(apps: List[Dict[str, Any]],
             'is_paid': not app.get('free', True),
             'installs': app.get('installs'),
             'catalog_rating': app.get('rating'),
-            'ratings_count': app.get('ratings_count')
+            'ratings_count': app.get('ratings_count'),
+            'valid_from': app.get('start_date'),
+            'valid_to': app.get('end_date'),
+            'is_current': app.get('current_flag', True)
         })
+    if compact:
+        dim_apps = [DimAppRecord.from_dict(row) for row in dim_apps]
 
     # prepare dim_categories and dim_developers lists
     dim_categories = [
@@ -159,13 +203,86 @@ def build_star_schema(apps: List[Dict[str, Any]],
         for name, k in developers.items()
     ]
 
-    # date dimension and fact_reviews
-    dim_date = {}
-    fact_reviews = []
+    # resolve app_id -> versions once instead of scanning dim_apps for every
+    # review; the sort is stable, so versions with equal starts keep their order
+    app_index = {}
+    for row in dim_apps:
+        app_index.setdefault(row['app_id'], []).append(
+            [row['valid_from'], row['valid_to'], row['app_key'], row['developer_key']])
+    for versions in app_index.values():
+        versions.sort(key=lambda v: schema.to_utc_stamp(v[0]) or '')
+
+    return {
+        'dim_apps': dim_apps,
+        'dim_categories': dim_categories,
+        'dim_developers': dim_developers,
+        'app_index': app_index,
+        'category_keys': categories,
+        'developer_keys': developers
+    }
+
+
+def app_version_bounds(app_index: Dict[str, List[list]]) -> Dict[str, Tuple[List[str], List[Optional[str]]]]:
+    """Bisection keys for :func:`resolve_app_version`: per app, the version
+    starts and ends as naive UTC stamps (see :func:`schema.to_utc_stamp`).
+    The first version of every app also covers the time before it, since
+    the history only starts with the first pipeline run while reviews go
+    back further."""
+    return {app_id: ([''] + [schema.to_utc_stamp(v[0]) or '' for v in versions[1:]],
+                     [schema.to_utc_stamp(v[1]) for v in versions])
+            for app_id, versions in app_index.items()}
 
+
+def resolve_app_version(app_index: Dict[str, List[list]], bounds: Dict[str, tuple],
+                        app_id: Any, at: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(app_key, developer_key) of the version of ``app_id`` valid at ``at``
+    (an ISO timestamp or datetime, compared in UTC), found by bisection;
+    (None, None) if there is none.
+
+    A review without a usable timestamp takes the latest version, even when
+    that version is closed (the app's last known attributes).
+    """
+    versions = app_index.get(app_id)
+    if not versions:
+        return None, None
+    when = schema.to_utc_stamp(at)
+    if when is None:
+        return versions[-1][2], versions[-1][3]
+    starts, ends = bounds[app_id]
+    i = bisect_right(starts, when) - 1
+    valid_to = ends[i]
+    if valid_to is not None and when >= valid_to:
+        # the app was delisted (or between versions) at that time
+        return None, None
+    return versions[i][2], versions[i][3]
+
+
+_fact_columns = attrgetter('review_id', 'app_id', 'at', 'score', 'thumbs_up_count', 'content',
+                           'review_created_version')
+
+
+def iter_fact_reviews(reviews: Iterable[Dict[str, Any]],
+                      app_index: Dict[str, List[list]],
+                      dim_date: Dict[Any, int],
+                      compact: bool = False) -> Iterator[Dict[str, Any]]:
+    """Yield fact_reviews rows in one pass over ``reviews``.
+
+    Every review is keyed to the app version valid at its ``at`` timestamp
+    (see :func:`resolve_app_version`).  ``dim_date`` maps date -> date_key
+    and is filled in as new dates are seen, so it is complete once the
+    generator is exhausted.  ``compact`` yields :class:`records.FactRecord`
+    rows.
+    """
+    bounds = app_version_bounds(app_index)
     for rev in reviews:
+        if type(rev) is ReviewRecord:
+            # plain attribute reads instead of one Mapping.get call per column
+            review_id, app_id, dt_str, score, thumbs, content, version = _fact_columns(rev)
+        else:
+            review_id, app_id, dt_str = rev.get('review_id'), rev.get('app_id'), rev.get('at')
+            score, thumbs, content = rev.get('score'), rev.get('thumbs_up_count'), rev.get('content')
+            version = rev.get('review_created_version')
         # convert review date to date_key
-        dt_str = rev.get('at')
         if dt_str:
             try:
                 dt = datetime.fromisoformat(dt_str)
@@ -173,27 +290,34 @@ def build_star_schema(apps: List[Dict[str, Any]],
                 dt = None
         else:
             dt = None
+        date_key = None
         if dt:
             date_only = dt.date()
-            if date_only not in dim_date:
-                key = len(dim_date) + 1
-                dim_date[date_only] = key
-        else:
-            key = None
-        fact_reviews.append({
-            'review_id': rev.get('review_id'),
-            'app_key': next((r['app_key'] for r in dim_apps if r['app_id'] == rev.get('app_id')), None),
-            'developer_key': next((r['developer_key'] for r in dim_apps if r['app_id'] == rev.get('app_id')), None),
-            'date_key': dim_date.get(date_only) if dt else None,
-            'rating': rev.get('score'),
-            'thumbs_up_count': rev.get('thumbs_up_count'),
-            'review_text': rev.get('content'),
-            'review_version': rev.get('review_created_version')
-        })
+            date_key = dim_date.get(date_only)
+            if date_key is None:
+                date_key = len(dim_date) + 1
+                dim_date[date_only] = date_key
+        app_key, developer_key = resolve_app_version(app_index, bounds, app_id, dt)
+        if compact:
+            yield FactRecord(review_id, app_key, developer_key, date_key, score, thumbs, content, version)
+            continue
+        yield {
+            'review_id': review_id,
+            'app_key': app_key,
+            'developer_key': developer_key,
+            'date_key': date_key,
+            'rating': score,
+            'thumbs_up_count': thumbs,
+            'review_text': content,
+            'review_version': version
+        }
 
-    dim_date_rows = []
+
+def dim_date_rows(dim_date: Dict[Any, int]) -> List[Dict[str, Any]]:
+    """Expand a date -> date_key map into ``dim_date`` rows."""
+    rows = []
     for date_val, key in dim_date.items():
-        dim_date_rows.append({
+        rows.append({
             'date_key': key,
             'date': date_val.isoformat(),
             'year': date_val.year,
@@ -202,29 +326,47 @@ def build_star_schema(apps: List[Dict[str, Any]],
             'day_of_week': date_val.isoweekday(),
             'is_weekend': date_val.weekday() >= 5
         })
+    return rows
+
+
+def build_star_schema(apps: List[Dict[str, Any]],
+                      reviews: List[Dict[str, Any]],
+                      compact: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """Return star schema tables derived from clean app and review lists.
+
+    The return value is a dict with keys ``dim_apps``, ``dim_categories``,
+    ``dim_developers``, ``dim_date`` and ``fact_reviews`` matching the schema
+    provided by the user.  Surrogate keys are generated as consecutive
+    integers starting at 1 within each dimension.
+
+    ``apps`` may be the SCD2 history: ``dim_apps`` then has one row per
+    version and every fact row is keyed to the version that was valid when
+    the review was written (point-in-time join).
+
+    ``compact`` builds ``dim_apps`` and ``fact_reviews`` from the slotted
+    types of :mod:`records` instead of dicts.
+    """
+    dims = build_app_dimensions(apps, compact)
+    dim_date = {}
+    fact_reviews = list(iter_fact_reviews(reviews, dims['app_index'], dim_date, compact))
 
     return {
-        'dim_apps': dim_apps,
-        'dim_categories': dim_categories,
-        'dim_developers': dim_developers,
-        'dim_date': dim_date_rows,
+        'dim_apps': dims['dim_apps'],
+        'dim_categories': dims['dim_categories'],
+        'dim_developers': dims['dim_developers'],
+        'dim_date': dim_date_rows(dim_date),
         'fact_reviews': fact_reviews
     }
 
 
-def transform_for_analytics(apps: List[Dict[str, Any]], 
-                            reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Keep existing metrics aggregation for backwards compatibility.
+def update_review_aggregates(review_aggregates: Dict[str, Dict[str, Any]],
+                             reviews: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Fold ``reviews`` into per-app running aggregates (counts, score sums,
+    star buckets, thumbs-up and reply counts), in place.
 
-    This function continues to produce the simple analytics records used in Lab
-   1; it is not aware of the full star schema.  The new :func:`build_star_schema`
-    function should be used when schema generation is required.
+    Apps keep their first-seen order, so folding a history and then a delta
+    gives the same aggregates as folding both at once.
     """
-    print("Transforming data for analytics...")
-    
-    app_dict = {app['app_id']: app for app in apps}
-    
-    review_aggregates = {}
     for review in reviews:
         app_id = review['app_id']
         
@@ -259,11 +401,19 @@ def transform_for_analytics(apps: List[Dict[str, Any]],
         
         if review['reply_content']:
             agg['reviews_with_reply'] += 1
-    
+    return review_aggregates
+
+
+def analytics_from_aggregates(apps: List[Dict[str, Any]],
+                              review_aggregates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Attach finished ``review_metrics`` to each app; aggregates are not modified."""
+    app_dict = {app['app_id']: app for app in apps}
+
     analytics_ready = []
-    for app_id, agg in review_aggregates.items():
+    for app_id, running in review_aggregates.items():
         if app_id in app_dict:
             app_data = app_dict[app_id].copy()
+            agg = dict(running)
             
             agg['avg_score'] = agg['score_sum'] / agg['total_reviews'] if agg['total_reviews'] > 0 else 0
             agg['reply_rate'] = agg['reviews_with_reply'] / agg['total_reviews'] if agg['total_reviews'] > 0 else 0
@@ -272,6 +422,19 @@ def transform_for_analytics(apps: List[Dict[str, Any]],
             
             app_data['review_metrics'] = agg
             analytics_ready.append(app_data)
-    
+    return analytics_ready
+
+
+def transform_for_analytics(apps: List[Dict[str, Any]], 
+                            reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep existing metrics aggregation for backwards compatibility.
+
+    This function continues to produce the simple analytics records used in Lab
+   1; it is not aware of the full star schema.  The new :func:`build_star_schema`
+    function should be used when schema generation is required.
+    """
+    print("Transforming data for analytics...")
+    review_aggregates = update_review_aggregates({}, reviews)
+    analytics_ready = analytics_from_aggregates(apps, review_aggregates)
     print(f"Created {len(analytics_ready)} analytics-ready records")
     return analytics_ready
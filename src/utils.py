@@ -1,11 +1,21 @@
-from datetime import datetime
-from typing import List, Dict, Any
+import json
+import tempfile
+from typing import List, Dict, Any, Iterable, Iterator
 
+from records import compact
+from scd2 import SCD2Store
 
-def merge_reviews(existing: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+
+def merge_reviews(existing: List[Dict[str, Any]], new: List[Dict[str, Any]],
+                  record_type: type = None) -> List[Dict[str, Any]]:
     """Merge two lists of review dicts using review_id as key.
     If a review_id exists in both, the newer dictionary overwrites.
+
+    ``record_type`` (e.g. :class:`records.ReviewRecord`) converts the
+    ``existing`` rows to compact records as they are merged.
     """
+    if record_type is not None:
+        existing = compact(existing, record_type)
     merged = {r['review_id']: r for r in existing}
     for r in new:
         rid = r.get('review_id')
@@ -15,10 +25,44 @@ def merge_reviews(existing: List[Dict[str, Any]], new: List[Dict[str, Any]]) ->
     return list(merged.values())
 
 
+def merge_reviews_streaming(existing: Iterable[Dict[str, Any]],
+                            new: Iterable[Dict[str, Any]],
+                            spool_dir: str = None) -> Iterator[Dict[str, Any]]:
+    """Generator equivalent of :func:`merge_reviews`.
+
+    ``new`` is spooled to a temporary line-delimited file while only a
+    review_id -> byte offset map is kept in memory; ``existing`` is then
+    streamed once.  Rows are yielded in exactly the order
+    :func:`merge_reviews` would return them.
+    """
+    with tempfile.TemporaryFile('w+b', dir=spool_dir) as spool:
+        # review_id -> offset of its last occurrence; dict order keeps the
+        # first occurrence, matching the dict-based merge
+        offsets: Dict[Any, int] = {}
+        for r in new:
+            rid = r.get('review_id')
+            if rid is None:
+                continue
+            offsets[rid] = spool.tell()
+            spool.write(json.dumps(r, ensure_ascii=False).encode('utf-8'))
+            spool.write(b'\n')
+
+        def read_at(offset: int) -> Dict[str, Any]:
+            spool.seek(offset)
+            return json.loads(spool.readline())
+
+        for r in existing:
+            offset = offsets.pop(r['review_id'], None)
+            yield r if offset is None else read_at(offset)
+        for offset in offsets.values():
+            yield read_at(offset)
+
+
 def scd2_update(existing: List[Dict[str, Any]],
                 incoming: List[Dict[str, Any]],
                 key: str = 'app_id',
-                timestamp: str = None) -> List[Dict[str, Any]]:
+                timestamp: str = None,
+                tracked_columns: List[str] = None) -> List[Dict[str, Any]]:
     """Perform a simple SCD2 upsert on a list of existing historical records.
 
     Args:
@@ -27,50 +71,12 @@ def scd2_update(existing: List[Dict[str, Any]],
         incoming: new snapshot of dimension table (no scd metadata)
         key: name of primary key field to compare
         timestamp: ISO string for current processing time; if None, now() is used
+        tracked_columns: columns whose changes open a new version; other
+            changes leave the stored versions unchanged.  None tracks all.
 
     Returns:
         updated history list with new records appended and old ones closed
     """
-    if timestamp is None:
-        timestamp = datetime.utcnow().isoformat()
-
-    # build maps for current active rows
-    current = {row[key]: row for row in existing if row.get('current_flag', False)}
-    out_history = existing.copy()
-
-    incoming_map = {row[key]: row for row in incoming}
-
-    # close records that no longer exist
-    for pk, row in list(current.items()):
-        if pk not in incoming_map:
-            # mark end_date and deactivate
-            if row.get('end_date') is None:
-                row['end_date'] = timestamp
-                row['current_flag'] = False
-
-    # process incoming rows
-    for pk, new_row in incoming_map.items():
-        if pk not in current:
-            # new record entirely; insert as current
-            rec = new_row.copy()
-            rec['start_date'] = timestamp
-            rec['end_date'] = None
-            rec['current_flag'] = True
-            out_history.append(rec)
-        else:
-            old = current[pk]
-            # compare attributes aside from scd metadata
-            # drop scd columns to compare
-            old_attrs = {k: v for k, v in old.items()
-                         if k not in ('start_date', 'end_date', 'current_flag')}
-            if any(old_attrs.get(k) != new_row.get(k) for k in new_row):
-                # close old
-                old['end_date'] = timestamp
-                old['current_flag'] = False
-                # add new
-                rec = new_row.copy()
-                rec['start_date'] = timestamp
-                rec['end_date'] = None
-                rec['current_flag'] = True
-                out_history.append(rec)
-    return out_history
+    store = SCD2Store(existing, key, tracked_columns)
+    store.update(incoming, timestamp)
+    return store.history
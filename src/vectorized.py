@@ -0,0 +1,231 @@
+"""Columnar (pandas/NumPy) engine for review cleaning, dedup and aggregation.
+
+Every function here returns exactly what its row-at-a-time counterpart in
+:mod:`transform` / :mod:`utils` returns; frames keep object columns so that
+values round-trip as the same Python objects.  Cases the vectorized paths do
+not cover (score strings, non-canonical timestamps, ...) fall back to the
+:mod:`schema` converters for just those cells.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+import schema
+from transform import analytics_from_aggregates
+
+# column order of cleaned review records (see transform._clean_review)
+REVIEW_COLUMNS = [
+    'review_id', 'app_id', 'app_name', 'user_name', 'content', 'score',
+    'thumbs_up_count', 'review_created_version', 'at', 'reply_content', 'replied_at',
+]
+
+# canonical timestamp layout; such strings are their own isoformat()
+_ISO_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def _pandas():
+    try:
+        import pandas
+    except ImportError as e:
+        raise ImportError("engine='pandas' requires pandas (pip install pandas)") from e
+    return pandas
+
+
+def _columns(n_columns: int, rows: List[tuple]) -> List[np.ndarray]:
+    """Transpose equal-length row tuples into one object array per column."""
+    table = np.empty((len(rows), n_columns), dtype=object)
+    try:
+        table[:] = rows
+    except ValueError:
+        # nested values (lists, dicts) defeat the bulk copy
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                table[i, j] = value
+    return [table[:, i] for i in range(n_columns)]
+
+
+def _object_frame(columns: List[str], arrays: List[np.ndarray]):
+    pd = _pandas()
+    return pd.DataFrame({name: pd.Series(array, dtype=object, copy=False)
+                         for name, array in zip(columns, arrays)})
+
+
+def reviews_frame(records: Iterable[Dict[str, Any]]):
+    """Load cleaned review records into an object-column frame."""
+    get = [(c, None) for c in REVIEW_COLUMNS]
+    rows = [tuple(r.get(c, d) for c, d in get) for r in records]
+    return _object_frame(REVIEW_COLUMNS, _columns(len(REVIEW_COLUMNS), rows))
+
+
+def frame_records(df) -> List[Dict[str, Any]]:
+    """Convert a review frame back to a list of dicts."""
+    columns = list(df.columns)
+    arrays = [df[c].to_numpy(dtype=object) for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*arrays)]
+
+
+def _coerce_cells(values: np.ndarray, positions: np.ndarray, convert, column: str,
+                  bad: Optional[Dict[str, int]]) -> None:
+    """Run a schema converter over ``values[positions]`` in place; rejected
+    values become None and are counted in ``bad``."""
+    failed = 0
+    for i in positions:
+        try:
+            values[i] = convert(values[i])
+        except ValueError:
+            values[i] = None
+            failed += 1
+    if bad is not None and failed:
+        bad[column] = bad.get(column, 0) + failed
+
+
+def _types(values: np.ndarray) -> np.ndarray:
+    return np.fromiter(map(type, values), dtype=object, count=len(values))
+
+
+def _clean_scores(values: np.ndarray, bad: Optional[Dict[str, int]]) -> np.ndarray:
+    types = _types(values)
+    positions = np.flatnonzero((types != int) & (values != None))  # noqa: E711
+    _coerce_cells(values, positions, schema.to_int, 'score', bad)
+    return values
+
+
+def _clean_thumbs(values: np.ndarray, bad: Optional[Dict[str, int]]) -> np.ndarray:
+    truthy = values.astype(bool)
+    values[~truthy] = 0
+    positions = np.flatnonzero(truthy & (_types(values) != int))
+    _coerce_cells(values, positions, schema.to_int, 'thumbs_up_count', bad)
+    # unparseable counts become 0, like ``to_int(...) or 0``
+    values[positions[values[positions] == None]] = 0  # noqa: E711
+    return values
+
+
+def _clean_timestamps(values: np.ndarray, bad: Optional[Dict[str, int]]) -> np.ndarray:
+    pd = _pandas()
+    present = values != None  # noqa: E711
+    # strings already in the canonical layout are kept as they are
+    shaped = np.fromiter((type(v) is str and len(v) == 19 for v in values), dtype=bool, count=len(values))
+    candidates = np.where(shaped, values, None)
+    parsed = pd.to_datetime(pd.Series(candidates, dtype=object), format=_ISO_FORMAT, errors='coerce')
+    canonical = shaped & parsed.notna().to_numpy()
+    positions = np.flatnonzero(present & ~canonical)
+
+    def to_iso(value):
+        parsed = schema.to_datetime(value)
+        return parsed.isoformat() if parsed else None
+
+    _coerce_cells(values, positions, to_iso, 'at', bad)
+    return values
+
+
+def clean_reviews_frame(reviews: Iterable[Dict[str, Any]], bad: Dict[str, int] = None,
+                        mapper: schema.ColumnMapper = None):
+    """Vectorized :func:`transform.iter_clean_apps_reviews`; returns a frame
+    with :data:`REVIEW_COLUMNS`.
+
+    Drift is resolved by :class:`schema.ColumnMapper` while the raw dicts are
+    read; filtering, defaults and coercion then run per column.
+    """
+    mapper = mapper or schema.ColumnMapper('reviews')
+    raw = dict(zip(mapper.columns, _columns(len(mapper.columns), list(mapper.iter_project(reviews)))))
+    keep = raw['app_id'].astype(bool) & (raw['content'] != None)  # noqa: E711
+    raw = {name: values[keep] for name, values in raw.items()}
+
+    user_name = raw['userName']
+    user_name[~user_name.astype(bool)] = 'Anonymous'
+    return _object_frame(REVIEW_COLUMNS, [
+        raw['reviewId'],
+        raw['app_id'],
+        raw['app_name'],
+        user_name,
+        raw['content'],
+        _clean_scores(raw['score'], bad),
+        _clean_thumbs(raw['thumbsUpCount'], bad),
+        raw['reviewCreatedVersion'],
+        _clean_timestamps(raw['at'], bad),
+        raw['replyContent'],
+        raw['repliedAt'],
+    ])
+
+
+def clean_apps_reviews_frame(reviews: Iterable[Dict[str, Any]]):
+    """:func:`clean_reviews_frame` with the reporting of
+    :func:`transform.clean_apps_reviews`."""
+    print("Cleaning apps reviews (pandas engine)...")
+    bad: Dict[str, int] = {}
+    mapper = schema.ColumnMapper('reviews')
+    df = clean_reviews_frame(reviews, bad, mapper)
+    counts = mapper.alias_counts()
+    if counts:
+        print(f"Schema drift in reviews: {schema.format_alias_counts(counts)}")
+    if bad:
+        print(f"Coerced {sum(bad.values())} bad review values to null ({schema.format_bad_values(bad)})")
+    print(f"Cleaned {len(df)} review records")
+    return df
+
+
+def merge_reviews_frame(existing, new):
+    """Vectorized :func:`utils.merge_reviews`: one row per review_id, at the
+    position of its first occurrence, holding its last occurrence."""
+    pd = _pandas()
+    new = new[new['review_id'].to_numpy(dtype=object) != None]  # noqa: E711
+    combined = pd.concat([existing, new], ignore_index=True)
+    if combined.empty:
+        return combined
+    # factorize numbers ids in order of first appearance
+    codes, _ = pd.factorize(combined['review_id'], use_na_sentinel=False)
+    last = pd.Series(np.arange(len(codes))).groupby(codes, sort=True).max().to_numpy()
+    return combined.iloc[last].reset_index(drop=True)
+
+
+def review_aggregates_frame(df) -> Dict[str, Dict[str, Any]]:
+    """Vectorized ``transform.update_review_aggregates({}, reviews)``."""
+    pd = _pandas()
+    if df.empty:
+        return {}
+    codes, apps = pd.factorize(df['app_id'], use_na_sentinel=False)
+    n_apps = len(apps)
+
+    raw_scores = df['score'].to_numpy(dtype=object)
+    numeric = np.isin(_types(raw_scores), (int, float, bool))
+    scores = np.zeros(len(raw_scores), dtype=float)
+    scores[numeric] = raw_scores[numeric].astype(float)
+    valid = numeric & (scores >= 1) & (scores < 6)
+    stars = scores[valid].astype(np.int64)
+    integral = bool((_types(raw_scores[valid]) != float).all())
+
+    totals = np.bincount(codes, minlength=n_apps)
+    star_counts = np.bincount(codes[valid] * 5 + (stars - 1), minlength=n_apps * 5).reshape(n_apps, 5)
+    score_sums = np.bincount(codes[valid], weights=scores[valid], minlength=n_apps)
+    thumbs = df['thumbs_up_count'].to_numpy(dtype=object)
+    try:
+        thumbs = thumbs.astype(np.int64)
+    except (TypeError, ValueError, OverflowError):
+        pass  # summed as Python objects
+    thumbs = pd.Series(thumbs).groupby(codes, sort=True).sum().tolist()
+    replies = np.bincount(codes, weights=df['reply_content'].to_numpy(dtype=object).astype(bool),
+                          minlength=n_apps)
+
+    aggregates = {}
+    for i, app_id in enumerate(list(apps)):
+        aggregates[app_id] = {
+            'total_reviews': int(totals[i]),
+            'avg_score': 0,
+            'score_sum': int(score_sums[i]) if integral else float(score_sums[i]),
+            'total_thumbs_up': thumbs[i],
+            '5_star': int(star_counts[i, 4]),
+            '4_star': int(star_counts[i, 3]),
+            '3_star': int(star_counts[i, 2]),
+            '2_star': int(star_counts[i, 1]),
+            '1_star': int(star_counts[i, 0]),
+            'reviews_with_reply': int(replies[i])
+        }
+    return aggregates
+
+
+def transform_for_analytics_frame(apps: List[Dict[str, Any]], df) -> List[Dict[str, Any]]:
+    """Vectorized :func:`transform.transform_for_analytics`."""
+    print("Transforming data for analytics (pandas engine)...")
+    analytics_ready = analytics_from_aggregates(apps, review_aggregates_frame(df))
+    print(f"Created {len(analytics_ready)} analytics-ready records")
+    return analytics_ready
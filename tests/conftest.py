@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# src modules import each other by name, also when a test imports them as
+# src.<module>
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
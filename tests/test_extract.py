@@ -0,0 +1,151 @@
+import json
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import extract_data
+
+
+class StubScraper:
+    """Stands in for google_play_scraper: N_APPS apps with N_REVIEWS reviews
+    each, served newest first in pages; the first request for every page
+    fails once (``flaky``).  ``crash_after`` pages it fails for good."""
+
+    class Sort:
+        NEWEST = 2
+
+    N_APPS = 5
+    N_REVIEWS = 7
+
+    def __init__(self, flaky=True):
+        self.flaky = flaky
+        self.calls = 0
+        self.crash_after = None
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def _maybe_fail(self, key):
+        with self.lock:
+            self.calls += 1
+            if self.crash_after is not None and self.calls > self.crash_after:
+                raise RuntimeError("scraper crashed")
+            if self.flaky and key not in self.failed:
+                self.failed.add(key)
+                raise ConnectionError(f"transient failure for {key}")
+
+    def search(self, query, lang, country, n_hits):
+        return [{'appId': f'app{i}'} for i in range(min(n_hits, self.N_APPS))]
+
+    def app(self, app_id, lang, country):
+        self._maybe_fail(('app', app_id))
+        return {'appId': app_id, 'title': app_id.upper()}
+
+    def reviews(self, app_id, lang, country, sort, count, continuation_token=None):
+        start = continuation_token or 0
+        self._maybe_fail(('reviews', app_id, start))
+        end = min(start + count, self.N_REVIEWS)
+        # review N_REVIEWS - 1 is the newest
+        page = [{'reviewId': f'{app_id}-{i}', 'content': 'ok', 'score': 5,
+                 'at': datetime(2024, 1, 1) + timedelta(hours=i)}
+                for i in range(self.N_REVIEWS - 1 - start, self.N_REVIEWS - 1 - end, -1)]
+        return page, (end if end < self.N_REVIEWS else None)
+
+
+def test_concurrent_extractor_retries_and_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_data, 'RAW_DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(extract_data, 'BACKOFF_SECONDS', 0)
+    monkeypatch.setattr(extract_data, 'REVIEWS_PER_APP', 3)
+    stub = StubScraper()
+    limiter = extract_data.TokenBucket(rate=1e6, capacity=100)
+
+    apps = extract_data.extract_apps_metadata(client=stub, limiter=limiter)
+    assert [a['appId'] for a in apps] == [f'app{i}' for i in range(5)]
+
+    total = extract_data.extract_apps_reviews(apps, client=stub, limiter=limiter)
+    lines = [json.loads(line) for line in (tmp_path / "apps_reviews.json").read_text(encoding='utf-8').splitlines()]
+    assert total == len(lines) == 5 * 7
+    assert {r['reviewId'] for r in lines} == {f'app{a}-{i}' for a in range(5) for i in range(7)}
+    assert all(r['app_name'] == r['app_id'].upper() for r in lines)
+    # reviews of one app keep their page order
+    assert [r['reviewId'] for r in lines if r['app_id'] == 'app0'] == [f'app0-{i}' for i in range(6, -1, -1)]
+    state = extract_data.load_extract_state()
+    assert state['app0'] == {'newest_id': 'app0-6', 'newest_at': '2024-01-01T06:00:00'}
+
+
+def test_token_bucket_waits_for_refill():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = extract_data.TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+    # a burst of 2, then one request every 1/rate seconds
+    assert waits == [0.5, 0.5]
+
+
+def test_extractor_resumes_and_fetches_only_new_reviews(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_data, 'RAW_DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(extract_data, 'REVIEWS_PER_APP', 2)
+    monkeypatch.setattr(extract_data, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(extract_data, 'CONCURRENCY', 1)
+    limiter = extract_data.TokenBucket(rate=1e6, capacity=100)
+    apps = [{'appId': 'app0', 'title': 'A'}]
+    reviews_file = tmp_path / "apps_reviews.json"
+
+    def ids():
+        return [json.loads(line)['reviewId'] for line in reviews_file.read_text(encoding='utf-8').splitlines()]
+
+    # the scraper dies after two pages: the token of page 2 is checkpointed
+    stub = StubScraper(flaky=False)
+    stub.crash_after = 2
+    assert extract_data.extract_apps_reviews(apps, client=stub, limiter=limiter) == 4
+    assert extract_data.load_extract_state()['app0']['pending']['token'] == 4
+
+    # the next run resumes at page 3 instead of starting over
+    stub = StubScraper(flaky=False)
+    assert extract_data.extract_apps_reviews(apps, client=stub, limiter=limiter) == 3
+    assert stub.calls == 2
+    assert ids() == [f'app0-{i}' for i in range(6, -1, -1)]
+
+    # two new reviews: paging stops at the newest review already extracted
+    stub = StubScraper(flaky=False)
+    stub.N_REVIEWS = 9
+    assert extract_data.extract_apps_reviews(apps, client=stub, limiter=limiter) == 2
+    assert stub.calls == 2
+    assert ids()[-2:] == ['app0-8', 'app0-7']
+    assert extract_data.load_extract_state()['app0'] == {'newest_id': 'app0-8',
+                                                         'newest_at': '2024-01-01T08:00:00'}
+
+
+def test_review_writer_rotates_compressed_shards_for_parallel_ingest(tmp_path, monkeypatch):
+    import config
+    import ingest
+    monkeypatch.setattr(config, 'RAW_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'APPS_REVIEWS_RAW', str(tmp_path / "apps_reviews.json"))
+    flushes = []
+    writer = extract_data.ReviewWriter(str(tmp_path), on_flush=lambda: flushes.append(writer.written),
+                                       batch_records=4, compression='gzip', max_shard_bytes=1)
+    for page in range(3):
+        writer.write([{'reviewId': f'r{page}-{i}', 'app_id': 'a1', 'content': 'ok',
+                       'at': datetime(2024, 1, 1, page)} for i in range(4)], 'a1')
+    writer.close()
+    shards = extract_data.review_shards(str(tmp_path))
+    # one batch per shard; a new writer continues after the last shard
+    assert [Path(p).name for p in shards] == [f'apps_reviews-0000{i}.json.gz' for i in range(3)]
+    assert flushes[:3] == [4, 8, 12]
+    by_app = extract_data.ReviewWriter(str(tmp_path), by_app=True)
+    by_app.write([{'reviewId': 'x', 'app_id': 'a2', 'content': 'ok'}], 'a2')
+    by_app.close()
+    assert Path(extract_data.review_shards(str(tmp_path))[-1]).name == 'apps_reviews-a2-00003.json'
+
+    reviews = ingest.ingest_apps_reviews(workers=2)
+    assert [r['reviewId'] for r in reviews] == [f'r{p}-{i}' for p in range(3) for i in range(4)] + ['x']
+    assert reviews[0]['at'] == '2024-01-01T00:00:00'
+    assert sum(1 for _ in ingest.iter_apps_reviews()) == 13
@@ -0,0 +1,137 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import config
+import ingest
+
+
+def test_detect_json_format(tmp_path):
+    cases = {
+        'array.json': '[\n  {"a": 1}\n]',
+        'lines.json': '{"a": 1}\n{"a": 2}\n',
+        'object.json': '{\n  "a": 1\n}',
+        'empty.json': '  \n',
+    }
+    for name, text in cases.items():
+        (tmp_path / name).write_text(text, encoding='utf-8')
+    assert ingest.detect_json_format(str(tmp_path / 'array.json')) == 'array'
+    assert ingest.detect_json_format(str(tmp_path / 'lines.json')) == 'jsonl'
+    assert ingest.detect_json_format(str(tmp_path / 'object.json')) == 'object'
+    assert ingest.detect_json_format(str(tmp_path / 'empty.json')) == 'empty'
+    assert ingest.load_json_file(str(tmp_path / 'object.json')) == [{'a': 1}]
+
+
+def test_jsonl_byte_ranges_parallel(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "reviews.json"
+    lines = [json.dumps({'reviewId': f'r{i}', 'content': 'x' * (i % 17)}) for i in range(300)]
+    lines[120] = '{"reviewId": broken'
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    monkeypatch.setattr(config, 'JSONL_MIN_CHUNK_BYTES', 512)
+
+    ranges = ingest._split_byte_ranges(str(path), 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    data = path.read_bytes()
+    assert all(data[start - 1:start] == b"\n" for start, _ in ranges[1:])
+
+    serial = ingest.load_jsonl_file(str(path), workers=1)
+    parallel = ingest.load_jsonl_file(str(path), workers=4)
+    assert parallel == serial
+    assert len(parallel) == 299
+    assert [r['reviewId'] for r in parallel[119:121]] == ['r119', 'r121']
+    assert capsys.readouterr().out.count("Skipping invalid JSON line") == 2
+
+
+def test_mmap_readers_project_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'MMAP_BLOCK_BYTES', 64)
+    jsonl = tmp_path / "reviews.json"
+    rows = [{'reviewId': f'r{i}', 'userImage': 'u' * i, 'score': i % 5} for i in range(50)]
+    jsonl.write_text("\n".join(json.dumps(r) for r in rows) + "\n", encoding='utf-8')
+    fields = frozenset({'reviewId', 'score'})
+
+    assert ingest.load_jsonl_file(str(jsonl)) == rows
+    assert ingest.load_jsonl_file(str(jsonl), fields=fields) == [
+        {'reviewId': r['reviewId'], 'score': r['score']} for r in rows]
+
+    csv_path = tmp_path / "extra.csv"
+    csv_path.write_text('reviewId,content,score\nc1,"multi\nline, text",5\nc2,,3\n', encoding='utf-8')
+    assert ingest.load_csv_file(str(csv_path)) == [
+        {'reviewId': 'c1', 'content': 'multi\nline, text', 'score': 5},
+        {'reviewId': 'c2', 'content': None, 'score': 3},
+    ]
+    assert ingest.load_csv_file(str(csv_path), fields=fields) == [
+        {'reviewId': 'c1', 'score': 5}, {'reviewId': 'c2', 'score': 3}]
+
+
+def test_csv_schema_converters_count_bad_values(tmp_path, capsys):
+    path = tmp_path / "note_taking_batch.csv"
+    path.write_text(
+        "reviewId,app_id,rating,comments,thumbs_up_count,at\n"
+        "r1,a1,4,1234,2,2022-01-01T00:00:00Z\n"
+        "r2,a1,4.0, NULL ,x,2022-01-02\n"
+        "r3,a1,great,ok,,not a date\n", encoding='utf-8')
+
+    bad = {}
+    rows = ingest.load_csv_file(str(path), schema_name='reviews', bad=bad)
+    # text columns stay text even when they look numeric
+    assert rows[0]['comments'] == '1234' and rows[0]['rating'] == 4
+    assert rows[1]['rating'] == 4 and rows[1]['comments'] is None
+    assert rows[2]['rating'] is None
+    assert bad == {'rating': 1, 'thumbs_up_count': 1}
+
+    records = ingest.read_sources([(str(path), 0)], schema_name='reviews')
+    assert records == rows
+    assert "2 bad values set to null (rating=1, thumbs_up_count=1)" in capsys.readouterr().out
+
+    import transform
+    cleaned = transform.clean_apps_reviews(records)
+    assert [r['score'] for r in cleaned] == [4, None]
+    assert [r['thumbs_up_count'] for r in cleaned] == [2, 0]
+    assert "(at=1)" in capsys.readouterr().out
+
+
+def test_read_sources_interns_categorical_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'JSONL_MIN_CHUNK_BYTES', 256)
+    path = tmp_path / "reviews.json"
+    path.write_text("".join(json.dumps({'reviewId': f'r{i}', 'appId': f'app{i % 3}', 'content': f'c{i}',
+                                        'reviewCreatedVersion': '1.0'}) + "\n" for i in range(60)),
+                    encoding='utf-8')
+    csv_path = tmp_path / "note_taking.csv"
+    csv_path.write_text("reviewId,app_id,content\nx1,app1,text\n", encoding='utf-8')
+    sources = [(str(path), 0), (str(csv_path), 0)]
+
+    records = ingest.read_sources(sources, workers=1, schema_name='reviews')
+    assert len(records) == 61
+    # read serially, values share one object per distinct value across files,
+    # aliases (appId) included; other columns are untouched
+    assert len({id(r.get('appId') or r.get('app_id')) for r in records}) == 3
+    assert records[-1]['app_id'] is records[1]['appId']
+    assert len({id(r['content']) for r in records}) == 61
+
+    # workers intern their own units, which stay shared after pickling
+    parallel = ingest.read_sources(sources, workers=3, schema_name='reviews')
+    assert parallel == records
+    assert len({id(r['appId']) for r in parallel[:60]}) <= 3 * 3
+
+    monkeypatch.setattr(config, 'INTERN_CATEGORICALS', False)
+    plain = ingest.read_sources([(str(path), 0)], workers=3, schema_name='reviews')
+    assert plain == records[:60]
+    assert len({id(r['appId']) for r in plain}) > 9
+
+
+def test_iter_apps_reviews_interns_categorical_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'RAW_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'APPS_REVIEWS_RAW', str(tmp_path / "apps_reviews.json"))
+    (tmp_path / "apps_reviews.json").write_text(
+        "".join(json.dumps({'reviewId': f'r{i}', 'app_id': f'app{i % 2}', 'userName': f'u{i % 2}'}) + "\n"
+                for i in range(8)), encoding='utf-8')
+
+    records = list(ingest.iter_apps_reviews())
+    # shared across the whole stream; user names are not interned
+    assert records[0]['app_id'] is records[6]['app_id']
+    assert records[0]['userName'] is not records[2]['userName']
@@ -0,0 +1,79 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import config
+import load
+
+
+def test_ndjson_roundtrip_and_offsets(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'PROCESSED_FORMAT', 'ndjson')
+    path = str(tmp_path / "table.json")
+    rows = [{'review_id': str(i), 'content': 'héllo' * i} for i in range(5)]
+
+    assert load.save_json_stream(iter(rows), path, batch_size=2) == 5
+    lines = (tmp_path / "table.json").read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == rows
+
+    offsets = list(load.iter_ndjson_offsets(path))
+    assert [row for _, row in offsets] == rows
+    # resume reading from the offset of the fourth row
+    assert list(load.iter_table(path, offset=offsets[3][0])) == rows[3:]
+
+    size = (tmp_path / "table.json").stat().st_size
+    load.save_ndjson([{'review_id': '5'}], path, append=True)
+    assert list(load.iter_ndjson(path, offset=size)) == [{'review_id': '5'}]
+
+
+def test_iter_table_reads_both_layouts(tmp_path, monkeypatch):
+    rows = [{'a': 1}, {'a': 2}]
+    array_path = str(tmp_path / "array.json")
+    monkeypatch.setattr(config, 'PROCESSED_FORMAT', 'json')
+    load.save_json(rows, array_path)
+    assert list(load.iter_table(array_path)) == rows
+    with pytest.raises(ValueError):
+        list(load.iter_table(array_path, offset=3))
+
+    ndjson_path = str(tmp_path / "lines.json")
+    monkeypatch.setattr(config, 'PROCESSED_FORMAT', 'ndjson')
+    load.save_json(rows, ndjson_path)
+    assert load.is_ndjson(ndjson_path)
+    assert list(load.iter_table(ndjson_path)) == rows
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_columnar_backend_roundtrip(tmp_path, monkeypatch, fmt):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(config, 'PROCESSED_FORMAT', fmt)
+    monkeypatch.setattr(config, 'STREAM_BATCH_SIZE', 2)
+    path = str(tmp_path / "fact_reviews.json")
+    rows = [{'review_id': f'r{i}', 'app_key': 1, 'developer_key': 1, 'date_key': i,
+             'rating': 5, 'thumbs_up_count': 0, 'review_text': 'ok',
+             'review_version': [None, '1.0', '2.0'][i % 3]} for i in range(5)]
+
+    assert load.save_table(iter(rows), path) == 5
+    assert (tmp_path / f"fact_reviews.{fmt}").exists()
+    assert not (tmp_path / "fact_reviews.json").exists()
+    assert load.load_table(path) == rows
+    assert list(load.iter_table(path, columns=['review_id'])) == [{'review_id': r['review_id']} for r in rows]
+    # low-cardinality columns are stored as codes plus one dictionary across batches
+    _, _, iter_batches = load.COLUMNAR_BACKENDS[fmt]
+    versions = [b.column('review_version') for b in iter_batches(load.table_path(path))]
+    assert str(versions[0].type) == 'dictionary<values=string, indices=int32, ordered=0>'
+    assert versions[-1].dictionary.to_pylist() == ['1.0', '2.0']
+
+
+def test_columnar_backend_infers_mixed_columns(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(config, 'PROCESSED_FORMAT', 'parquet')
+    path = str(tmp_path / "apps_with_metrics.json")
+    rows = [{'app_id': 'a1', 'installs': '1,000+', 'review_metrics': {'total_reviews': 2}},
+            {'app_id': 'a2', 'installs': 5, 'review_metrics': {'total_reviews': 1}}]
+    load.save_table(rows, path)
+    loaded = load.load_table(path)
+    assert [r['installs'] for r in loaded] == ['1,000+', '5']
+    assert loaded[1]['review_metrics'] == {'total_reviews': 1}
@@ -42,6 +42,8 @@ def test_pipeline_incremental(tmp_path):
     config.DIM_DEVELOPERS = str(proc_dir / "dim_developers.json")
     config.DIM_DATE = str(proc_dir / "dim_date.json")
     config.FACT_REVIEWS = str(proc_dir / "fact_reviews.json")
+    config.PROFILE_DIR = str(proc_dir / "profiles")
+    config.RUN_REPORT_DIR = str(proc_dir / "runs")
 
     # first run should succeed and create output
     assert pipeline.run_pipeline()
@@ -107,3 +109,291 @@ def test_ingest_csv_and_clean_transform(tmp_path):
     assert cleaned_apps[0]['rating'] == 4.5
     assert cleaned_reviews[0]['score'] == 3
     assert cleaned_reviews[0]['content'] == 'Great!'
+
+
+def _use_tmp_dirs(raw_dir, proc_dir):
+    config.RAW_DATA_DIR = str(raw_dir)
+    config.PROCESSED_DATA_DIR = str(proc_dir)
+    config.APPS_METADATA_RAW = str(raw_dir / "apps_metadata.json")
+    config.APPS_REVIEWS_RAW = str(raw_dir / "apps_reviews.json")
+    config.APPS_METADATA_PROCESSED = str(proc_dir / "apps_metadata_clean.json")
+    config.APPS_METADATA_SCD2 = str(proc_dir / "apps_metadata_scd2.json")
+    config.APPS_REVIEWS_PROCESSED = str(proc_dir / "apps_reviews_clean.json")
+    config.APPS_WITH_METRICS = str(proc_dir / "apps_with_metrics.json")
+    config.DIM_APPS = str(proc_dir / "dim_apps.json")
+    config.DIM_CATEGORIES = str(proc_dir / "dim_categories.json")
+    config.DIM_DEVELOPERS = str(proc_dir / "dim_developers.json")
+    config.DIM_DATE = str(proc_dir / "dim_date.json")
+    config.FACT_REVIEWS = str(proc_dir / "fact_reviews.json")
+    config.RUN_MANIFEST = str(proc_dir / "run_manifest.json")
+    config.STAR_STATE = str(proc_dir / "star_state.json")
+    config.REVIEW_INDEX = str(proc_dir / "review_index")
+    config.PROFILE_DIR = str(proc_dir / "profiles")
+    config.RUN_REPORT_DIR = str(proc_dir / "runs")
+
+
+def _read_output(proc_dir, name):
+    """A processed table's text; dim_apps validity ranges are run timestamps,
+    so they are dropped for comparisons across runs."""
+    text = (proc_dir / name).read_text(encoding='utf-8')
+    if name != "dim_apps.json":
+        return text
+    return [{k: v for k, v in row.items() if k not in ('valid_from', 'valid_to')}
+            for row in json.loads(text)]
+
+
+def test_pipeline_streaming_matches_batch(tmp_path, monkeypatch):
+    import tracemalloc
+
+    def no_tracing():
+        raise AssertionError("streaming runs trace memory only when asked to")
+    monkeypatch.setattr(tracemalloc, 'start', no_tracing)
+    apps = [{'appId': 'a1', 'title': 'App1', 'genre': 'Tools'},
+            {'appId': 'a2', 'title': 'App2', 'genre': 'Productivity'}]
+    first = [{'reviewId': f'r{i}', 'app_id': f'a{i % 2 + 1}', 'content': 'ok',
+              'score': i % 5 + 1, 'at': f'2024-01-{i % 9 + 1:02d}T10:00:00'} for i in range(20)]
+    second = [{'reviewId': f'r{i}', 'app_id': 'a1', 'content': 'edited', 'score': 1,
+               'at': '2024-02-01T10:00:00'} for i in range(15, 25)]
+
+    outputs = {}
+    for mode in ('batch', 'streaming'):
+        raw_dir = tmp_path / mode / "raw"
+        proc_dir = tmp_path / mode / "processed"
+        raw_dir.mkdir(parents=True)
+        proc_dir.mkdir(parents=True)
+        _use_tmp_dirs(raw_dir, proc_dir)
+        (raw_dir / "apps_metadata.json").write_text(json.dumps(apps), encoding='utf-8')
+        for batch in (first, second):
+            # reviews are written as JSONL like the extractor does
+            (raw_dir / "apps_reviews.json").write_text(
+                "\n".join(json.dumps(r) for r in batch), encoding='utf-8')
+            assert pipeline.run_pipeline(streaming=(mode == 'streaming'))
+        outputs[mode] = {name: _read_output(proc_dir, name)
+                         for name in ("apps_reviews_clean.json", "fact_reviews.json",
+                                      "dim_apps.json", "dim_date.json")}
+
+    assert outputs['batch'] == outputs['streaming']
+    merged = json.loads(outputs['streaming']["apps_reviews_clean.json"])
+    assert len(merged) == 25
+    assert merged[15]['content'] == 'edited'
+
+
+def test_pipeline_incremental_manifest(tmp_path, capsys):
+    apps = [{'appId': 'a1', 'title': 'App1'}, {'appId': 'a2', 'title': 'App2'}]
+    lines = [json.dumps({'reviewId': f'r{i}', 'app_id': f'a{i % 2 + 1}', 'content': 'ok',
+                         'score': 4, 'at': f'2024-03-{i + 1:02d}T08:00:00'}) for i in range(12)]
+    # sorts last as text, but is 04:00 UTC: the watermark compares UTC times
+    lines[10] = lines[10].replace('2024-03-11T08:00:00', '2024-03-12T09:00:00+05:00')
+
+    def write_raw(raw_dir, n_lines):
+        (raw_dir / "apps_metadata.json").write_text(json.dumps(apps), encoding='utf-8')
+        (raw_dir / "apps_reviews.json").write_text(
+            "".join(line + "\n" for line in lines[:n_lines]), encoding='utf-8')
+
+    # reference: one batch run over the final raw data
+    ref_raw, ref_proc = tmp_path / "ref" / "raw", tmp_path / "ref" / "processed"
+    ref_raw.mkdir(parents=True)
+    ref_proc.mkdir(parents=True)
+    _use_tmp_dirs(ref_raw, ref_proc)
+    write_raw(ref_raw, 12)
+    assert pipeline.run_pipeline()
+
+    raw_dir, proc_dir = tmp_path / "inc" / "raw", tmp_path / "inc" / "processed"
+    raw_dir.mkdir(parents=True)
+    proc_dir.mkdir(parents=True)
+    _use_tmp_dirs(raw_dir, proc_dir)
+    write_raw(raw_dir, 8)
+    assert pipeline.run_pipeline(incremental=True)
+    manifest = json.loads((proc_dir / "run_manifest.json").read_text(encoding='utf-8'))
+    assert manifest['sources']['apps_reviews.json']['size'] == (raw_dir / "apps_reviews.json").stat().st_size
+    assert manifest['max_review_at'] == '2024-03-08T08:00:00.000000'
+
+    # the extractor appends: only the new tail is read and appended
+    with open(raw_dir / "apps_reviews.json", 'a', encoding='utf-8') as f:
+        f.write("".join(line + "\n" for line in lines[8:]))
+    from manifest import plan_sources
+    (_, status, offset, _), = plan_sources([str(raw_dir / "apps_reviews.json")], manifest)
+    assert status == 'appended' and offset == manifest['sources']['apps_reviews.json']['size']
+    capsys.readouterr()
+    assert pipeline.run_pipeline(incremental=True)
+    out = capsys.readouterr().out
+    assert "Extending analytics and star schema with 4 new reviews" in out
+    assert "Review index: 0 hits, 4 misses" in out
+    # the delta profile is merged into the previous one, so the saved
+    # profile still covers the whole table
+    from profiling import load_latest_profile
+    assert load_latest_profile('reviews').rows == 12
+
+    for name in ("apps_reviews_clean.json", "fact_reviews.json", "dim_date.json", "dim_apps.json"):
+        assert _read_output(proc_dir, name) == _read_output(ref_proc, name)
+    metrics = json.loads((proc_dir / "apps_with_metrics.json").read_text(encoding='utf-8'))
+    ref_metrics = json.loads((ref_proc / "apps_with_metrics.json").read_text(encoding='utf-8'))
+    assert [m['review_metrics'] for m in metrics] == [m['review_metrics'] for m in ref_metrics]
+    manifest = json.loads((proc_dir / "run_manifest.json").read_text(encoding='utf-8'))
+    assert manifest['max_review_at'] == '2024-03-12T08:00:00.000000'
+    assert manifest['review_count'] == 12
+
+    # nothing changed: outputs are left alone
+    fact_mtime = (proc_dir / "fact_reviews.json").stat().st_mtime_ns
+    assert pipeline.run_pipeline(incremental=True)
+    assert (proc_dir / "fact_reviews.json").stat().st_mtime_ns == fact_mtime
+
+
+def test_parallel_ingest_matches_serial(tmp_path):
+    raw_dir = tmp_path / "DATA" / "raw"
+    raw_dir.mkdir(parents=True)
+    config.RAW_DATA_DIR = str(raw_dir)
+    config.APPS_REVIEWS_RAW = str(raw_dir / "apps_reviews.json")
+    with open(raw_dir / "apps_reviews.json", 'w', encoding='utf-8') as f:
+        for i in range(5):
+            f.write(json.dumps({'reviewId': f'j{i}', 'app_id': 'a1', 'content': 'x'}) + "\n")
+    for n in range(3):
+        with open(raw_dir / f"note_taking_batch_{n}.csv", 'w', encoding='utf-8') as f:
+            f.write("reviewId,app_id,rating,comments\n")
+            f.write(f"c{n},a1,{n + 1},text\n")
+    (raw_dir / "note_taking_broken.csv").write_bytes(b"reviewId\n\xff\xfe\n")
+
+    from ingest import ingest_apps_reviews
+    serial = ingest_apps_reviews(workers=1)
+    parallel = ingest_apps_reviews(workers=3)
+    assert parallel == serial
+    assert [r['reviewId'] for r in parallel] == ['j0', 'j1', 'j2', 'j3', 'j4', 'c0', 'c1', 'c2']
+
+
+@pytest.mark.parametrize("engine", ["pandas", "duckdb"])
+def test_engine_matches_python(tmp_path, engine):
+    pytest.importorskip(engine)
+    apps = [{'appId': 'a1', 'title': 'App1', 'genre': 'Tools'},
+            {'appId': 'a2', 'title': 'App2', 'genre': 'Productivity'}]
+    first = [{'reviewId': f'r{i}', 'app_id': f'a{i % 2 + 1}', 'content': 'ok',
+              'score': [i % 5 + 1, '4', 'bad', None][i % 4], 'thumbsUpCount': i % 3,
+              'replyContent': 'thanks' if i % 3 == 0 else None,
+              'at': f'2024-01-{i % 9 + 1:02d}T10:00:00' + ('Z' if i % 5 == 0 else '')}
+             for i in range(20)]
+    second = [{'review_id': f'r{i}', 'appId': 'a1', 'comments': 'edited', 'rating': 1,
+               'date': '2024-02-01 10:00:00'} for i in range(15, 25)]
+
+    outputs = {}
+    for name in ('python', engine):
+        raw_dir = tmp_path / name / "raw"
+        proc_dir = tmp_path / name / "processed"
+        raw_dir.mkdir(parents=True)
+        proc_dir.mkdir(parents=True)
+        _use_tmp_dirs(raw_dir, proc_dir)
+        (raw_dir / "apps_metadata.json").write_text(json.dumps(apps), encoding='utf-8')
+        for batch in (first, second):
+            (raw_dir / "apps_reviews.json").write_text(json.dumps(batch), encoding='utf-8')
+            assert pipeline.run_pipeline(engine=name)
+        outputs[name] = {table: _read_output(proc_dir, table)
+                         for table in ("apps_reviews_clean.json", "fact_reviews.json", "dim_date.json",
+                                       "dim_apps.json", "dim_categories.json", "dim_developers.json")}
+        # SCD2 dates differ between runs; compare everything else
+        outputs[name]['metrics'] = [
+            (m['app_id'], m['review_metrics'])
+            for m in json.loads((proc_dir / "apps_with_metrics.json").read_text(encoding='utf-8'))]
+        outputs[name]['history'] = [
+            {k: v for k, v in row.items() if k not in ('start_date', 'end_date')}
+            for row in json.loads((proc_dir / "apps_metadata_scd2.json").read_text(encoding='utf-8'))]
+
+    assert outputs[engine] == outputs['python']
+    assert sum(m['total_reviews'] for _, m in outputs[engine]['metrics']) == 25
+
+
+def test_pipeline_run_report(tmp_path):
+    raw_dir, proc_dir = tmp_path / "raw", tmp_path / "processed"
+    raw_dir.mkdir(parents=True)
+    proc_dir.mkdir(parents=True)
+    _use_tmp_dirs(raw_dir, proc_dir)
+    (raw_dir / "apps_metadata.json").write_text(json.dumps([{'appId': 'a1', 'title': 'App1'}]),
+                                                encoding='utf-8')
+    (raw_dir / "apps_reviews.json").write_text(
+        "\n".join(json.dumps({'reviewId': f'r{i}', 'app_id': 'a1', 'content': 'ok', 'score': 6 if i == 0 else 4})
+                  for i in range(5)), encoding='utf-8')
+
+    assert pipeline.run_pipeline(cprofile=True, trace_memory=True)
+    (path,) = (proc_dir / "runs").glob("run-*.json")
+    report = json.loads(path.read_text(encoding='utf-8'))
+    assert report['status'] == 'succeeded'
+    assert report['mode'] == 'batch'
+    assert report['summary']['reviews_merged'] == 5
+    assert report['quality']['reviews']['counts']['score_out_of_range'] == 1
+
+    stages = {s['name']: s for s in report['stages']}
+    for name in ('ingest_apps', 'ingest_reviews', 'clean_apps', 'clean_reviews', 'quality_apps',
+                 'scd2', 'merge', 'analytics', 'star_schema', 'save:apps_reviews_clean'):
+        assert name in stages, name
+    clean = stages['clean_reviews']
+    assert (clean['rows_in'], clean['rows_out']) == (5, 5)
+    assert clean['wall_seconds'] > 0 and clean['peak_traced_bytes'] > 0
+    # memory is measured per stage, not as the process-lifetime peak
+    assert 'max_rss_bytes' not in clean and clean['rss_growth_bytes'] is not None
+    if clean['peak_rss_bytes'] is not None:
+        # a stage's own peak, bounded by the run's
+        assert 0 < clean['peak_rss_bytes'] <= report['max_rss_bytes']
+    assert report['max_rss_bytes'] > 0
+    assert stages['save:fact_reviews']['rows_out'] == 5
+    assert os.path.exists(clean['cprofile_path'])
+    assert clean['top_functions']
+
+
+def test_engines_are_rejected_outside_batch_runs():
+    with pytest.raises(ValueError, match="only runs in batch mode"):
+        pipeline.run_pipeline(streaming=True, engine='duckdb')
+    with pytest.raises(ValueError, match="incremental"):
+        pipeline.run_pipeline(incremental=True, engine='pandas')
+
+
+@pytest.mark.parametrize("mode", ["python", "duckdb", "streaming", "incremental"])
+def test_dim_apps_shows_current_untracked_values(tmp_path, mode):
+    if mode == 'duckdb':
+        pytest.importorskip("duckdb")
+    raw_dir, proc_dir = tmp_path / "raw", tmp_path / "processed"
+    raw_dir.mkdir(parents=True)
+    proc_dir.mkdir(parents=True)
+    _use_tmp_dirs(raw_dir, proc_dir)
+    (raw_dir / "apps_reviews.json").write_text(
+        json.dumps({'reviewId': 'r1', 'app_id': 'a1', 'content': 'ok', 'score': 5,
+                    'at': '2024-01-01T00:00:00'}) + "\n", encoding='utf-8')
+    kwargs = {'engine': 'duckdb'} if mode == 'duckdb' else {mode: True} if mode != 'python' else {}
+    for installs, score, ratings in (('500,000+', 4.51, 5747), ('1,000,000+', 4.6, 6100)):
+        (raw_dir / "apps_metadata.json").write_text(json.dumps(
+            [{'appId': 'a1', 'title': 'App1', 'installs': installs, 'score': score, 'ratings': ratings}]),
+            encoding='utf-8')
+        assert pipeline.run_pipeline(**kwargs)
+    if mode == 'incremental':
+        # unchanged apps: the dimension is rebuilt from the saved snapshot
+        with open(raw_dir / "apps_reviews.json", 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'reviewId': 'r2', 'app_id': 'a1', 'content': 'ok', 'score': 4}) + "\n")
+        assert pipeline.run_pipeline(**kwargs)
+
+    # only untracked columns changed: one version, with the latest values
+    (current,) = json.loads((proc_dir / "dim_apps.json").read_text(encoding='utf-8'))
+    assert (current['installs'], current['catalog_rating'], current['ratings_count']) == ('1,000,000+', 4.6, 6100)
+    (stored,) = json.loads((proc_dir / "apps_metadata_scd2.json").read_text(encoding='utf-8'))
+    assert stored['installs'] == '500,000+'
+
+
+@pytest.mark.parametrize("mode", ["python", "duckdb", "streaming", "incremental"])
+def test_review_profile_covers_the_stored_table(tmp_path, mode):
+    if mode == 'duckdb':
+        pytest.importorskip("duckdb")
+    raw_dir, proc_dir = tmp_path / "raw", tmp_path / "processed"
+    raw_dir.mkdir(parents=True)
+    proc_dir.mkdir(parents=True)
+    _use_tmp_dirs(raw_dir, proc_dir)
+    (raw_dir / "apps_metadata.json").write_text(json.dumps([{'appId': 'a1', 'title': 'App1'}]), encoding='utf-8')
+
+    def review(i, content='ok'):
+        return json.dumps({'reviewId': f'r{i}', 'app_id': 'a1', 'content': content, 'score': 4}) + "\n"
+
+    kwargs = {'engine': 'duckdb'} if mode == 'duckdb' else {mode: True} if mode != 'python' else {}
+    from profiling import load_latest_profile
+    # a repeated id, then an updated and a new review
+    (raw_dir / "apps_reviews.json").write_text("".join(review(i) for i in range(10)) + review(0),
+                                               encoding='utf-8')
+    assert pipeline.run_pipeline(**kwargs)
+    assert load_latest_profile('reviews').rows == 10
+    with open(raw_dir / "apps_reviews.json", 'a', encoding='utf-8') as f:
+        f.write(review(5, 'edited') + review(10))
+    assert pipeline.run_pipeline(**kwargs)
+    assert load_latest_profile('reviews').rows == 11
@@ -0,0 +1,67 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import config
+from profiling import (HyperLogLog, TDigest, TopK, TableProfile, compare_profiles,
+                       load_latest_profile, review_profile, save_profile)
+
+
+def test_sketches_estimate_distinct_quantiles_and_top_values():
+    hll = HyperLogLog()
+    hll.add_all(f"user{i}" for i in range(20000))
+    assert abs(hll.estimate() - 20000) / 20000 < 0.05
+
+    rng = random.Random(0)
+    values = [rng.random() * 100 for _ in range(20000)]
+    digest = TDigest()
+    digest.add_all(values)
+    assert abs(digest.quantile(0.5) - sorted(values)[10000]) < 2
+
+    top = TopK(capacity=8)
+    top.add_all(['a'] * 500 + ['b'] * 300 + [str(i) for i in range(200)])
+    assert [value for value, _ in top.top(2)] == ['a', 'b']
+
+
+def _reviews(n, offset=0, score=4):
+    return [{'review_id': f'r{offset + i}', 'app_id': f'app{i % 3}', 'user_name': None if i % 4 == 0 else f'u{i}',
+             'content': 'ok', 'score': score, 'thumbs_up_count': i, 'review_created_version': '1.0',
+             'at': f'2024-01-{1 + i % 28:02d}T00:00:00', 'reply_content': None} for i in range(n)]
+
+
+def test_profiles_merge_and_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'PROFILE_HISTORY', 2)
+    rows = _reviews(1000)
+
+    whole = review_profile().profile(rows)
+    part = review_profile().profile(rows[:400])
+    part.merge(review_profile().profile(rows[400:]))
+    assert part.stats()['review_id']['distinct'] == whole.stats()['review_id']['distinct']
+    assert part.stats()['user_name']['null_rate'] == whole.stats()['user_name']['null_rate'] == 0.25
+    assert part.stats()['at']['min'] == '2024-01-01T00:00:00'
+
+    for run_at in ('20240101T000000', '20240102T000000', '20240103T000000'):
+        save_profile(whole, run_at=run_at)
+    assert len(list(tmp_path.iterdir())) == 2
+    monkeypatch.setattr(config, 'PROFILE_HISTORY', 0)
+    save_profile(whole, run_at='20240104T000000')
+    assert len(list(tmp_path.iterdir())) == 3
+    loaded = load_latest_profile('reviews')
+    assert isinstance(loaded, TableProfile)
+    assert loaded.stats() == whole.stats()
+    assert load_latest_profile('apps') is None
+
+
+def test_compare_profiles_reports_drift():
+    before = review_profile().profile(_reviews(1000))
+    assert compare_profiles(before, review_profile().profile(_reviews(1000, offset=1000))) == []
+
+    drifted = _reviews(1000, score=1)
+    for row in drifted[:500]:
+        row['content'] = None
+    findings = compare_profiles(before, review_profile().profile(drifted))
+    assert "score: median 4 -> 1" in findings
+    assert any(f.startswith("content: null rate") for f in findings)
@@ -25,3 +25,26 @@ def test_check_reviews_range():
     issues = check_reviews(out)
     assert any('out of range' in msg for msg in issues)
     assert len(issues) == 2
+
+
+def test_review_report_counts_samples_and_rates():
+    from src.quality import QualityReport, REVIEW_RULES
+
+    rows = [{'review_id': f'r{i}', 'app_id': 'a1' if i % 10 else None,
+             'score': [3, 0, 'x', None][i % 4]} for i in range(1000)]
+    report = QualityReport('reviews', REVIEW_RULES, sample_size=3)
+    # fused into another pass: rows come out unchanged, checked in batches
+    assert list(report.observe(iter(rows), batch_size=64)) == rows
+
+    assert report.rows == 1000
+    assert report.counts == {'missing_ids': 100, 'score_not_integer': 250, 'score_out_of_range': 250}
+    assert report.samples['score_out_of_range'] == [(1, "score out of range (0)"), (5, "score out of range (0)"),
+                                                    (9, "score out of range (0)")]
+    assert report.issues()[:3] == ["Row 0: missing ids", "Row 1: score out of range (0)",
+                                   "Row 2: score not integer"]
+    assert len(report.issues()) == 9
+    rates = report.rates()
+    assert rates['kinds'] == {'null': 0.1, 'type': 0.25, 'range': 0.25}
+    assert rates['nulls'] == {'review_id': 0.0, 'app_id': 0.1, 'score': 0.25}
+    # the list API still reports every failing row
+    assert len(check_reviews(rows)) == 600
@@ -0,0 +1,45 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import config
+import load
+from records import ReviewRecord
+from transform import build_star_schema, clean_apps_reviews
+from utils import merge_reviews
+
+
+def test_compact_records_match_dict_rows(tmp_path, monkeypatch):
+    raw = [{'reviewId': f'r{i}', 'app_id': f'a{i % 2}', 'content': 'ok', 'score': str(i % 5 + 1),
+            'at': f'2024-01-0{i % 9 + 1}T10:00:00'} for i in range(10)]
+    apps = [{'app_id': 'a0', 'title': 'A0', 'category': 'Tools'},
+            {'app_id': 'a1', 'title': 'A1', 'developer': 'dev'}]
+    rows = clean_apps_reviews(raw)
+    records = clean_apps_reviews(raw, compact=True)
+    assert all(isinstance(r, ReviewRecord) for r in records)
+    assert records == rows and [dict(r) for r in records] == rows
+    assert records[0].get('missing', 1) == 1 and 'app_id' in records[0]
+    # app ids are interned: every review of an app shares one string
+    assert records[0]['app_id'] is records[2]['app_id']
+    with pytest.raises(KeyError):
+        records[0]['extra'] = 1
+
+    # stored dicts are converted while merging; other shapes are kept as is
+    merged = merge_reviews(rows[:5] + [{'review_id': 'x'}], records[3:], ReviewRecord)
+    assert [r['review_id'] for r in merged] == ['r0', 'r1', 'r2', 'r3', 'r4', 'x', 'r5', 'r6', 'r7', 'r8', 'r9']
+    assert isinstance(merged[0], ReviewRecord) and merged[5] == {'review_id': 'x'}
+
+    star, compact_star = build_star_schema(apps, rows), build_star_schema(apps, records, compact=True)
+    assert compact_star == star
+
+    # tables are written byte for byte like the dict rows
+    for fmt in ('json', 'ndjson'):
+        monkeypatch.setattr(config, 'PROCESSED_FORMAT', fmt)
+        load.save_table(star['fact_reviews'], str(tmp_path / f"dicts_{fmt}.json"))
+        load.save_table(compact_star['fact_reviews'], str(tmp_path / f"records_{fmt}.json"))
+        assert (tmp_path / f"records_{fmt}.json").read_bytes() == (tmp_path / f"dicts_{fmt}.json").read_bytes()
+    assert json.loads((tmp_path / "records_json.json").read_text(encoding='utf-8')) == star['fact_reviews']
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import load
+import review_index
+from review_index import ReviewIndex
+
+
+def test_review_index_lookups_merge_and_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setattr(review_index, 'SPARSE_EVERY', 4)
+    table = str(tmp_path / "reviews.json")
+    path = str(tmp_path / "review_index")
+    load.save_table([{'review_id': f'r{i:03d}'} for i in range(0, 40, 2)], table)
+
+    index = ReviewIndex.open(path, table)
+    assert index.count == 20
+    assert index.contains(['r000', 'r001', 'r038', 'r039', 'zzz']) == {'r000', 'r038'}
+    assert (index.hits, index.misses) == (2, 3)
+
+    assert index.add(['r001', 'r002', 'r099']) == 2
+    assert index.contains_quiet(['r001', 'r099', 'r003']) == {'r001', 'r099'}
+    keys = (tmp_path / "review_index.keys").read_text(encoding='utf-8').split()
+    assert keys == sorted(keys) and len(keys) == 22
+
+    # a saved index is reused while the table is unchanged
+    load.append_table([{'review_id': 'r001'}, {'review_id': 'r099'}], table)
+    index.stamp = load.table_stamp(table)
+    index.save()
+    reopened = ReviewIndex.open(path, table)
+    assert reopened.count == 22 and reopened.contains_quiet(['r099']) == {'r099'}
+
+    # a table written behind the index's back triggers a rebuild
+    load.save_table([{'review_id': 'x1'}], table)
+    rebuilt = ReviewIndex.open(path, table)
+    assert rebuilt.count == 1 and rebuilt.contains_quiet(['r000', 'x1']) == {'x1'}
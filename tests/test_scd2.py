@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from scd2 import SCD2Store
+from utils import scd2_update
+
+
+def make_record(app_id, title):
+    return {'app_id': app_id, 'title': title}
+
+
+def test_scd2_store_hash_detection_and_point_in_time():
+    store = SCD2Store()
+    assert store.update([make_record('a1', 'V1'), make_record('a2', 'B')],
+                        timestamp='2024-01-01T00:00:00') == {'opened': 2, 'closed': 0, 'unchanged': 0}
+    store.mark_saved()
+    # unchanged rows are skipped by hash; a new key only appends
+    assert store.update([make_record('a1', 'V1'), make_record('a2', 'B'), make_record('a3', 'C')],
+                        timestamp='2024-02-01T00:00:00') == {'opened': 1, 'closed': 0, 'unchanged': 2}
+    assert not store.rewrite and [r['app_id'] for r in store.unsaved()] == ['a3']
+    store.mark_saved()
+    assert store.update([make_record('a1', 'V2'), make_record('a2', 'B'), make_record('a3', 'C')],
+                        timestamp='2024-03-01T00:00:00') == {'opened': 1, 'closed': 1, 'unchanged': 2}
+    assert store.rewrite
+
+    assert store.as_of('a1', '2023-12-31T00:00:00') is None
+    assert store.as_of('a1', '2024-02-15T00:00:00')['title'] == 'V1'
+    assert store.as_of('a1', '2024-03-01T00:00:00')['title'] == 'V2'
+    assert [r['title'] for r in store.versions('a1')] == ['V1', 'V2']
+    assert [r['app_id'] for r in store.current_rows()] == ['a2', 'a3', 'a1']
+
+
+def test_scd2_tracked_columns_version_only_real_changes():
+    def app(title, installs):
+        return {'app_id': 'a1', 'title': title, 'category': 'Tools', 'developer_id': 'd1',
+                'installs': installs}
+
+    history = scd2_update([], [app('A', '10+')], timestamp='t1',
+                          tracked_columns=['category', 'title', 'developer_id'])
+    # a noisy column leaves the stored version alone; the current snapshot
+    # still gets its latest value
+    store = SCD2Store(history, tracked=['category', 'title', 'developer_id'])
+    store.mark_saved()
+    assert store.update([app('A', '50+')], timestamp='t2') == {'opened': 0, 'closed': 0, 'unchanged': 1}
+    assert not store.rewrite and not store.unsaved()
+    assert history[0]['installs'] == '10+' and history[0]['start_date'] == 't1'
+    assert store.current_rows()[0]['installs'] == '50+'
+    assert store.history_rows()[0]['installs'] == '50+' and store.history[0]['installs'] == '10+'
+    # a tracked column opens a new version
+    history = scd2_update(history, [app('B', '50+')], timestamp='t3',
+                          tracked_columns=['category', 'title', 'developer_id'])
+    assert [(r['title'], r['current_flag']) for r in history] == [('A', False), ('B', True)]
+    assert history[0]['scd2_digest'] != history[1]['scd2_digest']
+
+
+def test_scd2_duckdb_decisions_match_python(tmp_path, monkeypatch):
+    pytest.importorskip("duckdb")
+    import config
+    import duckdb_engine
+    monkeypatch.setattr(config, 'PROCESSED_DATA_DIR', str(tmp_path))
+
+    def app(pk, title, installs='10+'):
+        return {'app_id': pk, 'title': title, 'category': 'Tools', 'developer_id': 'd1', 'installs': installs}
+
+    tracked = ('category', 'title', 'developer_id')
+    snapshots = [
+        [app('a1', 'A'), app('a2', 'B'), app('a3', 'C')],
+        # noisy column only, a title change, a removed app and a new one
+        [app('a1', 'A', '50+'), app('a2', 'B2'), app('a4', 'D')],
+        [app('a1', 'A', '50+'), app('a2', 'B2'), app('a4', 'D'), app('a3', 'C')],
+    ]
+    python, sql = SCD2Store(tracked=tracked), SCD2Store(tracked=tracked)
+    con = duckdb_engine.connect(str(tmp_path / "scd2.duckdb"))
+    try:
+        for n, snapshot in enumerate(snapshots):
+            timestamp = f'2024-0{n + 1}-01T00:00:00'
+            assert (duckdb_engine.scd2_update(con, sql, snapshot, timestamp)
+                    == python.update(snapshot, timestamp))
+    finally:
+        con.close()
+    assert sql.history == python.history
+    assert sql.current_rows() == python.current_rows()
+    assert [r['title'] for r in sql.versions('a2')] == ['B', 'B2']
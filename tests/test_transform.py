@@ -0,0 +1,102 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import config
+import schema
+from transform import build_star_schema, clean_apps_reviews
+
+
+def test_build_star_schema_resolves_keys():
+    apps = [
+        {'app_id': 'a1', 'title': 'One', 'developer': 'DevA', 'category': 'Productivity'},
+        {'app_id': 'a2', 'title': 'Two', 'developer': 'DevB', 'category': 'Tools'},
+    ]
+    reviews = [
+        {'review_id': 'r1', 'app_id': 'a2', 'at': '2024-01-01T10:00:00', 'score': 5},
+        {'review_id': 'r2', 'app_id': 'a1', 'at': '2024-01-02T10:00:00', 'score': 3},
+        {'review_id': 'r3', 'app_id': 'unknown', 'at': None, 'score': 1},
+    ]
+    star = build_star_schema(apps, reviews)
+    facts = {f['review_id']: f for f in star['fact_reviews']}
+    assert facts['r1']['app_key'] == 2
+    assert facts['r1']['developer_key'] == 2
+    assert facts['r2']['app_key'] == 1
+    assert facts['r2']['developer_key'] == 1
+    assert facts['r3']['app_key'] is None
+    assert facts['r3']['developer_key'] is None
+    assert facts['r3']['date_key'] is None
+    assert len(star['dim_date']) == 2
+
+
+def test_build_star_schema_joins_reviews_to_app_version_at_review_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'PROCESSED_DATA_DIR', str(tmp_path))
+    def version(app_id, developer, start, end):
+        return {'app_id': app_id, 'title': app_id, 'developer': developer, 'category': 'Tools',
+                'start_date': start, 'end_date': end, 'current_flag': end is None}
+
+    history = [
+        version('a1', 'Old', '2024-01-01T00:00:00', '2024-03-01T00:00:00'),
+        version('gone', 'Old', '2024-01-01T00:00:00', '2024-02-01T00:00:00'),
+        version('a1', 'New', '2024-03-01T00:00:00', None),
+    ]
+    reviews = [
+        {'review_id': 'before', 'app_id': 'a1', 'at': '2023-06-01T10:00:00'},
+        {'review_id': 'v1', 'app_id': 'a1', 'at': '2024-02-29T23:59:59'},
+        {'review_id': 'v2', 'app_id': 'a1', 'at': '2024-03-01T00:00:00'},
+        {'review_id': 'undated', 'app_id': 'a1', 'at': None},
+        {'review_id': 'delisted', 'app_id': 'gone', 'at': '2024-05-01T00:00:00'},
+        # 2024-02-29T23:30 in UTC, before the a1 boundary
+        {'review_id': 'offset', 'app_id': 'a1', 'at': '2024-03-01T01:30:00+02:00'},
+        # no timestamp: the latest version even though it is closed
+        {'review_id': 'undated_gone', 'app_id': 'gone', 'at': None},
+    ]
+    star = build_star_schema(history, reviews)
+    assert [(r['app_key'], r['valid_to'], r['is_current']) for r in star['dim_apps']] == [
+        (1, '2024-03-01T00:00:00', False), (2, '2024-02-01T00:00:00', False), (3, None, True)]
+    keys = {f['review_id']: (f['app_key'], f['developer_key']) for f in star['fact_reviews']}
+    assert keys == {'before': (1, 1), 'v1': (1, 1), 'v2': (3, 2), 'undated': (3, 2),
+                    'delisted': (None, None), 'offset': (1, 1), 'undated_gone': (2, 1)}
+
+    duckdb_engine = pytest.importorskip("duckdb_engine")
+    pytest.importorskip("duckdb")
+    con = duckdb_engine.connect(str(tmp_path / "star.duckdb"))
+    try:
+        duckdb_engine._stage(con, 'merged_reviews', dict(duckdb_engine._REVIEW_TYPES, pos='BIGINT'),
+                             (dict({c: r.get(c) for c in duckdb_engine.REVIEW_COLUMNS}, pos=pos)
+                              for pos, r in enumerate(reviews)))
+        sql_star = duckdb_engine.build_star_schema(con, history)
+    finally:
+        con.close()
+    assert {f['review_id']: (f['app_key'], f['developer_key']) for f in sql_star['fact_reviews']} == keys
+
+
+def test_column_mapper_resolves_drift_once_per_key_set(tmp_path, monkeypatch, capsys):
+    reviews = [
+        {'reviewId': 'r1', 'app_id': 'a1', 'content': 'ok', 'score': 4},
+        {'review_id': 'r2', 'appId': 'a1', 'comments': 'fine', 'rating': '3'},
+        {'review_id': 'r3', 'appId': 'a1', 'comments': 'meh', 'rating': '2'},
+        # empty canonical value falls through to the alias, like an or-chain
+        {'reviewId': 'r4', 'app': 'a1', 'content': '', 'review_text': 'late', 'score': 0, 'rating': 5},
+        {'reviewId': 'r5', 'app_id': 'a1', 'body': 'custom'},
+    ]
+    cleaned = clean_apps_reviews(reviews)
+    assert [(r['review_id'], r['content'], r['score']) for r in cleaned] == [
+        ('r1', 'ok', 4), ('r2', 'fine', 3), ('r3', 'meh', 2), ('r4', 'late', 5)]
+    assert "comments->content (2)" in capsys.readouterr().out
+
+    mapper = schema.ColumnMapper('reviews')
+    list(mapper.iter_project(reviews))
+    assert len(mapper._projectors) == 4
+    assert mapper.alias_counts()['review_id->reviewId'] == 2
+
+    aliases = tmp_path / "column_aliases.json"
+    aliases.write_text(json.dumps({'reviews': {'content': ['body']}}), encoding='utf-8')
+    monkeypatch.setattr(config, 'COLUMN_ALIASES_PATH', str(aliases))
+    cleaned = clean_apps_reviews(reviews)
+    assert cleaned[-1]['content'] == 'custom'
+    assert "body->content (1)" in capsys.readouterr().out